@@ -22,10 +22,10 @@ from kido_ruteo.capacity.loader import load_capacity_data
 from kido_ruteo.capacity.matcher import match_capacity_to_od
 from kido_ruteo.congruence.classification import classify_congruence
 from kido_ruteo.processing.checkpoint_loader import get_checkpoint_node_mapping
-from kido_ruteo.processing.centroides import add_centroid_coordinates_to_od, assign_nodes_to_zones
+from kido_ruteo.processing.centroides import add_centroid_coordinates_to_od, as_node_id_series, assign_nodes_to_zones
 from kido_ruteo.processing.preprocessing import normalize_column_names, prepare_data
 from kido_ruteo.routing.constrained_path import compute_mc2_matrix
-from kido_ruteo.routing.graph_loader import load_graph_from_geojson
+from kido_ruteo.routing.graph_loader import load_csr_graph_from_geojson
 from kido_ruteo.routing.shortest_path import compute_mc_matrix
 from kido_ruteo.trips.calculation import calculate_vehicle_trips
 
@@ -52,7 +52,7 @@ def main() -> int:
         df["checkpoint_id"] = checkpoint_id
 
     # Graph + zones + checkpoints
-    G = load_graph_from_geojson(str(net))
+    G = load_csr_graph_from_geojson(str(net))
 
     zones = gpd.read_file(zon)
     zones = assign_nodes_to_zones(zones, G)
@@ -60,7 +60,7 @@ def main() -> int:
 
     cp_nodes = get_checkpoint_node_mapping(str(zon), G)
     cp_dict = dict(zip(cp_nodes["checkpoint_id"].astype(str), cp_nodes["checkpoint_node_id"]))
-    df["checkpoint_node_id"] = df["checkpoint_id"].astype(str).map(cp_dict)
+    df["checkpoint_node_id"] = as_node_id_series(df["checkpoint_id"].astype(str).map(cp_dict))
 
     # Ruteo
     print("Ruteando MC/MC2...")
@@ -30,7 +30,7 @@ import pandas as pd
 from kido_ruteo.processing.preprocessing import normalize_column_names, prepare_data
 from kido_ruteo.processing.centroides import assign_nodes_to_zones, add_centroid_coordinates_to_od
 from kido_ruteo.processing.checkpoint_loader import get_checkpoint_node_mapping
-from kido_ruteo.routing.graph_loader import load_graph_from_geojson
+from kido_ruteo.routing.graph_loader import load_csr_graph_from_geojson
 from kido_ruteo.routing.shortest_path import compute_shortest_path_mc
 from kido_ruteo.routing.constrained_path import compute_constrained_shortest_path, derive_sense_from_path
 from kido_ruteo.utils.visual_debug import DebugVisualizer
@@ -55,7 +55,7 @@ def main() -> int:
         raise FileNotFoundError(f"No existe red.geojson: {net_path}. Ya debería estar generado.")
 
     print(f"Cargando red desde: {net_path}")
-    G = load_graph_from_geojson(str(net_path))
+    G = load_csr_graph_from_geojson(str(net_path))
 
     print(f"Cargando zonificación: {zon_path}")
     zones = gpd.read_file(zon_path)
@@ -111,8 +111,8 @@ def main() -> int:
         o_node = r["origin_node_id"]
         d_node = r["destination_node_id"]
 
-        mc_path, mc_dist, _mc_time = compute_shortest_path_mc(G, o_node, d_node)
-        mc2_path, mc2_dist = compute_constrained_shortest_path(G, o_node, d_node, cp_node)
+        mc_path, mc_dist, _mc_time = compute_shortest_path_mc(G, o_node, d_node, method="astar")
+        mc2_path, mc2_dist = compute_constrained_shortest_path(G, o_node, d_node, cp_node, method="astar")
 
         if mc_path:
             routes_mc.append(mc_path)
@@ -124,7 +124,7 @@ def main() -> int:
 
         sense_candidate = None
         if mc2_path:
-            sense_candidate = derive_sense_from_path(G, mc2_path, str(cp_node))
+            sense_candidate = derive_sense_from_path(G, mc2_path, cp_node)
 
         rows_out.append(
             {
@@ -1,7 +1,8 @@
 r"""Ejecuta el pipeline para todas las queries tipo checkpoint.
 
 - Recorre data/raw/queries/checkpoint/checkpoint*.csv
-- Ejecuta kido_ruteo.pipeline.run_pipeline en modo NORMAL (STRICT contractual)
+- Ejecuta kido_ruteo.pipeline.PipelineSession en modo NORMAL (STRICT contractual):
+  grafo, zonas, checkpoints, capacidad y workers se cargan una sola vez
 - Escribe processed_checkpointXXXX.csv en data/processed/
 
 Uso (PowerShell):
@@ -199,6 +200,45 @@ def main() -> int:
         default=200,
         help="Tamaño de chunk para enviar tareas a cada worker. Default: 200.",
     )
+    parser.add_argument(
+        "--routing-backend",
+        choices=["python", "scipy"],
+        default="python",
+        help="Motor de Dijkstra para MC/MC2: python (CSR en Python) o scipy (scipy.sparse.csgraph). Default: python.",
+    )
+    parser.add_argument(
+        "--routing-method",
+        choices=["dijkstra", "ch", "astar", "alt"],
+        default="dijkstra",
+        help=(
+            "Algoritmo punto a punto para MC/MC2: dijkstra, ch (Contraction Hierarchies, "
+            "índice persistido junto a la red) astar (A* bidireccional) o alt (A* con landmarks). Default: dijkstra."
+        ),
+    )
+    parser.add_argument(
+        "--no-zone-matrix",
+        action="store_true",
+        help=(
+            "No usar la matriz MC zona × zona precalculada (persistida junto a la red); "
+            "MC se rutea por fila en cada checkpoint."
+        ),
+    )
+    parser.add_argument(
+        "--with-mc",
+        action="store_true",
+        help=(
+            "Calcular también MC (ruta más corta libre). Las salidas contractuales no la "
+            "necesitan: la validez de ruta se deriva de MC2 y origen != destino."
+        ),
+    )
+    parser.add_argument(
+        "--no-route-cache",
+        action="store_true",
+        help=(
+            "No usar la caché persistente de rutas (routes.sqlite junto a la caché del grafo); "
+            "todas las rutas se recalculan."
+        ),
+    )
     args = parser.parse_args()
 
     base_dir = Path(__file__).resolve().parents[1]
@@ -252,15 +292,8 @@ def main() -> int:
 
     import pandas as pd
 
-    from kido_ruteo.processing.preprocessing import normalize_column_names, prepare_data
-    from kido_ruteo.processing.centroides import assign_nodes_to_zones, add_centroid_coordinates_to_od
-    from kido_ruteo.processing.checkpoint_loader import get_checkpoint_node_mapping
-    from kido_ruteo.routing.graph_loader import ensure_graph_from_geojson_or_osm, load_graph_from_geojson
-    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
-    from kido_ruteo.capacity.loader import load_capacity_data
-    from kido_ruteo.capacity.matcher import match_capacity_to_od
-    from kido_ruteo.congruence.classification import classify_congruence
-    from kido_ruteo.trips.calculation import calculate_vehicle_trips
+    from kido_ruteo.pipeline import PipelineSession
+    from kido_ruteo.routing.graph_loader import ensure_csr_graph_from_geojson_or_osm, load_csr_graph_from_geojson
 
     _unset_debug_env()
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -277,7 +310,7 @@ def main() -> int:
     #    se usa el red.geojson existente tal cual.
     if roi_bbox is None:
         print("\n[Batch] Cargando grafo desde red.geojson (sin re-descarga OSM)...")
-        G = load_graph_from_geojson(str(network_path))
+        G = load_csr_graph_from_geojson(str(network_path))
     else:
         west, south, east, north = roi_bbox
         print(
@@ -290,7 +323,7 @@ def main() -> int:
 
         # Con ROI, generamos/validamos una red dedicada y "centralizada" al foco.
         # Esto evita tocar la red nacional (red.geojson) y permite que el foco sea detallado.
-        G = ensure_graph_from_geojson_or_osm(
+        G = ensure_csr_graph_from_geojson_or_osm(
             geojson_path=str(focus_network_path),
             zonification_path=str(zonification_path),
             osm_bbox=osm_bbox,
@@ -300,8 +333,8 @@ def main() -> int:
         # A partir de aquí, todos los procesos del pool deben usar el MISMO archivo.
         network_path = focus_network_path
 
-    # 2) Cargar zonificación (o subset ROI) y asignar nodos UNA sola vez.
-    print("[Batch] Cargando zonificación y asignando nodos a zonas (una vez)...")
+    # 2) Cargar zonificación (o subset ROI); los nodos se asignan en la sesión.
+    print("[Batch] Cargando zonificación (una vez)...")
     import geopandas as gpd
     from shapely.geometry import box
 
@@ -311,7 +344,6 @@ def main() -> int:
     if (not zones_gdf.crs.is_geographic) or (str(zones_gdf.crs).upper() != "EPSG:4326"):
         zones_gdf = zones_gdf.to_crs("EPSG:4326")
 
-    zones_in_roi: Optional[set[int]] = None
     checkpoints_in_roi: Optional[set[int]] = None
     if roi_bbox is not None:
         west, south, east, north = roi_bbox
@@ -323,7 +355,6 @@ def main() -> int:
             raise ValueError("ROI no intersecta ninguna zona de la zonificación")
         if "ID" not in zones_roi.columns:
             raise ValueError("Zonification no tiene columna 'ID'")
-        zones_in_roi = set(int(x) for x in zones_roi["ID"].dropna().astype(int).tolist())
         zones_gdf = zones_roi
 
         # Checkpoints dentro del ROI (para decidir si un checkpoint CSV se procesa o se llena con ceros)
@@ -344,131 +375,56 @@ def main() -> int:
         else:
             checkpoints_in_roi = set()
 
-    zones_gdf = assign_nodes_to_zones(zones_gdf, G)
-
-    # 3) Cargar mapping de checkpoints UNA sola vez.
-    print("[Batch] Cargando checkpoints desde zonification.geojson (una vez)...")
-    checkpoint_nodes = get_checkpoint_node_mapping(str(zonification_path), G)
-    if checkpoints_in_roi is not None and len(checkpoints_in_roi) > 0:
-        checkpoint_nodes = checkpoint_nodes[
-            checkpoint_nodes["checkpoint_id"].astype(int).isin(list(checkpoints_in_roi))
-        ].copy()
-    checkpoint_node_dict = dict(
-        zip(checkpoint_nodes["checkpoint_id"].astype(str), checkpoint_nodes["checkpoint_node_id"])
-    )
-
-    # 4) Cargar capacidad UNA sola vez.
-    print("[Batch] Cargando summary_capacity.csv (una vez)...")
-    df_cap = load_capacity_data(str(capacity_path))
-
     ok = 0
     failed: list[tuple[str, str]] = []
-
-    # 5) Sesión paralela reutilizable: 8 workers (por defecto)
-    #    En Windows cada worker tendrá su copia del grafo, pero esto ocurre UNA vez
-    #    para todo el batch, no por cada checkpoint.
-    print(f"[Batch] Iniciando ruteo paralelo: workers={args.workers} chunk={args.chunk_size}")
-    with ParallelRoutingSession(
+    prefix = "processed_preview" if limit_pairs > 0 else "processed"
+
+    # 3) Sesión del pipeline reutilizable: nodos de zona, mapping de checkpoints,
+    #    capacidad y pool de workers se cargan UNA vez para todo el batch.
+    #    Los workers adjuntan por memory-map el grafo ya cargado aquí (sin copias
+    #    por worker). Con ROI, los pares OD y checkpoints fuera quedan en ceros
+    #    (sin nodo → congruencia 4).
+    print(
+        f"[Batch] Iniciando ruteo paralelo: workers={args.workers} chunk={args.chunk_size} "
+        f"backend={args.routing_backend} method={args.routing_method} "
+        f"zone_matrix={'no' if args.no_zone_matrix else 'si'} "
+        f"route_cache={'no' if args.no_route_cache else 'si'} "
+        f"mc={'si' if args.with_mc else 'no'}"
+    )
+    with PipelineSession(
+        zonification_path=str(zonification_path),
         network_path=str(network_path),
-        sense_catalog_path=None,
+        capacity_path=str(capacity_path),
+        output_dir=str(output_dir),
+        routing_backend=args.routing_backend,
+        routing_method=args.routing_method,
+        # Plan contractual: MC solo si se pide explícitamente
+        compute_mc=args.with_mc,
         n_workers=int(args.workers),
         chunk_size=int(args.chunk_size),
+        # MC solo depende de (origen, destino): matriz zona × zona UNA vez para todo el batch
+        zone_matrix=not args.no_zone_matrix,
+        # Rutas ya calculadas en corridas anteriores (mismo grafo) no se vuelven a buscar
+        route_cache=not args.no_route_cache,
+        graph=G,
+        zones=zones_gdf,
+        checkpoint_ids=checkpoints_in_roi if checkpoints_in_roi else None,
+        output_prefix=prefix,
+        # Lote: un OD sin checkpoint es FAIL (no query general); IDs numéricos
+        require_checkpoint_id=True,
+        numeric_ids=True,
     ) as session:
         for i, od_path in enumerate(od_files, start=1):
             print(_render_progress(i - 1, len(od_files)))
             print(f"\n[{i}/{len(od_files)}] Procesando: {od_path.name}")
             try:
                 df_od = pd.read_csv(od_path)
-                df_od = normalize_column_names(df_od)
-
                 if limit_pairs > 0 and len(df_od) > limit_pairs:
                     df_od = df_od.head(limit_pairs).copy()
 
-                # Inferir checkpoint_id del nombre de archivo si no existe
-                if "checkpoint_id" not in df_od.columns:
-                    m = re.search(r"checkpoint(\d+)", od_path.name, re.IGNORECASE)
-                    if m:
-                        df_od["checkpoint_id"] = m.group(1)
-                    else:
-                        raise ValueError(f"No se pudo inferir checkpoint_id desde: {od_path.name}")
-
-                checkpoint_id_str = str(df_od["checkpoint_id"].iloc[0])
-
-                # Si ROI está activo y este checkpoint está fuera, generar salida en ceros y saltar.
-                if roi_bbox is not None:
-                    if checkpoint_id_str not in checkpoint_node_dict:
-                        prefix = "processed_preview" if limit_pairs > 0 else "processed"
-                        out_path = output_dir / f"{prefix}_{od_path.name}"
-                        df_out = pd.DataFrame(
-                            {
-                                "Origen": pd.to_numeric(df_od.get("origin_id"), errors="coerce"),
-                                "Destino": pd.to_numeric(df_od.get("destination_id"), errors="coerce"),
-                            }
-                        )
-                        for c in ["veh_M", "veh_A", "veh_B", "veh_CU", "veh_CAI", "veh_CAII", "veh_total"]:
-                            df_out[c] = 0.0
-                        df_out.to_csv(out_path, index=False)
-                        ok += 1
-                        print(f"ROI: checkpoint fuera -> ceros: {out_path}")
-                        continue
-
-                # ROI: calcular solo pares OD dentro del ROI; el resto se llena con ceros.
-                # Sin ROI: se calcula todo.
-                origin_ids = pd.to_numeric(df_od.get("origin_id"), errors="coerce")
-                dest_ids = pd.to_numeric(df_od.get("destination_id"), errors="coerce")
-                df_out = pd.DataFrame({"Origen": origin_ids, "Destino": dest_ids})
-                for c in ["veh_M", "veh_A", "veh_B", "veh_CU", "veh_CAI", "veh_CAII", "veh_total"]:
-                    df_out[c] = 0.0
-
-                if zones_in_roi is not None:
-                    mask = origin_ids.astype("Int64").isin(list(zones_in_roi)) & dest_ids.astype("Int64").isin(
-                        list(zones_in_roi)
-                    )
-                else:
-                    mask = pd.Series(True, index=df_od.index)
-
-                if mask.any():
-                    df_in = df_od.loc[mask].copy()
-
-                    # STRICT: preparar trips_person e intrazonal_factor
-                    df_in = prepare_data(df_in)
-
-                    # Centroides: reutiliza zones_gdf ya con nodos asignados (subset ROI si aplica)
-                    df_in = add_centroid_coordinates_to_od(df_in, zones_gdf)
-
-                    # Mapear checkpoint_node_id
-                    df_in["checkpoint_node_id"] = df_in["checkpoint_id"].astype(str).map(checkpoint_node_dict)
-
-                    # Routing (MC + MC2 + sense_code) con pool reutilizado
-                    df_in = session.compute(
-                        df_in,
-                        checkpoint_node_col="checkpoint_node_id",
-                        origin_node_col="origin_node_id",
-                        dest_node_col="destination_node_id",
-                    )
-
-                    # Validar rutas (igual que pipeline)
-                    df_in["has_valid_path"] = (
-                        (df_in["mc_distance_m"] > 0)
-                        & (df_in["mc2_distance_m"] > 0)
-                        & df_in["mc2_distance_m"].notna()
-                    )
-
-                    # Capacidad + congruencia + vehículos
-                    df_in = match_capacity_to_od(df_in, df_cap)
-                    df_in = classify_congruence(df_in)
-                    df_in = calculate_vehicle_trips(df_in)
-
-                    # Volcar vehículos calculados al output final, preservando el orden original
-                    for c in ["veh_M", "veh_A", "veh_B", "veh_CU", "veh_CAI", "veh_CAII", "veh_total"]:
-                        if c in df_in.columns:
-                            df_out.loc[df_in.index, c] = df_in[c].astype(float).to_numpy()
-
-                prefix = "processed_preview" if limit_pairs > 0 else "processed"
-                out_path = output_dir / f"{prefix}_{od_path.name}"
-                df_out.to_csv(out_path, index=False)
+                session.run(df_od, name=od_path.name)
                 ok += 1
-                print(f"OK -> {out_path}")
+                print(f"OK -> {session.output_path(od_path.name)}")
             except Exception as e:
                 failed.append((od_path.name, repr(e)))
                 print(f"FAIL -> {od_path.name}: {e}")
@@ -17,7 +17,7 @@ from pathlib import Path
 # Añadir src/ al path para poder importar el paquete kido_ruteo
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from kido_ruteo.pipeline import run_pipeline
+from kido_ruteo.pipeline import PipelineSession
 from kido_ruteo.routing.graph_loader import infer_bbox_from_queries_and_zonification
 
 def main():
@@ -80,24 +80,26 @@ def main():
     success_count = 0
     fail_count = 0
     
-    for od_path in files_to_process:
-        print(f"\nProcesando: {od_path.name}...")
-        try:
-            output_file = run_pipeline(
-                od_path=str(od_path),
-                zonification_path=str(zonification_path),
-                network_path=str(network_path),
-                capacity_path=str(capacity_path),
-                output_dir=str(output_dir),
-                osm_bbox=osm_bbox
-            )
-            print(f"  ✅ Completado: {output_file}")
-            success_count += 1
-        except Exception as e:
-            print(f"  ❌ Error procesando {od_path.name}: {e}")
-            import traceback
-            traceback.print_exc()
-            fail_count += 1
+    # Grafo, zonas, checkpoints y capacidad se cargan UNA vez para todos los archivos
+    with PipelineSession(
+        zonification_path=str(zonification_path),
+        network_path=str(network_path),
+        capacity_path=str(capacity_path),
+        output_dir=str(output_dir),
+        osm_bbox=osm_bbox,
+    ) as session:
+        for od_path in files_to_process:
+            print(f"\nProcesando: {od_path.name}...")
+            try:
+                session.run(str(od_path))
+                output_file = session.output_path(od_path.name)
+                print(f"  ✅ Completado: {output_file}")
+                success_count += 1
+            except Exception as e:
+                print(f"  ❌ Error procesando {od_path.name}: {e}")
+                import traceback
+                traceback.print_exc()
+                fail_count += 1
             
     print(f"\n=== Resumen ===")
     print(f"Procesados exitosamente: {success_count}")
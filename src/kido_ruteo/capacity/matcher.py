@@ -4,6 +4,22 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def checkpoint_directionality(df_capacity: pd.DataFrame) -> pd.Series:
+    """
+    Clasificación por checkpoint (índice: Checkpoint como string):
+    True = direccional (al menos un Sentido != '0'), False = agregado (todos '0').
+
+    En checkpoints agregados `match_capacity_to_od` fija `sense_code='0'`, así
+    que el ruteo puede omitir el sentido geométrico (MC2 solo distancia).
+    """
+    sentido = df_capacity['Sentido'].astype('string')
+    return (
+        (sentido.notna() & ~sentido.eq('0'))
+        .groupby(df_capacity['Checkpoint'].astype('string'), dropna=False)
+        .any()
+    )
+
+
 def match_capacity_to_od(df_od: pd.DataFrame, df_capacity: pd.DataFrame) -> pd.DataFrame:
     """
     Cruza datos de OD/Ruteo con datos de Capacidad basados en Checkpoint y Sentido.
@@ -66,12 +82,7 @@ def match_capacity_to_od(df_od: pd.DataFrame, df_capacity: pd.DataFrame) -> pd.D
 
     # Clasificación checkpoint (direccional vs agregado)
     # Direccional si existe al menos un Sentido != '0'
-    dir_flags = (
-        df_capacity_slim
-        .assign(_is_dir=df_capacity_slim['Sentido'].notna() & ~df_capacity_slim['Sentido'].eq('0'))
-        .groupby('Checkpoint', dropna=False)['_is_dir']
-        .any()
-    )
+    dir_flags = checkpoint_directionality(df_capacity_slim)
 
     # STRICT: checkpoints mixtos (tienen Sentido='0' y también sentidos explícitos)
     # Se tratan como direccionales (por dir_flags), pero se documenta con warning.
@@ -1,47 +1,44 @@
 import geopandas as gpd
 import pandas as pd
 import networkx as nx
-from shapely.geometry import Point
-from scipy.spatial import cKDTree
 import numpy as np
 
+from ..routing.csr_graph import CSRGraph, nearest_nodes
+
 def assign_nodes_to_zones(zones_gdf: gpd.GeoDataFrame, G: nx.Graph) -> gpd.GeoDataFrame:
     """
     Asigna un nodo del grafo como centroide a cada zona.
+
+    Todos los centroides se ajustan en una sola consulta al KD-tree del grafo
+    (`nearest_nodes`, construido una vez por grafo).
     """
     # Verificar CRS del grafo
-    graph_crs = G.graph.get('crs')
+    graph_crs = G.crs if isinstance(G, CSRGraph) else G.graph.get('crs')
     
     # Si el grafo tiene CRS y es diferente al de zonas, reproyectar zonas
     if graph_crs is not None and zones_gdf.crs != graph_crs:
         zones_gdf = zones_gdf.to_crs(graph_crs)
 
-    # Extraer nodos del grafo como GeoDataFrame
-    node_ids = list(G.nodes())
-    node_coords = [G.nodes[n]['pos'] for n in node_ids]
-    nodes_gdf = gpd.GeoDataFrame(
-        {'node_id': node_ids},
-        geometry=[Point(x, y) for x, y in node_coords],
-        crs=graph_crs if graph_crs else zones_gdf.crs
-    )
-    
-    # Spatial join o Nearest Neighbor
-    # Para simplificar, usamos el centroide geométrico de la zona y buscamos el nodo más cercano
-    
+    # Usamos el centroide geométrico de la zona y buscamos el nodo más cercano
     zones_gdf['centroid_geom'] = zones_gdf.geometry.centroid
-    
-    # Construir KDTree de nodos
-    node_points = np.array([(p.x, p.y) for p in nodes_gdf.geometry])
-    tree = cKDTree(node_points)
-    
-    def get_nearest_node(geom):
-        dist, idx = tree.query((geom.x, geom.y))
-        return nodes_gdf.iloc[idx]['node_id']
-    
-    zones_gdf['nearest_node_id'] = zones_gdf['centroid_geom'].apply(get_nearest_node)
+    centroids = gpd.GeoSeries(zones_gdf['centroid_geom'])
+    nodes, _ = nearest_nodes(G, np.column_stack([centroids.x.to_numpy(), centroids.y.to_numpy()]))
+
+    zones_gdf['nearest_node_id'] = as_node_id_series(pd.Series(nodes, index=zones_gdf.index))
     
     return zones_gdf
 
+def as_node_id_series(s: pd.Series) -> pd.Series:
+    """
+    Normaliza una columna de IDs de nodo.
+
+    IDs enteros (`CSRGraph`) → `Int32` nullable (NaN → <NA>).
+    IDs de NetworkX (p.ej. strings) se dejan tal cual.
+    """
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return s.astype('Int32')
+    return s
+
 def add_centroid_coordinates_to_od(df_od: pd.DataFrame, zones_gdf: gpd.GeoDataFrame) -> pd.DataFrame:
     """
     Agrega las coordenadas (o node_ids) de origen y destino al DataFrame OD.
@@ -55,13 +52,13 @@ def add_centroid_coordinates_to_od(df_od: pd.DataFrame, zones_gdf: gpd.GeoDataFr
     df_od['origin_id'] = pd.to_numeric(df_od['origin_id'], errors='coerce')
     df_od['destination_id'] = pd.to_numeric(df_od['destination_id'], errors='coerce')
     
-    df_od['origin_node_id'] = df_od['origin_id'].map(zone_to_node)
-    df_od['destination_node_id'] = df_od['destination_id'].map(zone_to_node)
+    df_od['origin_node_id'] = as_node_id_series(df_od['origin_id'].map(zone_to_node))
+    df_od['destination_node_id'] = as_node_id_series(df_od['destination_id'].map(zone_to_node))
     
     # Mapear checkpoint si existe
     if 'checkpoint_id' in df_od.columns:
         df_od['checkpoint_id'] = pd.to_numeric(df_od['checkpoint_id'], errors='coerce')
-        df_od['checkpoint_node_id'] = df_od['checkpoint_id'].map(zone_to_node)
+        df_od['checkpoint_node_id'] = as_node_id_series(df_od['checkpoint_id'].map(zone_to_node))
     
     # Filtrar filas donde no se encontró nodo (zonas sin mapeo)
     # Opcional: df_od.dropna(subset=['origin_node_id', 'destination_node_id'], inplace=True)
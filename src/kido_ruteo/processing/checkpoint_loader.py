@@ -3,11 +3,28 @@ Módulo para cargar y procesar checkpoints desde zonification.geojson.
 STRICT MODE: Los checkpoints son la única fuente de verdad para ubicaciones.
 """
 
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 from shapely.geometry import Point
 import osmnx as ox
 
+from ..routing.constrained_path import _load_valid_sense_codes
+from ..routing.csr_graph import CSRGraph, nearest_nodes
+from ..routing.graph_cache import file_sha256, load_arrays, save_arrays
+from ..routing.turn_table import TURN_TABLE_ARRAYS, TurnSenseTable, build_turn_sense_table
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato del mapping persistido.
+CHECKPOINT_MAPPING_VERSION = 1
+
 
 def load_checkpoints_from_zonification(zonification_path: str) -> gpd.GeoDataFrame:
     """
@@ -68,7 +85,7 @@ def assign_checkpoint_nodes(checkpoints_gdf: gpd.GeoDataFrame,
     ----------
     checkpoints_gdf : gpd.GeoDataFrame
         DataFrame con checkpoints (debe tener geometría Point)
-    graph : networkx.MultiDiGraph
+    graph : CSRGraph | networkx.Graph
         Grafo de la red de transporte
         
     Returns
@@ -77,90 +94,146 @@ def assign_checkpoint_nodes(checkpoints_gdf: gpd.GeoDataFrame,
         DataFrame con:
         - checkpoint_id (int)
         - checkpoint_name (str)
-        - checkpoint_node_id (str): ID del nodo más cercano en el grafo
+        - checkpoint_node_id (int32 para `CSRGraph`): ID del nodo más cercano en el grafo
         - lat (float): Latitud del checkpoint (original)
         - lon (float): Longitud del checkpoint (original)
     """
-    import numpy as np
-    
     # Proyectar checkpoints al mismo CRS del grafo (EPSG:32614)
     checkpoints_projected = checkpoints_gdf.to_crs('EPSG:32614')
-    
-    # Extraer nodos del grafo con sus coordenadas proyectadas
-    nodes_coords = {}
-    for node_id in graph.nodes():
-        if 'pos' in graph.nodes[node_id]:
-            x, y = graph.nodes[node_id]['pos']
-            nodes_coords[node_id] = (x, y)
-    
-    if len(nodes_coords) == 0:
+
+    n_nodes = graph.n_nodes if isinstance(graph, CSRGraph) else sum(
+        1 for _, data in graph.nodes(data=True) if 'pos' in data
+    )
+    if n_nodes == 0:
         raise ValueError("El grafo no tiene nodos con atributo 'pos'")
     
-    print(f"  Buscando nodos más cercanos entre {len(nodes_coords)} nodos disponibles...")
-    
-    result = []
-    
-    for original_idx, projected_row in checkpoints_projected.iterrows():
-        # Obtener la fila correspondiente del GeoDataFrame original
-        original_row = checkpoints_gdf.loc[original_idx]
-        
-        checkpoint_id = original_row['checkpoint_id']
-        checkpoint_name = original_row['checkpoint_name']
-        point_projected = projected_row['geometry']  # Este está proyectado
-        point_original = original_row['geometry']  # Geográfico original
-        
-        # Calcular distancias a todos los nodos (en coordenadas proyectadas)
-        min_dist = float('inf')
-        nearest_node = None
-        
-        for node_id, (node_x, node_y) in nodes_coords.items():
-            # Calcular distancia euclidiana en metros
-            dist = np.sqrt((point_projected.x - node_x)**2 + (point_projected.y - node_y)**2)
-            
-            if dist < min_dist:
-                min_dist = dist
-                nearest_node = node_id
-        
-        if nearest_node is None:
-            raise ValueError(f"No se pudo encontrar nodo cercano para checkpoint {checkpoint_id}")
-        
-        result.append({
-            'checkpoint_id': checkpoint_id,
-            'checkpoint_name': checkpoint_name,
-            'checkpoint_node_id': nearest_node,
-            'lat': point_original.y,
-            'lon': point_original.x,
-            'distance_m': min_dist
-        })
-    
-    df_result = pd.DataFrame(result)
-    
+    print(f"  Buscando nodos más cercanos entre {n_nodes} nodos disponibles...")
+
+    # Todos los checkpoints en una sola consulta al KD-tree del grafo
+    # (distancia euclidiana en metros, coordenadas proyectadas)
+    points = checkpoints_projected.geometry
+    nodes, dist = nearest_nodes(graph, np.column_stack([points.x.to_numpy(), points.y.to_numpy()]))
+
+    df_result = pd.DataFrame({
+        'checkpoint_id': checkpoints_gdf['checkpoint_id'].to_numpy(),
+        'checkpoint_name': checkpoints_gdf['checkpoint_name'].to_numpy(),
+        'checkpoint_node_id': nodes,
+        'lat': checkpoints_gdf.geometry.y.to_numpy(),
+        'lon': checkpoints_gdf.geometry.x.to_numpy(),
+        'distance_m': dist,
+    })
+
     print(f"✓ Asignados {len(df_result)} checkpoints a nodos de la red")
     print(f"  Distancia promedio al nodo: {df_result['distance_m'].mean():.1f} m")
     
     return df_result
 
 
-def get_checkpoint_node_mapping(zonification_path: str, graph) -> pd.DataFrame:
+def _mapping_dir(graph, zonification_path: str, valid_codes: Optional[set]) -> Optional[Path]:
+    """Directorio del mapping persistido (None si el grafo no tiene caché).
+
+    El hash de la zonificación se memoiza por (ruta, size, mtime) en
+    `checkpoint_mapping/source.json`: no se relee el archivo en cada corrida.
+    """
+    base = getattr(graph, 'cache_dir', None)
+    if base is None:
+        return None
+    root = Path(base) / 'checkpoint_mapping'
+    key = json.dumps({
+        'version': CHECKPOINT_MAPPING_VERSION,
+        'zonification': file_sha256(zonification_path, root),
+        'sense_codes': sorted(valid_codes) if valid_codes is not None else None,
+    })
+    return root / hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _load_mapping(mapping_dir: Path) -> Optional[pd.DataFrame]:
+    loaded = load_arrays(mapping_dir, TURN_TABLE_ARRAYS)
+    if loaded is None:
+        return None
+    meta, arrays = loaded
+    if meta.get('version') != CHECKPOINT_MAPPING_VERSION:
+        return None
+    checkpoint_nodes = pd.DataFrame.from_records(meta['mapping'])
+    checkpoint_nodes['checkpoint_node_id'] = checkpoint_nodes['checkpoint_node_id'].astype('int32')
+    if meta.get('valid_codes') is not None:
+        checkpoint_nodes.attrs['turn_senses'] = TurnSenseTable(**arrays, valid_codes=meta['valid_codes'])
+    return checkpoint_nodes
+
+
+def _save_mapping(mapping_dir: Path, checkpoint_nodes: pd.DataFrame, table: Optional[TurnSenseTable]) -> None:
+    if table is None:
+        table = TurnSenseTable([], [0], [], [0], [], [])
+        valid_codes = None
+    else:
+        valid_codes = sorted(table.valid_codes)
+    meta = {
+        'version': CHECKPOINT_MAPPING_VERSION,
+        'mapping': json.loads(checkpoint_nodes.to_json(orient='records')),
+        'valid_codes': valid_codes,
+    }
+    try:
+        save_arrays(mapping_dir, table.arrays(), meta)
+    except OSError as e:
+        logger.warning("No se pudo guardar el mapping de checkpoints en %s: %s", mapping_dir, e)
+
+
+def get_checkpoint_node_mapping(
+    zonification_path: str,
+    graph,
+    sense_catalog_path: Optional[str] = None,
+) -> pd.DataFrame:
     """
     Función de conveniencia que carga checkpoints y los asigna a nodos.
+
+    Con `CSRGraph` además precalcula la tabla giro → sentido de cada nodo
+    checkpoint (`routing.turn_table`), validada contra `sense_cardinality.csv`,
+    y la deja en `checkpoint_nodes.attrs['turn_senses']`. Si el grafo viene de
+    `graph_cache`, mapping y tabla se guardan en la entrada del grafo
+    (llave = hash de la zonificación + catálogo) y las siguientes corridas los
+    cargan sin leer la zonificación ni buscar nodos.
     
     Parameters
     ----------
     zonification_path : str
         Ruta al archivo zonification.geojson
-    graph : networkx.MultiDiGraph
+    graph : CSRGraph | networkx.Graph
         Grafo de la red de transporte
+    sense_catalog_path : str, optional
+        Ruta a sense_cardinality.csv (por defecto el catálogo del repo)
         
     Returns
     -------
     pd.DataFrame
         Mapping checkpoint_id -> checkpoint_node_id
     """
+    valid_codes = None
+    if isinstance(graph, CSRGraph):
+        try:
+            valid_codes = _load_valid_sense_codes(sense_catalog_path)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"  ⚠️ Sin tabla de sentidos precalculada: {e}")
+
+    mapping_dir = _mapping_dir(graph, zonification_path, valid_codes) if isinstance(graph, CSRGraph) else None
+    if mapping_dir is not None:
+        checkpoint_nodes = _load_mapping(mapping_dir)
+        if checkpoint_nodes is not None:
+            print(f"✓ Mapping de {len(checkpoint_nodes)} checkpoints cargado desde caché")
+            return checkpoint_nodes
+
     # 1. Cargar checkpoints
     checkpoints_gdf = load_checkpoints_from_zonification(zonification_path)
     
     # 2. Asignar nodos
     checkpoint_nodes = assign_checkpoint_nodes(checkpoints_gdf, graph)
+
+    # 3. Tabla giro → sentido por nodo checkpoint
+    table = None
+    if valid_codes is not None:
+        table = build_turn_sense_table(graph, checkpoint_nodes['checkpoint_node_id'], valid_codes)
+        checkpoint_nodes.attrs['turn_senses'] = table
+
+    if mapping_dir is not None:
+        _save_mapping(mapping_dir, checkpoint_nodes, table)
     
     return checkpoint_nodes
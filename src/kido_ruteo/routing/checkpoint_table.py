@@ -0,0 +1,224 @@
+"""kido_ruteo.routing.checkpoint_table
+
+Tabla persistente por checkpoint para MC2 y sentido.
+
+Con el árbol de caminos mínimos de raíz en el checkpoint `c` (ver
+`checkpoint_tree.py`), cada fila de MC2 solo necesita, para su origen y su
+destino:
+
+- la distancia d(c, nodo), y
+- el "primer salto": vecino de `c` en el camino c → nodo.
+
+El sentido se deriva con los vecinos de `c` en el camino MC2
+o → ... → u → c → w → ... → d, y `u`/`w` son justamente los primeros saltos
+hacia `o` y hacia `d`. Con la tabla, un re-proceso de cualquier archivo del
+checkpoint no hace ninguna búsqueda en el grafo.
+
+Almacenamiento (`CSRGraph` con entrada de `graph_cache`, llave = hash del
+grafo): `<entrada>/checkpoints/<checkpoint_node_id>/` con `nodes.npy`
+(int32, ordenados), `dist.npy` (float64, inf = sin ruta) y `first_hop.npy`
+(int32, -1 = sin ruta o el propio checkpoint). Si una corrida pide nodos que
+la tabla no cubre, se reconstruye con la unión y se reemplaza.
+
+Checkpoints agregados (todo `Sentido == '0'` en capacidad): el sentido no se
+usa, así que basta una tabla SOLO de distancias (`hops=False`): Dijkstra sin
+predecesores y `first_hop` vacío. Si después se pide con primer salto, se
+reconstruye.
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from .checkpoint_tree import CheckpointTree
+from .csr_graph import CSRGraph
+from .graph_cache import load_arrays, save_arrays
+from .zone_matrix import node_indices, node_positions
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato.
+CHECKPOINT_TABLE_VERSION = 1
+
+_TABLE_ARRAYS = ('nodes', 'dist', 'first_hop')
+
+
+class CheckpointTable:
+    """Distancia y primer salto desde un checkpoint hacia un conjunto de nodos.
+
+    Atributos:
+        checkpoint: índice de nodo del checkpoint.
+        nodes: int32 (k,). Índices de nodo cubiertos, ordenados y únicos.
+        dist: float64 (k,). d(checkpoint, nodo); inf si no hay ruta.
+        first_hop: int32 (k,). Vecino del checkpoint en el camino hacia el
+            nodo; -1 si no hay ruta o el nodo es el checkpoint. Vacío en una
+            tabla solo de distancias.
+    """
+
+    def __init__(self, checkpoint: int, nodes, dist, first_hop) -> None:
+        self.checkpoint = int(checkpoint)
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.first_hop = np.asarray(first_hop, dtype=np.int32)
+
+    @property
+    def has_hops(self) -> bool:
+        return self.first_hop.size == self.nodes.size
+
+    def covers(self, nodes: np.ndarray, hops: bool = True) -> bool:
+        """True si todos los índices `nodes` están en la tabla (y con primer salto si `hops`)."""
+        return (self.has_hops or not hops) and bool(np.isin(nodes, self.nodes).all())
+
+    def route(self, origins: Iterable, dests: Iterable) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """MC2 por fila sin búsqueda.
+
+        Returns:
+            (dist, u, w): `dist` = d(o,c) + d(c,d) (NaN si falta un nodo o no
+            hay ruta); `u`/`w` = vecinos de `c` en el camino hacia `o`/`d`
+            (-1 si no aplica o la tabla es solo de distancias).
+        """
+        po = node_positions(self.nodes, origins)
+        pd_ = node_positions(self.nodes, dests)
+        ok = (po >= 0) & (pd_ >= 0)
+        dist = np.full(len(po), np.nan, dtype=np.float64)
+        u = np.full(len(po), -1, dtype=np.int64)
+        w = np.full(len(po), -1, dtype=np.int64)
+        total = self.dist[po[ok]] + self.dist[pd_[ok]]
+        dist[ok] = np.where(np.isfinite(total), total, np.nan)
+        if not self.has_hops:
+            return dist, u, w
+        reach = ok.copy()
+        reach[ok] = np.isfinite(total)
+        u[reach] = self.first_hop[po[reach]]
+        w[reach] = self.first_hop[pd_[reach]]
+        return dist, u, w
+
+
+def _dense(values, n: int, fill, dtype) -> np.ndarray:
+    """`dist`/`pred` del árbol (arreglo de longitud n o dict) → arreglo denso."""
+    if isinstance(values, np.ndarray):
+        return values.astype(dtype, copy=False)
+    out = np.full(n, fill, dtype=dtype)
+    if values:
+        keys = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        out[keys] = np.fromiter(values.values(), dtype=dtype, count=len(values))
+    return out
+
+
+def _table_dist(tree: CheckpointTree, nodes: np.ndarray) -> np.ndarray:
+    """d(c, nodo) para cada índice de `nodes` (inf si no hay ruta)."""
+    return _dense(tree.dist, tree.G.n_nodes, np.inf, np.float64)[nodes]
+
+
+def _first_hops(tree: CheckpointTree, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distancia y primer salto (-1 si no aplica) para cada índice de `nodes`.
+
+    Sube por `pred` desde todos los nodos a la vez: en cada paso avanzan solo
+    los que aún no llegan a un vecino del checkpoint.
+    """
+    c = tree.checkpoint
+    dist = _table_dist(tree, nodes)
+    pred = _dense(tree.pred, tree.G.n_nodes, -1, np.int64)
+    hop = np.where(np.isfinite(dist) & (nodes != c), nodes, -1).astype(np.int64)
+    active = np.flatnonzero(hop >= 0)
+    while active.size:
+        parent = pred[hop[active]]
+        # Sin predecesor (no debería pasar en un nodo alcanzado): sin primer salto
+        hop[active[parent < 0]] = -1
+        more = (parent != c) & (parent >= 0)
+        active = active[more]
+        hop[active] = parent[more]
+    return dist, hop.astype(np.int32)
+
+
+def build_checkpoint_table(
+    G: CSRGraph,
+    checkpoint_node,
+    nodes: np.ndarray,
+    backend: str = 'python',
+    hops: bool = True,
+) -> Optional[CheckpointTable]:
+    """Un Dijkstra desde el checkpoint hacia `nodes` (índices). None si no existe.
+
+    Con `hops=False` el Dijkstra no guarda predecesores y la tabla queda solo
+    con distancias.
+    """
+    tree = CheckpointTree.build(G, checkpoint_node, targets=nodes.tolist(), backend=backend, predecessors=hops)
+    if tree is None:
+        return None
+    if not hops:
+        return CheckpointTable(tree.checkpoint, nodes, _table_dist(tree, nodes), np.zeros(0, dtype=np.int32))
+    dist, first_hop = _first_hops(tree, nodes)
+    return CheckpointTable(tree.checkpoint, nodes, dist, first_hop)
+
+
+def load_or_build_checkpoint_table(
+    G: CSRGraph,
+    checkpoint_node,
+    node_ids: Iterable,
+    backend: str = 'python',
+    cache_dir: Optional[Path] = None,
+    hops: bool = True,
+) -> Optional[CheckpointTable]:
+    """Tabla del checkpoint que cubra `node_ids`: memoria → disco → construcción.
+
+    `cache_dir` por defecto es `G.cache_dir` (entrada de `graph_cache`); sin
+    entrada de caché la tabla solo vive en memoria (en `G`). Con `hops=False`
+    basta una tabla solo de distancias (una tabla con primer salto también
+    sirve); al extender una tabla con primer salto se conserva.
+
+    Returns:
+        La tabla, o None si el checkpoint no existe en el grafo.
+    """
+    c = G.node_index(checkpoint_node)
+    if c is None:
+        return None
+    nodes = node_indices(G, node_ids)
+
+    tables = getattr(G, '_checkpoint_tables', None)
+    if tables is None:
+        tables = {}
+        G._checkpoint_tables = tables
+    table = tables.get(c)
+
+    base = cache_dir if cache_dir is not None else G.cache_dir
+    table_dir = Path(base) / 'checkpoints' / str(c) if base is not None else None
+    if table is None and table_dir is not None:
+        loaded = load_arrays(table_dir, _TABLE_ARRAYS)
+        if loaded is not None and loaded[0].get('version') == CHECKPOINT_TABLE_VERSION:
+            table = CheckpointTable(c, **loaded[1])
+            tables[c] = table
+
+    if table is not None and table.covers(nodes, hops=hops):
+        return table
+    if table is not None:
+        nodes = np.union1d(table.nodes, nodes).astype(np.int32)
+        hops = hops or table.has_hops
+
+    logger.info(
+        "Construyendo tabla del checkpoint %s (%s nodos%s)...", c, nodes.size, '' if hops else ', solo distancias'
+    )
+    table = build_checkpoint_table(G, c, nodes, backend=backend, hops=hops)
+    if table_dir is not None:
+        try:
+            # La tabla anterior (si la hay) cubre menos nodos: se reemplaza
+            shutil.rmtree(table_dir, ignore_errors=True)
+            save_arrays(
+                table_dir,
+                {'nodes': table.nodes, 'dist': table.dist, 'first_hop': table.first_hop},
+                {
+                    'version': CHECKPOINT_TABLE_VERSION,
+                    'checkpoint': c,
+                    'n_nodes': int(table.nodes.size),
+                    'hops': table.has_hops,
+                },
+            )
+        except OSError as e:
+            logger.warning("No se pudo guardar la tabla del checkpoint en %s: %s", table_dir, e)
+    tables[c] = table
+    return table
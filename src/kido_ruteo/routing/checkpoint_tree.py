@@ -0,0 +1,184 @@
+"""kido_ruteo.routing.checkpoint_tree
+
+Árbol de caminos mínimos centrado en un checkpoint (para MC2).
+
+Todas las filas de un `checkpointXXXX.csv` comparten el mismo nodo checkpoint y
+la red es NO dirigida, así que:
+
+    MC2(o, d) = d(o, c) + d(c, d)
+
+y ambas mitades salen del MISMO árbol de Dijkstra con raíz en `c`:
+- o → c es el camino del árbol c → o recorrido al revés.
+- c → d es el camino del árbol c → d.
+
+Con esto el MC2 de un archivo completo es un Dijkstra + consultas al árbol.
+Con backend 'scipy' el árbol se guarda como arreglos (dist, pred) de longitud n.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Hashable, Iterable, List, Optional, Tuple, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from .csr_graph import CSRGraph
+from . import dijkstra
+from . import scipy_backend
+
+
+@dataclass
+class CheckpointTree:
+    """Distancias y predecesores desde un checkpoint.
+
+    `checkpoint`, y las llaves de `dist`/`pred`, son nodos internos del grafo
+    (índices para `CSRGraph`, nodos tal cual para `nx.Graph`). `dist`/`pred`
+    son dicts (backend 'python') o arreglos de longitud n (backend 'scipy').
+    """
+
+    G: Union[CSRGraph, nx.Graph]
+    checkpoint: Hashable
+    dist: Union[dict, np.ndarray]
+    pred: Union[dict, np.ndarray]
+
+    @classmethod
+    def build(
+        cls,
+        G: Union[CSRGraph, nx.Graph],
+        checkpoint_node: Hashable,
+        targets: Optional[Iterable[Hashable]] = None,
+        backend: str = 'python',
+        predecessors: bool = True,
+    ) -> Optional["CheckpointTree"]:
+        """Corre un Dijkstra desde el checkpoint.
+
+        Si se pasan `targets` (IDs de nodo del pipeline), en `CSRGraph` la
+        búsqueda se detiene cuando todos quedan asentados. Con
+        `predecessors=False` el árbol solo tiene distancias (`distance` y
+        `route(..., return_path=False)`; sin caminos ni `first_hops`).
+
+        Returns:
+            El árbol, o None si el checkpoint no existe en el grafo.
+        """
+        if isinstance(G, CSRGraph):
+            c = G.node_index(checkpoint_node)
+            if c is None:
+                return None
+            if scipy_backend.validate_backend(backend, G) == 'scipy':
+                dist, pred = scipy_backend.shortest_path_trees(G, [c], predecessors=predecessors)
+                return cls(G, c, dist[0], pred[0] if pred is not None else {})
+            internal = None
+            if targets is not None:
+                internal = [t for t in (G.node_index(x) for x in targets) if t is not None]
+            dist, pred = dijkstra.single_source_dijkstra(G, c, targets=internal, predecessors=predecessors)
+            return cls(G, c, dist, pred)
+
+        if checkpoint_node not in G:
+            return None
+        if not predecessors:
+            dist = nx.single_source_dijkstra_path_length(G, checkpoint_node, weight='weight')
+            return cls(G, checkpoint_node, dist, {})
+        preds, dist = nx.dijkstra_predecessor_and_distance(G, checkpoint_node, weight='weight')
+        # pred[v][0] es el predecesor con el que NetworkX construye el camino
+        pred = {v: p[0] for v, p in preds.items() if p}
+        return cls(G, checkpoint_node, dist, pred)
+
+    def _internal(self, node: Hashable) -> Optional[Hashable]:
+        if isinstance(self.G, CSRGraph):
+            return self.G.node_index(node)
+        return node if node in self.G else None
+
+    def distance(self, node: Hashable) -> Optional[float]:
+        """d(c, node) = d(node, c); None si no es alcanzable."""
+        n = self._internal(node)
+        if n is None:
+            return None
+        if isinstance(self.dist, np.ndarray):
+            d = self.dist[n]
+            return float(d) if np.isfinite(d) else None
+        return self.dist.get(n)
+
+    def path_from_checkpoint(self, node: Hashable) -> Optional[List[Hashable]]:
+        """Camino c → node (IDs de nodo); None si no es alcanzable."""
+        if self.distance(node) is None:
+            return None
+        n = self._internal(node)
+        if isinstance(self.pred, np.ndarray):
+            return scipy_backend.reconstruct_path(self.pred, self.checkpoint, n)
+        return dijkstra.reconstruct_path(self.pred, self.checkpoint, n)
+
+    def _parent(self, n: Hashable) -> Optional[Hashable]:
+        if isinstance(self.pred, np.ndarray):
+            p = int(self.pred[n])
+            return None if p == scipy_backend.NO_PREDECESSOR else p
+        return self.pred.get(n)
+
+    def _reached(self, n: Hashable) -> bool:
+        if isinstance(self.dist, np.ndarray):
+            return bool(np.isfinite(self.dist[n]))
+        return n in self.dist
+
+    def first_hops(self, internal_nodes: Iterable[Hashable]) -> dict:
+        """Primer salto del camino c → nodo (vecino de c) para cada nodo interno.
+
+        Es el nodo anterior/siguiente al checkpoint en MC2, así que el sentido
+        se deriva sin reconstruir caminos. None si el nodo no es alcanzable o
+        es el propio checkpoint. Sube por los predecesores con memo (cada nodo
+        del árbol se visita una vez).
+        """
+        c = self.checkpoint
+        memo: dict = {c: None}
+        out: dict = {}
+        for v in internal_nodes:
+            if v in out:
+                continue
+            if not self._reached(v):
+                out[v] = None
+                continue
+            chain = []
+            x = v
+            while x not in memo:
+                p = self._parent(x)
+                if p == c:
+                    memo[x] = x
+                    break
+                chain.append(x)
+                x = p
+            hop = memo[x]
+            for y in chain:
+                memo[y] = hop
+            out[v] = hop
+        return out
+
+    def route(
+        self,
+        origin_node: Hashable,
+        dest_node: Hashable,
+        return_path: bool = True,
+    ) -> Tuple[Optional[List[Hashable]], Optional[float]]:
+        """MC2 origen → checkpoint → destino. (None, None) si no hay ruta."""
+        d_oc = self.distance(origin_node)
+        d_cd = self.distance(dest_node)
+        if d_oc is None or d_cd is None:
+            return None, None
+        if not return_path:
+            return None, d_oc + d_cd
+        path1 = self.path_from_checkpoint(origin_node)[::-1]
+        path2 = self.path_from_checkpoint(dest_node)
+        return path1 + path2[1:], d_oc + d_cd
+
+
+def group_rows_by_checkpoint(
+    origins: List[Hashable],
+    dests: List[Hashable],
+    checkpoints: List[Hashable],
+) -> dict:
+    """Agrupa posiciones de fila por checkpoint (omite filas con nodos faltantes)."""
+    groups: dict = {}
+    for pos, (o, d, c) in enumerate(zip(origins, dests, checkpoints)):
+        if pd.isna(o) or pd.isna(d) or pd.isna(c):
+            continue
+        groups.setdefault(c, []).append(pos)
+    return groups
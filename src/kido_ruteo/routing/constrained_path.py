@@ -10,12 +10,22 @@ No existe lectura de sentido desde OD, ni fallbacks, ni promedios.
 
 import networkx as nx
 import pandas as pd
-import math
 import numpy as np
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Hashable, Iterable, List, Tuple, Optional, Union
 from tqdm import tqdm
 
+from .csr_graph import CSRGraph
+from .checkpoint_table import load_or_build_checkpoint_table
+from .checkpoint_tree import CheckpointTree, group_rows_by_checkpoint
+from .scipy_backend import validate_backend
+from . import point_to_point
+from . import sense_kernels
+from .dedup import factorize_routes
+from .route_cache import DISTANCE_ONLY_CATALOG, RouteCache, catalog_key
+from .point_to_point import validate_method
+from .turn_table import TurnSenseTable
+
 
 def _default_sense_catalog_path() -> Path:
     # repo_root/.../src/kido_ruteo/routing/constrained_path.py -> parents[3] == repo root
@@ -46,57 +56,40 @@ def _load_valid_sense_codes(catalog_path: Optional[str] = None) -> set[str]:
     )
     return set(valid)
 
+def _node_xy(G, n):
+    """Coordenadas (x, y) de un nodo, o None si no las tiene."""
+    if isinstance(G, CSRGraph):
+        return G.pos(n)
+    data = G.nodes.get(n, {})
+    if 'x' in data and 'y' in data:
+        return data['x'], data['y']
+    p = data.get('pos')
+    if isinstance(p, (tuple, list)) and len(p) == 2:
+        return p[0], p[1]
+    return None
+
 def calculate_bearing(G, u, v):
-    """Calculates bearing from node u to node v in degrees (0=N, 90=E)."""
-    def _xy(n):
-        data = G.nodes.get(n, {})
-        if 'x' in data and 'y' in data:
-            return data['x'], data['y']
-        p = data.get('pos')
-        if isinstance(p, (tuple, list)) and len(p) == 2:
-            return p[0], p[1]
-        return None
+    """Calculates bearing from node u to node v in degrees (0=N, 90=E).
 
-    p1 = _xy(u)
-    p2 = _xy(v)
+    Envoltorio de `sense_kernels.bearings` para un solo par.
+    """
+    p1 = _node_xy(G, u)
+    p2 = _node_xy(G, v)
     if p1 is None or p2 is None:
         return None
-
-    x1, y1 = p1
-    x2, y2 = p2
-    dx = x2 - x1
-    dy = y2 - y1
-    angle = math.degrees(math.atan2(dx, dy))
-    if angle < 0:
-        angle += 360
-    return angle
+    coords = np.array([p1, p2], dtype=np.float64)
+    return float(sense_kernels.bearings(coords, [0], [1])[0])
 
 def get_cardinality(bearing, is_origin=False):
-    """Maps bearing to cardinality code (1=N, 2=E, 3=S, 4=W)."""
+    """Maps bearing to cardinality code (1=N, 2=E, 3=S, 4=W).
+
+    Envoltorio de `sense_kernels.cardinalities`; con `is_origin` devuelve la
+    cardinalidad opuesta (si voy al norte, vengo del sur).
+    """
     if bearing is None: return None
-    
-    # Sectors: N(315-45), E(45-135), S(135-225), W(225-315)
-    if bearing >= 315 or bearing < 45:
-        card = 1 # North
-    elif bearing >= 45 and bearing < 135:
-        card = 2 # East
-    elif bearing >= 135 and bearing < 225:
-        card = 3 # South
-    else:
-        card = 4 # West
-        
-    if is_origin:
-        # Origin is opposite to incoming direction
-        # If I head North (1), I come from South (3)
-        # If I head East (2), I come from West (4)
-        # If I head South (3), I come from North (1)
-        # If I head West (4), I come from East (2)
-        map_opp = {1: 3, 2: 4, 3: 1, 4: 2}
-        return map_opp[card]
-    else:
-        return card
+    return int(sense_kernels.cardinalities(np.array([bearing]), is_origin=is_origin)[0])
 
-def derive_sense_from_path(G: nx.Graph, path: List[str], checkpoint_node: str) -> Optional[str]:
+def derive_sense_from_path(G: Union[CSRGraph, nx.Graph], path: List[Hashable], checkpoint_node: Hashable) -> Optional[str]:
     """
     STRICT MODE: Deriva el `sense_code` desde la geometría de MC2.
 
@@ -117,7 +110,15 @@ def derive_sense_from_path(G: nx.Graph, path: List[str], checkpoint_node: str) -
     u = path[idx - 1] # Previous node
     v = checkpoint_node
     w = path[idx + 1] # Next node
-    
+    return derive_sense_from_neighbors(G, u, v, w)
+
+def derive_sense_from_neighbors(G: Union[CSRGraph, nx.Graph], u: Hashable, v: Hashable, w: Hashable) -> Optional[str]:
+    """
+    Candidato de sentido para el giro u -> v (checkpoint) -> w.
+
+    Es lo único que `derive_sense_from_path` usa del camino, así que basta con
+    los vecinos del checkpoint (p.ej. desde `checkpoint_table`).
+    """
     # Incoming Bearing (u -> v)
     bearing_in = calculate_bearing(G, u, v)
     # Outgoing Bearing (v -> w)
@@ -139,15 +140,77 @@ def derive_sense_from_path(G: nx.Graph, path: List[str], checkpoint_node: str) -
         return f"{origin_card}-{dest_card}"
     return None
 
-def compute_constrained_shortest_path(
-    G: nx.Graph,
-    origin_node: str,
-    dest_node: str,
-    checkpoint_node: str
-) -> Tuple[Optional[List[str]], Optional[float]]:
+def _turn_indices(G, u: list, v: list, w: list):
+    """Giros como (coords, iu, iv, iw) para `sense_kernels` (-1 = nodo None o sin coordenadas)."""
+    if isinstance(G, CSRGraph):
+        # En CSRGraph el ID de nodo es el índice en G.coords
+        return (G.coords,) + tuple(
+            np.array([-1 if x is None else int(x) for x in nodes], dtype=np.int64) for nodes in (u, v, w)
+        )
+    index: dict = {}
+    xy: list = []
+    def _idx(x):
+        if x is None:
+            return -1
+        if x not in index:
+            p = _node_xy(G, x)
+            index[x] = -1 if p is None else len(xy)
+            if p is not None:
+                xy.append(p)
+        return index[x]
+    ids = tuple(np.array([_idx(x) for x in nodes], dtype=np.int64) for nodes in (u, v, w))
+    coords = np.array(xy, dtype=np.float64).reshape(-1, 2)
+    return (coords,) + ids
+
+def derive_sense_codes(
+    G: Union[CSRGraph, nx.Graph],
+    u: list,
+    v: list,
+    w: list,
+    valid_sense_codes: set[str],
+    turn_senses: Optional[TurnSenseTable] = None,
+) -> list:
     """
-    Calcula shortest path que DEBE pasar por un checkpoint específico.
+    Sentido validado para muchos giros u -> v (checkpoint) -> w a la vez.
+
+    Equivale a `derive_sense_from_neighbors` + lookup en el catálogo por fila,
+    con los kernels vectoriales de `sense_kernels`. Con `turn_senses` (tabla
+    precalculada por checkpoint, validada con el mismo catálogo) los giros se
+    resuelven por búsqueda; solo los que no estén en la tabla se calculan.
+    Filas con algún nodo None → NaN.
     """
+    coords, iu, iv, iw = _turn_indices(G, u, v, w)
+    codes = np.full(len(iv), -1, dtype=np.int64)
+    todo = np.ones(len(iv), dtype=bool)
+    if (
+        turn_senses is not None
+        and isinstance(G, CSRGraph)
+        and turn_senses.valid_codes == frozenset(valid_sense_codes)
+    ):
+        codes, hit = turn_senses.lookup(iu, iv, iw)
+        todo = ~hit
+    if todo.any():
+        turns = sense_kernels.derive_turn_senses(coords, iu[todo], iv[todo], iw[todo], valid_sense_codes)
+        codes[todo] = turns.sense_code.codes
+    senses = pd.Categorical.from_codes(codes, categories=sense_kernels.SENSE_CATEGORIES)
+    return list(np.asarray(senses, dtype=object))
+
+def _constrained_legs(G, origin_node, dest_node, checkpoint_node, backend: str, method: str):
+    """Caminos origen → checkpoint y checkpoint → destino, o None si no hay ruta."""
+    if isinstance(G, CSRGraph):
+        o = G.node_index(origin_node)
+        c = G.node_index(checkpoint_node)
+        d = G.node_index(dest_node)
+        if o is None or c is None or d is None:
+            return None
+        path1, dist1 = point_to_point.shortest_path(G, o, c, method=method, backend=backend)
+        if path1 is None:
+            return None
+        path2, dist2 = point_to_point.shortest_path(G, c, d, method=method, backend=backend)
+        if path2 is None:
+            return None
+        return path1, path2, dist1 + dist2
+
     try:
         # Ruta origen -> checkpoint
         path1 = nx.shortest_path(G, source=origin_node, target=checkpoint_node, weight='weight')
@@ -156,23 +219,92 @@ def compute_constrained_shortest_path(
         # Ruta checkpoint -> destino
         path2 = nx.shortest_path(G, source=checkpoint_node, target=dest_node, weight='weight')
         dist2 = nx.shortest_path_length(G, source=checkpoint_node, target=dest_node, weight='weight')
-        
-        # Combinar rutas (evitar duplicar checkpoint)
-        combined_path = path1 + path2[1:]
-        combined_distance = dist1 + dist2
-        
-        return combined_path, combined_distance
-    
     except (nx.NetworkXNoPath, nx.NodeNotFound):
+        return None
+    return path1, path2, dist1 + dist2
+
+def compute_constrained_turn(
+    G: Union[CSRGraph, nx.Graph],
+    origin_node: Hashable,
+    dest_node: Hashable,
+    checkpoint_node: Hashable,
+    backend: str = 'python',
+    method: str = 'dijkstra',
+) -> Tuple[Optional[float], Optional[Hashable], Optional[Hashable], Optional[Hashable]]:
+    """
+    MC2 + giro en el checkpoint sin concatenar el camino.
+
+    Returns:
+        (distancia, u, c, w): `u`/`w` son el nodo anterior/siguiente al
+        checkpoint `c` en MC2 (None si el checkpoint es extremo o no hay ruta).
+    """
+    backend = validate_backend(backend, G)
+    method = validate_method(method, G)
+    legs = _constrained_legs(G, origin_node, dest_node, checkpoint_node, backend, method)
+    if legs is None:
+        return None, None, None, None
+    path1, path2, dist = legs
+    if len(path1) < 2 or len(path2) < 2:
+        return dist, None, None, None
+    return dist, path1[-2], path2[0], path2[1]
+
+def compute_constrained_shortest_path(
+    G: Union[CSRGraph, nx.Graph],
+    origin_node: Hashable,
+    dest_node: Hashable,
+    checkpoint_node: Hashable,
+    backend: str = 'python',
+    method: str = 'dijkstra',
+) -> Tuple[Optional[List[Hashable]], Optional[float]]:
+    """
+    Calcula shortest path que DEBE pasar por un checkpoint específico.
+
+    `backend`: 'python' (Dijkstra en Python / NetworkX) o 'scipy'.
+    `method`: 'dijkstra', 'ch', 'astar' o 'alt' (ver `point_to_point.ROUTING_METHODS`).
+    """
+    backend = validate_backend(backend, G)
+    method = validate_method(method, G)
+    legs = _constrained_legs(G, origin_node, dest_node, checkpoint_node, backend, method)
+    if legs is None:
         return None, None
+    path1, path2, dist = legs
+    # Combinar rutas (evitar duplicar checkpoint)
+    return path1 + path2[1:], dist
+
+def has_valid_path(
+    df_od: pd.DataFrame,
+    origin_node_col: str = 'origin_node_id',
+    dest_node_col: str = 'destination_node_id',
+) -> pd.Series:
+    """
+    `has_valid_path` contractual por fila: MC2 > 0 y MC > 0.
+
+    Si `mc_distance_m` no se calculó (plan contractual, sin MC) la condición
+    MC > 0 se deriva de MC2: una ruta MC2 implica que origen y destino están
+    conectados, así que MC > 0 equivale a origen != destino.
+    """
+    mc2 = df_od['mc2_distance_m']
+    valid = (mc2 > 0) & mc2.notna()
+    if 'mc_distance_m' in df_od.columns:
+        return valid & (df_od['mc_distance_m'] > 0)
+    distinct = (df_od[origin_node_col] != df_od[dest_node_col]).astype('boolean').fillna(False)
+    return valid & distinct.astype(bool)
+
 
 def compute_mc2_matrix(
     df_od: pd.DataFrame,
-    G: nx.Graph,
+    G: Union[CSRGraph, nx.Graph],
     checkpoint_col: str = 'checkpoint_id',
     origin_node_col: str = 'origin_node_id',
     dest_node_col: str = 'destination_node_id',
-    sense_catalog_path: Optional[str] = None
+    sense_catalog_path: Optional[str] = None,
+    batched: bool = True,
+    backend: str = 'python',
+    method: str = 'dijkstra',
+    table_nodes: Optional[Iterable[Hashable]] = None,
+    turn_senses: Optional[TurnSenseTable] = None,
+    route_cache: Optional[RouteCache] = None,
+    distance_only: Optional[Iterable[bool]] = None,
 ) -> pd.DataFrame:
     """
     STRICT MODE (docs/flow.md):
@@ -181,46 +313,182 @@ def compute_mc2_matrix(
     - Mapea bearings a cardinalidad
     - Hace lookup en `sense_cardinality.csv`
 
+    Con `batched=True` se corre UN Dijkstra por checkpoint (ver
+    `checkpoint_tree.CheckpointTree`) y cada fila se resuelve como
+    d(o,c) + d(c,d) reconstruyendo ambas mitades del mismo árbol. Con
+    `CSRGraph` el árbol se resume en una tabla persistente por checkpoint
+    (`checkpoint_table`: distancia + primer salto hacia cada nodo), de modo que
+    un re-proceso no busca en el grafo; `table_nodes` agrega nodos a la tabla
+    (p.ej. todos los nodos de zona). Con False se hacen dos búsquedas punto a
+    punto por fila. Las tripletas (origen, destino, checkpoint) repetidas se
+    calculan una sola vez (`dedup.factorize_routes`).
+
+    `turn_senses` (de `get_checkpoint_node_mapping`) resuelve el sentido de
+    cada giro en el checkpoint por búsqueda en la tabla precalculada.
+    `route_cache` (`route_cache.py`) se consulta antes de buscar y recibe las
+    filas calculadas (MC2 + sentido).
+
+    `distance_only` (bool por fila, ver `route_plan.RoutePlan.distance_only`)
+    marca filas de checkpoints agregados: `match_capacity_to_od` fija su
+    `sense_code` en '0', así que se resuelven con un Dijkstra SOLO de
+    distancias por checkpoint (sin predecesores, caminos ni bearings, con
+    cualquier `method`) y su `sense_code` queda '0'.
+
+    `backend` elige el motor de Dijkstra: 'python' o 'scipy'
+    (`scipy.sparse.csgraph`, requiere `CSRGraph`). Con un `method` punto a punto
+    distinto de 'dijkstra' ('ch', 'astar', 'alt') cada fila se resuelve por separado.
+
     Si no hay ruta MC2 válida o no se puede derivar/validar el sentido → `sense_code = NaN`.
     """
     print("  Calculando matriz MC2 (Constrained Path) y Sentido...")
 
     valid_sense_codes = _load_valid_sense_codes(sense_catalog_path)
-    
-    dist_mc2 = []
-    derived_senses = []
-    
-    for idx, row in tqdm(df_od.iterrows(), total=len(df_od)):
-        origin = row.get(origin_node_col)
-        dest = row.get(dest_node_col)
-        checkpoint = row.get(checkpoint_col)
-        
-        if pd.isna(origin) or pd.isna(dest) or pd.isna(checkpoint):
-            dist_mc2.append(None)
-            derived_senses.append(np.nan)
-            continue
-            
-        checkpoint = str(checkpoint)
-        
-        path, dist = compute_constrained_shortest_path(G, origin, dest, checkpoint)
-        
-        dist_mc2.append(dist)
-
-        # Derivar + validar sentido (lookup obligatorio)
-        sense_candidate = None
-        if path:
-            sense_candidate = derive_sense_from_path(G, path, checkpoint)
-
-        if sense_candidate == '0':
-            # '0' es el código de sentido agregado/indeterminado.
-            derived_senses.append('0')
-        elif sense_candidate and (sense_candidate in valid_sense_codes) and (sense_candidate != '0'):
-            derived_senses.append(sense_candidate)
-        else:
-            derived_senses.append(np.nan)
-        
-    df_od['mc2_distance_m'] = dist_mc2
+    backend = validate_backend(backend, G)
+    method = validate_method(method, G)
+    if method != 'dijkstra':
+        batched = False
+
+    n_rows = len(df_od)
+    row_origins = df_od[origin_node_col].tolist() if origin_node_col in df_od.columns else [None] * n_rows
+    row_dests = df_od[dest_node_col].tolist() if dest_node_col in df_od.columns else [None] * n_rows
+    row_checkpoints = df_od[checkpoint_col].tolist() if checkpoint_col in df_od.columns else [None] * n_rows
+
+    # Un cálculo por tripleta única; el resultado se reparte al final
+    keys = factorize_routes(row_origins, row_dests, row_checkpoints)
+    print(keys.report())
+    origins = [row_origins[p] for p in keys.first.tolist()]
+    dests = [row_dests[p] for p in keys.first.tolist()]
+    checkpoints = [row_checkpoints[p] for p in keys.first.tolist()]
+    n = keys.n_unique
+    dist_only = (
+        np.asarray(list(distance_only), dtype=bool)[keys.first]
+        if distance_only is not None
+        else np.zeros(n, dtype=bool)
+    )
+
+    # Caché persistente: las tripletas con hit no se rutean. Las de solo
+    # distancia van con su propio catálogo (no guardan sentido).
+    cached = np.zeros(n, dtype=bool)
+    if route_cache is not None:
+        catalogs = ((~dist_only, catalog_key(valid_sense_codes)), (dist_only, DISTANCE_ONLY_CATALOG))
+        cached_dist = np.full(n, np.nan)
+        cached_sense: list = [np.nan] * n
+        for mask, catalog in catalogs:
+            sel = np.flatnonzero(mask)
+            if sel.size == 0:
+                continue
+            found_dist, found_sense, found = route_cache.get_mc2(
+                [origins[p] for p in sel], [dests[p] for p in sel], [checkpoints[p] for p in sel], catalog
+            )
+            cached_dist[sel] = found_dist
+            cached[sel] = found
+            for p, sense in zip(sel.tolist(), found_sense):
+                cached_sense[p] = sense
+        checkpoints = [None if hit else cp for cp, hit in zip(checkpoints, cached.tolist())]
+
+    dist_mc2: List[Optional[float]] = [None] * n
+
+    # Checkpoints agregados: un Dijkstra solo de distancias por checkpoint
+    if dist_only.any():
+        groups = group_rows_by_checkpoint(
+            origins, dests, [cp if d else None for cp, d in zip(checkpoints, dist_only.tolist())]
+        )
+        extra = list(table_nodes) if table_nodes is not None else []
+        for checkpoint, positions in groups.items():
+            row_o = [origins[p] for p in positions]
+            row_d = [dests[p] for p in positions]
+            if isinstance(G, CSRGraph):
+                table = load_or_build_checkpoint_table(
+                    G, checkpoint, row_o + row_d + extra, backend=backend, hops=False
+                )
+                if table is None:
+                    continue
+                dist, _, _ = table.route(row_o, row_d)
+                for k, pos in enumerate(positions):
+                    dist_mc2[pos] = None if np.isnan(dist[k]) else float(dist[k])
+                continue
+            tree = CheckpointTree.build(G, checkpoint, targets=set(row_o + row_d), backend=backend, predecessors=False)
+            if tree is None:
+                continue
+            for pos in positions:
+                dist_mc2[pos] = tree.route(origins[pos], dests[pos], return_path=False)[1]
+    routed = [None if d else cp for cp, d in zip(checkpoints, dist_only.tolist())]
+
+    # Giro en el checkpoint por fila: u -> c -> w (None si no aplica)
+    turn_u: list = [None] * n
+    turn_c: list = [None] * n
+    turn_w: list = [None] * n
+
+    if batched and isinstance(G, CSRGraph):
+        groups = group_rows_by_checkpoint(origins, dests, routed)
+        extra = list(table_nodes) if table_nodes is not None else []
+        for checkpoint, positions in tqdm(groups.items(), total=len(groups)):
+            row_o = [origins[p] for p in positions]
+            row_d = [dests[p] for p in positions]
+            table = load_or_build_checkpoint_table(G, checkpoint, row_o + row_d + extra, backend=backend)
+            if table is None:
+                continue
+            dist, u, w = table.route(row_o, row_d)
+            for k, pos in enumerate(positions):
+                if np.isnan(dist[k]):
+                    continue
+                dist_mc2[pos] = float(dist[k])
+                if u[k] >= 0 and w[k] >= 0:
+                    turn_u[pos], turn_c[pos], turn_w[pos] = int(u[k]), table.checkpoint, int(w[k])
+    elif batched:
+        groups = group_rows_by_checkpoint(origins, dests, routed)
+        for checkpoint, positions in groups.items():
+            targets = {origins[p] for p in positions} | {dests[p] for p in positions}
+            tree = CheckpointTree.build(G, checkpoint, targets=targets, backend=backend)
+            if tree is None:
+                continue
+            hops = tree.first_hops(t for t in (tree._internal(x) for x in targets) if t is not None)
+            for pos in tqdm(positions, total=len(positions)):
+                _, dist = tree.route(origins[pos], dests[pos], return_path=False)
+                dist_mc2[pos] = dist
+                if dist is None:
+                    continue
+                u = hops.get(tree._internal(origins[pos]))
+                w = hops.get(tree._internal(dests[pos]))
+                if u is not None and w is not None:
+                    turn_u[pos], turn_c[pos], turn_w[pos] = u, tree.checkpoint, w
+    else:
+        for pos in tqdm(range(n), total=n):
+            origin, dest, checkpoint = origins[pos], dests[pos], routed[pos]
+            if pd.isna(origin) or pd.isna(dest) or pd.isna(checkpoint):
+                continue
+            dist, u, c, w = compute_constrained_turn(
+                G, origin, dest, checkpoint, backend=backend, method=method
+            )
+            dist_mc2[pos] = dist
+            turn_u[pos], turn_c[pos], turn_w[pos] = u, c, w
+
+    # Sentido de todas las filas de una vez (sin caminos materializados)
+    derived_senses = derive_sense_codes(G, turn_u, turn_c, turn_w, valid_sense_codes, turn_senses=turn_senses)
+
+    if route_cache is not None:
+        for mask, catalog in catalogs:
+            computed = np.flatnonzero(~cached & mask).tolist()
+            route_cache.put_mc2(
+                [origins[p] for p in computed],
+                [dests[p] for p in computed],
+                [checkpoints[p] for p in computed],
+                [dist_mc2[p] for p in computed],
+                [derived_senses[p] for p in computed],
+                catalog,
+            )
+        for pos in np.flatnonzero(cached).tolist():
+            d = cached_dist[pos]
+            dist_mc2[pos] = None if np.isnan(d) else float(d)
+            derived_senses[pos] = cached_sense[pos]
+
+    # Checkpoint agregado: mismo sentido que fija `match_capacity_to_od`
+    for pos in np.flatnonzero(dist_only).tolist():
+        derived_senses[pos] = '0'
+
+    inverse = keys.inverse.tolist()
+    df_od['mc2_distance_m'] = [dist_mc2[k] for k in inverse]
     # Overwrite/create sense_code (STRICT: only here, derived from MC2)
-    df_od['sense_code'] = derived_senses
-        
+    df_od['sense_code'] = [derived_senses[k] for k in inverse]
+
     return df_od
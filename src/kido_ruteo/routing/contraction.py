@@ -0,0 +1,289 @@
+"""kido_ruteo.routing.contraction
+
+Contraction Hierarchies (CH) sobre `CSRGraph` para consultas punto a punto.
+
+Preprocesamiento (una vez por grafo):
+- Los nodos se contraen en orden de importancia (diferencia de aristas +
+  vecinos ya contraídos + nivel en la jerarquía); al contraer un nodo se
+  recalcula la prioridad de sus vecinos.
+- Al contraer `v`, cada par de vecinos (u, w) recibe un atajo u–w de peso
+  w(u,v) + w(v,w) salvo que una búsqueda local ("witness") encuentre un camino
+  igual o más corto que no pase por `v`.
+- Cada arista se guarda una sola vez, en el extremo de menor rango
+  ("grafo ascendente"). Como la red es NO dirigida, el mismo grafo ascendente
+  sirve para la búsqueda hacia adelante y hacia atrás.
+
+Consulta: Dijkstra bidireccional que solo sube de rango desde `s` y desde `t`;
+el camino se desempaca recursivamente con el nodo intermedio de cada atajo.
+
+Persistencia: subdirectorio `ch/` dentro de la entrada de `graph_cache` (junto
+a la red); se invalida cuando cambia la red o los parámetros del grafo.
+
+Nota: las distancias se suman en otro orden que Dijkstra (por tramos de
+atajo), así que pueden diferir en el último bit de float64.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .csr_graph import CSRGraph
+from .graph_cache import load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato o el algoritmo de preprocesamiento.
+CH_VERSION = 1
+
+_CH_ARRAYS = ('rank', 'up_indptr', 'up_indices', 'up_weights', 'up_middle')
+
+# Límite de nodos asentados por búsqueda witness (si se alcanza, se agrega el
+# atajo: más atajos, nunca resultados incorrectos). Para estimar prioridades
+# basta una búsqueda más corta.
+_WITNESS_SETTLE_LIMIT = 200
+_PRIORITY_SETTLE_LIMIT = 25
+
+
+class ContractionHierarchy:
+    """Índice CH (grafo ascendente en CSR).
+
+    Atributos:
+        rank: int32 (n,). Orden de contracción de cada nodo.
+        up_indptr / up_indices: CSR de aristas hacia nodos de mayor rango,
+            con `up_indices` ordenado dentro de cada nodo.
+        up_weights: float64. Peso de cada arista ascendente.
+        up_middle: int32. Nodo intermedio del atajo (-1 = arista original).
+    """
+
+    def __init__(self, rank, up_indptr, up_indices, up_weights, up_middle) -> None:
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.up_indptr = np.asarray(up_indptr, dtype=np.int64)
+        self.up_indices = np.asarray(up_indices, dtype=np.int32)
+        self.up_weights = np.asarray(up_weights, dtype=np.float64)
+        self.up_middle = np.asarray(up_middle, dtype=np.int32)
+
+    @property
+    def n_shortcuts(self) -> int:
+        return int((self.up_middle >= 0).sum())
+
+    def _upward(self, u: int):
+        a, b = self.up_indptr[u], self.up_indptr[u + 1]
+        return zip(self.up_indices[a:b].tolist(), self.up_weights[a:b].tolist())
+
+    def query(self, source: int, target: int) -> Tuple[Optional[List[int]], Optional[float]]:
+        """Camino mínimo source → target. Devuelve (None, None) si no hay ruta."""
+        if source == target:
+            return [source], 0.0
+
+        dist = ({source: 0.0}, {target: 0.0})
+        pred: Tuple[dict, dict] = ({}, {})
+        settled: Tuple[set, set] = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = float('inf')
+        meet = -1
+
+        while heaps[0] or heaps[1]:
+            # Avanza la dirección con menor clave; se detiene cuando ninguna
+            # puede mejorar el mejor punto de encuentro.
+            tops = [h[0][0] if h else float('inf') for h in heaps]
+            side = 0 if tops[0] <= tops[1] else 1
+            if tops[side] >= best:
+                break
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side] or d > dist[side][u]:
+                continue
+            settled[side].add(u)
+
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+                meet = u
+
+            for v, w in self._upward(u):
+                nd = d + w
+                if nd < dist[side].get(v, float('inf')):
+                    dist[side][v] = nd
+                    pred[side][v] = u
+                    heapq.heappush(heaps[side], (nd, v))
+
+        if meet < 0:
+            return None, None
+
+        up_path = [meet]
+        while up_path[-1] != source:
+            up_path.append(pred[0][up_path[-1]])
+        up_path.reverse()
+        down = meet
+        while down != target:
+            down = pred[1][down]
+            up_path.append(down)
+
+        path = [source]
+        for a, b in zip(up_path[:-1], up_path[1:]):
+            path.extend(self._unpack(a, b)[1:])
+        return path, best
+
+    def _middle(self, a: int, b: int) -> int:
+        lo, hi = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+        start, end = self.up_indptr[lo], self.up_indptr[lo + 1]
+        k = start + int(np.searchsorted(self.up_indices[start:end], hi))
+        return int(self.up_middle[k])
+
+    def _unpack(self, a: int, b: int) -> List[int]:
+        """Expande la arista (posiblemente atajo) a–b a nodos del grafo original."""
+        out = [a]
+        stack = [(a, b)]
+        while stack:
+            x, y = stack.pop()
+            m = self._middle(x, y)
+            if m < 0:
+                out.append(y)
+            else:
+                stack.append((m, y))
+                stack.append((x, m))
+        return out
+
+
+def build_contraction_hierarchy(G: CSRGraph) -> ContractionHierarchy:
+    """Preprocesa el grafo (orden de contracción + atajos)."""
+    n = G.n_nodes
+    adj: List[dict] = [dict() for _ in range(n)]  # v -> {u: (peso, medio)}
+    indptr = G.indptr
+    indices = G.indices.tolist()
+    weights = G.weights.tolist()
+    for u in range(n):
+        for k in range(indptr[u], indptr[u + 1]):
+            adj[u][indices[k]] = (weights[k], -1)
+
+    contracted = np.zeros(n, dtype=bool)
+    deleted_nbrs = np.zeros(n, dtype=np.int32)
+    level = np.zeros(n, dtype=np.int32)
+    rank = np.full(n, -1, dtype=np.int32)
+    up_edges: List[List[Tuple[int, float, int]]] = [[] for _ in range(n)]
+
+    def witness_dists(u: int, skip: int, max_dist: float, targets: set, limit: int) -> dict:
+        dist = {u: 0.0}
+        heap = [(0.0, u)]
+        pending = set(targets)
+        done = 0
+        while heap and pending and done < limit:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if d > max_dist:
+                break
+            pending.discard(x)
+            done += 1
+            for y, (w, _) in adj[x].items():
+                if y == skip:
+                    continue
+                nd = d + w
+                if nd < dist.get(y, float('inf')):
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+        return dist
+
+    def shortcuts_for(v: int, limit: int = _WITNESS_SETTLE_LIMIT) -> List[Tuple[int, int, float]]:
+        nbrs = list(adj[v].items())
+        out = []
+        for i, (u, (wu, _)) in enumerate(nbrs):
+            rest = nbrs[i + 1:]
+            if not rest:
+                continue
+            max_dist = wu + max(w for _, (w, _) in rest)
+            dist = witness_dists(u, v, max_dist, {x for x, _ in rest}, limit)
+            for x, (wx, _) in rest:
+                via = wu + wx
+                if dist.get(x, float('inf')) > via:
+                    out.append((u, x, via))
+        return out
+
+    def priority(v: int) -> int:
+        # diferencia de aristas + vecinos contraídos + profundidad en la jerarquía
+        return len(shortcuts_for(v, _PRIORITY_SETTLE_LIMIT)) - len(adj[v]) + int(deleted_nbrs[v]) + int(level[v])
+
+    # Cola con borrado perezoso: solo vale la entrada con la prioridad vigente
+    prio = [priority(v) for v in range(n)]
+    heap = [(p, v) for v, p in enumerate(prio)]
+    heapq.heapify(heap)
+    order = 0
+    while heap:
+        p, v = heapq.heappop(heap)
+        if contracted[v] or p != prio[v]:
+            continue
+
+        for u, x, via in shortcuts_for(v):
+            cur = adj[u].get(x)
+            if cur is None or via < cur[0]:
+                adj[u][x] = (via, v)
+                adj[x][u] = (via, v)
+
+        for u, (w, mid) in adj[v].items():
+            up_edges[v].append((u, w, mid))
+            del adj[u][v]
+            deleted_nbrs[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+        nbrs = list(adj[v])
+        adj[v] = {}
+        contracted[v] = True
+        rank[v] = order
+        order += 1
+        # Solo cambia la prioridad de los vecinos de `v`
+        for u in nbrs:
+            prio[u] = priority(u)
+            heapq.heappush(heap, (prio[u], u))
+
+    up_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in up_edges], out=up_indptr[1:])
+    m = int(up_indptr[-1])
+    up_indices = np.empty(m, dtype=np.int32)
+    up_weights = np.empty(m, dtype=np.float64)
+    up_middle = np.empty(m, dtype=np.int32)
+    for v, edges in enumerate(up_edges):
+        edges.sort()
+        a = up_indptr[v]
+        for k, (u, w, mid) in enumerate(edges):
+            up_indices[a + k] = u
+            up_weights[a + k] = w
+            up_middle[a + k] = mid
+
+    return ContractionHierarchy(rank, up_indptr, up_indices, up_weights, up_middle)
+
+
+def load_or_build_ch(G: CSRGraph, cache_dir: Optional[Path] = None) -> ContractionHierarchy:
+    """Devuelve el CH del grafo: memoria → disco (`<cache_dir>/ch`) → construcción.
+
+    `cache_dir` por defecto es `G.cache_dir` (entrada de `graph_cache`).
+    """
+    ch = getattr(G, '_ch', None)
+    if ch is not None:
+        return ch
+
+    base = cache_dir if cache_dir is not None else G.cache_dir
+    ch_dir = Path(base) / 'ch' if base is not None else None
+    if ch_dir is not None:
+        loaded = load_arrays(ch_dir, _CH_ARRAYS)
+        if loaded is not None and loaded[0].get('version') == CH_VERSION:
+            ch = ContractionHierarchy(**loaded[1])
+            G._ch = ch
+            return ch
+
+    logger.info("Construyendo Contraction Hierarchies (%s nodos)...", G.n_nodes)
+    ch = build_contraction_hierarchy(G)
+    logger.info("CH listo: %s atajos.", ch.n_shortcuts)
+    if ch_dir is not None:
+        try:
+            save_arrays(
+                ch_dir,
+                {name: getattr(ch, name) for name in _CH_ARRAYS},
+                {'version': CH_VERSION, 'n_nodes': G.n_nodes, 'n_shortcuts': ch.n_shortcuts},
+            )
+        except OSError as e:
+            logger.warning("No se pudo guardar el índice CH en %s: %s", ch_dir, e)
+    G._ch = ch
+    return ch
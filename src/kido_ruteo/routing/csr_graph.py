@@ -0,0 +1,345 @@
+"""kido_ruteo.routing.csr_graph
+
+Grafo vial compacto en formato CSR (compressed sparse row).
+
+Motivación:
+- `nx.Graph` con nodos string "x,y" ocupa gigabytes en la red nacional y cada
+  Dijkstra recorre dicts de dicts en Python.
+- Aquí los nodos son índices int32 densos; la adyacencia vive en arreglos
+  `indptr`/`indices`, los pesos en float32 y las coordenadas en un arreglo
+  (n, 2) en el CRS de la red (metros si está proyectada).
+
+El grafo es NO dirigido: cada arista se guarda en ambos sentidos.
+
+IDs de nodo:
+- El ID de un nodo en todo el pipeline es su índice entero (0..n-1), asignado
+  una sola vez al construir el grafo (`origin_node_id`, `destination_node_id`,
+  `checkpoint_node_id` son columnas `Int32`).
+- `coords` funciona como tabla de internado: `lookup_coords` traduce
+  coordenadas → ID y `node_key` produce la etiqueta histórica "x,y" solo
+  cuando una salida de depuración la necesita.
+- `nearest_nodes` ajusta puntos arbitrarios (centroides de zona o de
+  checkpoint) al nodo más cercano con un KD-tree de `coords` construido una
+  sola vez por grafo.
+"""
+
+from __future__ import annotations
+
+from typing import Hashable, Optional
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import shapely
+
+_LINESTRING_TYPE_ID = 1
+_LINE_TYPE_IDS = (1, 5)  # LineString, MultiLineString
+
+
+class CSRGraph:
+    """Grafo vial no dirigido con adyacencia CSR.
+
+    Atributos:
+        indptr: int64 (n + 1,). Vecinos de `i` en `indices[indptr[i]:indptr[i + 1]]`.
+        indices: int32 (2m,). Nodo vecino de cada arista dirigida.
+        weights: float32 (2m,). Longitud de cada arista (distancia euclidiana).
+        coords: float64 (n, 2). Coordenadas (x, y) de cada nodo.
+        crs: CRS de las coordenadas (o None).
+        precision: decimales usados para identificar nodos por coordenada.
+        cache_dir: entrada de `graph_cache` con los mismos arreglos en disco
+            (None si el grafo solo vive en memoria).
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: np.ndarray,
+        coords: np.ndarray,
+        crs=None,
+        precision: int = 6,
+    ) -> None:
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.crs = crs
+        self.precision = int(precision)
+        self.cache_dir = None
+        self._grid_order: np.ndarray | None = None
+        self._grid_sorted: np.ndarray | None = None
+        self._kdtree = None
+
+        if len(self.indptr) != len(self.coords) + 1:
+            raise ValueError("indptr debe tener n_nodes + 1 elementos")
+        if len(self.indices) != len(self.weights):
+            raise ValueError("indices y weights deben tener la misma longitud")
+
+    @classmethod
+    def from_edges(
+        cls,
+        u: np.ndarray,
+        v: np.ndarray,
+        w: np.ndarray,
+        coords: np.ndarray,
+        crs=None,
+        precision: int = 6,
+    ) -> "CSRGraph":
+        """Construye el CSR desde una lista de aristas no dirigidas (u, v, w).
+
+        - Se descartan lazos (u == v).
+        - Aristas repetidas (en cualquier sentido) se colapsan conservando el
+          peso de la última en el orden de entrada, como `nx.Graph.add_edge`
+          en `build_network_graph`.
+        """
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        w = np.asarray(w, dtype=np.float64)
+        n = len(coords)
+
+        keep = u != v
+        u, v, w = u[keep], v[keep], w[keep]
+
+        # Simetrizar (no dirigido)
+        src = np.concatenate([u, v])
+        dst = np.concatenate([v, u])
+        wt = np.concatenate([w, w])
+        pos = np.tile(np.arange(len(u)), 2)
+
+        # Ordenar por (src, dst, orden de entrada) y quedarnos con la última
+        order = np.lexsort((pos, dst, src))
+        src, dst, wt = src[order], dst[order], wt[order]
+        if len(src):
+            last = np.ones(len(src), dtype=bool)
+            last[:-1] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+            src, dst, wt = src[last], dst[last], wt[last]
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(indptr, dst, wt, coords, crs=crs, precision=precision)
+
+    @classmethod
+    def from_networkx(cls, G: nx.Graph, precision: int = 6) -> "CSRGraph":
+        """Convierte un `nx.Graph` (nodos con atributo `pos` o `x`/`y`)."""
+        nodes = list(G.nodes())
+        index = {n: i for i, n in enumerate(nodes)}
+        coords = np.empty((len(nodes), 2), dtype=np.float64)
+        for i, n in enumerate(nodes):
+            data = G.nodes[n]
+            if 'x' in data and 'y' in data:
+                coords[i] = (data['x'], data['y'])
+            else:
+                coords[i] = data['pos'][:2]
+
+        edges = list(G.edges(data='weight', default=1.0))
+        u = np.fromiter((index[a] for a, _, _ in edges), dtype=np.int64, count=len(edges))
+        v = np.fromiter((index[b] for _, b, _ in edges), dtype=np.int64, count=len(edges))
+        w = np.fromiter((wt for _, _, wt in edges), dtype=np.float64, count=len(edges))
+        return cls.from_edges(u, v, w, coords, crs=G.graph.get('crs'), precision=precision)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.coords)
+
+    @property
+    def n_edges(self) -> int:
+        """Número de aristas no dirigidas."""
+        return len(self.indices) // 2
+
+    def __len__(self) -> int:
+        return self.n_nodes
+
+    def __contains__(self, node: Hashable) -> bool:
+        return self.node_index(node) is not None
+
+    def neighbors(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        """Devuelve (vecinos, pesos) del nodo `i`."""
+        a, b = self.indptr[i], self.indptr[i + 1]
+        return self.indices[a:b], self.weights[a:b]
+
+    def node_key(self, i: int) -> str:
+        """Etiqueta "x,y" del nodo (`precision` decimales). Solo para depuración."""
+        x, y = self.coords[i]
+        p = self.precision
+        return f"{x:.{p}f},{y:.{p}f}"
+
+    def node_index(self, node: Hashable) -> Optional[int]:
+        """Normaliza un ID de nodo al índice interno (None si no existe).
+
+        Acepta enteros (también floats integrales, p.ej. desde columnas con NaN)
+        y, por compatibilidad, etiquetas "x,y".
+        """
+        if isinstance(node, str):
+            try:
+                x, y = (float(c) for c in node.split(','))
+            except ValueError:
+                return None
+            i = int(self.lookup_coords(np.array([[x, y]]))[0])
+            return i if i >= 0 else None
+        if isinstance(node, (bool, np.bool_)):
+            return None
+        if isinstance(node, (int, np.integer)):
+            i = int(node)
+        elif isinstance(node, (float, np.floating)) and float(node).is_integer():
+            i = int(node)
+        else:
+            return None
+        return i if 0 <= i < self.n_nodes else None
+
+    def lookup_coords(self, xy: np.ndarray) -> np.ndarray:
+        """IDs (int32) de los nodos en las coordenadas `xy` (m, 2); -1 si no existen.
+
+        La coincidencia es exacta sobre la malla de `precision` decimales.
+        """
+        if self._grid_sorted is None:
+            grid = self._to_grid(self.coords)
+            self._grid_order = np.argsort(grid, order=('x', 'y'), kind='stable')
+            self._grid_sorted = grid[self._grid_order]
+
+        q = self._to_grid(np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+        pos = np.searchsorted(self._grid_sorted, q)
+        pos_c = np.minimum(pos, max(len(self._grid_sorted) - 1, 0))
+        found = (pos < len(self._grid_sorted))
+        if len(self._grid_sorted):
+            found &= self._grid_sorted[pos_c] == q
+        out = np.full(len(q), -1, dtype=np.int32)
+        if found.any():
+            out[found] = self._grid_order[pos_c[found]]
+        return out
+
+    def nearest_nodes(self, xy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Nodo más cercano a cada punto `xy` (m, 2), en una sola consulta.
+
+        Returns:
+            (ids, dist): IDs int32 y distancia euclidiana en unidades del CRS.
+            El KD-tree se construye la primera vez y queda en el grafo.
+        """
+        if self.n_nodes == 0:
+            raise ValueError("El grafo no tiene nodos")
+        if self._kdtree is None:
+            from scipy.spatial import cKDTree
+
+            self._kdtree = cKDTree(self.coords)
+        dist, idx = self._kdtree.query(np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+        return idx.astype(np.int32), dist
+
+    def _to_grid(self, xy: np.ndarray) -> np.ndarray:
+        g = np.rint(xy * 10.0 ** self.precision).astype(np.int64)
+        out = np.empty(len(g), dtype=[('x', np.int64), ('y', np.int64)])
+        out['x'] = g[:, 0]
+        out['y'] = g[:, 1]
+        return out
+
+    def pos(self, node: Hashable) -> Optional[tuple[float, float]]:
+        i = self.node_index(node)
+        if i is None:
+            return None
+        x, y = self.coords[i]
+        return float(x), float(y)
+
+    def to_networkx(self) -> nx.Graph:
+        """Reconstruye un `nx.Graph` equivalente (solo para depuración/plots).
+
+        Los nodos conservan el ID entero; la etiqueta "x,y" queda en el atributo `key`.
+        """
+        G = nx.Graph()
+        G.graph['crs'] = self.crs
+        for i in range(self.n_nodes):
+            G.add_node(i, pos=tuple(self.coords[i]), key=self.node_key(i))
+        src = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+        upper = src < self.indices
+        G.add_weighted_edges_from(
+            zip(src[upper].tolist(), self.indices[upper].tolist(), self.weights[upper].astype(float).tolist())
+        )
+        return G
+
+
+def nearest_nodes(G, xy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """`CSRGraph.nearest_nodes` para cualquier grafo del pipeline.
+
+    Con `nx.Graph` se indexan los nodos con atributo `pos`; el KD-tree se
+    guarda en el grafo (se reconstruye si cambia el número de nodos) y los IDs
+    se devuelven como arreglo object.
+    """
+    if isinstance(G, CSRGraph):
+        return G.nearest_nodes(xy)
+
+    index = getattr(G, '_node_kdtree', None)
+    if index is None or index[0] != G.number_of_nodes():
+        from scipy.spatial import cKDTree
+
+        ids = [n for n, data in G.nodes(data=True) if 'pos' in data]
+        if not ids:
+            raise ValueError("El grafo no tiene nodos con atributo 'pos'")
+        node_ids = np.empty(len(ids), dtype=object)
+        node_ids[:] = ids
+        tree = cKDTree(np.array([G.nodes[n]['pos'] for n in ids], dtype=np.float64))
+        index = (G.number_of_nodes(), node_ids, tree)
+        G._node_kdtree = index
+    _, node_ids, tree = index
+    dist, idx = tree.query(np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+    return node_ids[idx], dist
+
+
+def network_edge_arrays(
+    red_gdf: gpd.GeoDataFrame,
+    precision: int = 6,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Extrae nodos y aristas de la red como arreglos (vectorizado).
+
+    - LineString y MultiLineString (cada parte por separado); otras geometrías se ignoran.
+    - Nodo = coordenada redondeada a `precision` decimales; su posición es la
+      primera coordenada cruda vista y los índices siguen el orden de aparición.
+    - Arista = par de vértices consecutivos de una misma parte, con peso
+      euclidiano calculado sobre las coordenadas crudas.
+
+    Returns:
+        (coords (n, 2) float64, u int64, v int64, w float64)
+    """
+    geoms = np.asarray(red_gdf.geometry.values, dtype=object)
+    geoms = geoms[np.isin(shapely.get_type_id(geoms), _LINE_TYPE_IDS)]
+    parts = shapely.get_parts(geoms)
+    parts = parts[shapely.get_type_id(parts) == _LINESTRING_TYPE_ID]
+
+    raw, part_idx = shapely.get_coordinates(parts, return_index=True)
+    if len(raw) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return np.empty((0, 2), dtype=np.float64), empty, empty, np.empty(0, dtype=np.float64)
+
+    # Nodos: coordenadas redondeadas sobre una malla entera (evita comparar floats).
+    # Equivale a np.unique(grid, axis=0, return_index, return_inverse) pero con
+    # lexsort, que es ~7x más rápido que el unique por filas.
+    grid = np.rint(raw * 10.0 ** precision).astype(np.int64)
+    sorted_idx = np.lexsort((grid[:, 1], grid[:, 0]))
+    g = grid[sorted_idx]
+    new_group = np.ones(len(g), dtype=bool)
+    new_group[1:] = (g[1:, 0] != g[:-1, 0]) | (g[1:, 1] != g[:-1, 1])
+    inverse = np.empty(len(grid), dtype=np.int64)
+    inverse[sorted_idx] = np.cumsum(new_group) - 1
+    first = sorted_idx[new_group]  # lexsort es estable: primera aparición de cada grupo
+
+    # Renumerar por orden de primera aparición
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    node_of = rank[inverse]
+    coords = raw[first[order]]
+
+    # Aristas: vértices consecutivos de la misma parte
+    same_part = part_idx[1:] == part_idx[:-1]
+    a = np.flatnonzero(same_part)
+    b = a + 1
+    d = raw[b] - raw[a]
+    w = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2)
+    return coords, node_of[a].astype(np.int64), node_of[b].astype(np.int64), w
+
+
+def build_csr_graph(red_gdf: gpd.GeoDataFrame, precision: int = 6) -> CSRGraph:
+    """
+    Construye el grafo CSR directamente desde el GeoDataFrame de la red.
+
+    Mismas reglas que `build_network_graph` (ver `network_edge_arrays`), pero
+    sin pasar por NetworkX: todo el armado es con operaciones de arreglos.
+    """
+    coords, u, v, w = network_edge_arrays(red_gdf, precision=precision)
+    return CSRGraph.from_edges(u, v, w, coords, crs=getattr(red_gdf, 'crs', None), precision=precision)
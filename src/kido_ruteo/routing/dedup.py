@@ -0,0 +1,97 @@
+"""kido_ruteo.routing.dedup
+
+Deduplicación de tareas de ruteo.
+
+Los archivos OD repiten mucho la misma tripleta
+(origin_node_id, destination_node_id, checkpoint_node_id): varias zonas caen
+en el mismo nodo más cercano (`assign_nodes_to_zones`) y, como el grafo es no
+dirigido, MC(o, d) = MC(d, o). `factorize_routes` agrupa las filas por llave,
+se rutea UNA fila representativa por llave y el resultado se reparte a todas
+las filas con `RouteKeys.inverse`.
+
+Con `symmetric=True` (solo MC) (o, d) y (d, o) comparten llave; `flipped`
+marca las filas orientadas al revés que su representante (su camino es el
+del representante invertido). MC2 no es simétrico: el sentido en el
+checkpoint depende de la orientación.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class RouteKeys:
+    """Llaves únicas de un lote de filas.
+
+    Atributos:
+        first: int64 (k,). Fila representativa (primera aparición) de cada llave.
+        inverse: int64 (n,). Llave de cada fila.
+        flipped: bool (n,). La fila es (d, o) de su representante (solo
+            `symmetric=True`; si no, todo False).
+    """
+
+    first: np.ndarray
+    inverse: np.ndarray
+    flipped: np.ndarray
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.inverse.size)
+
+    @property
+    def n_unique(self) -> int:
+        return int(self.first.size)
+
+    @property
+    def ratio(self) -> float:
+        """Fracción de filas que NO se rutean (0 = sin duplicados)."""
+        return 1.0 - self.n_unique / self.n_rows if self.n_rows else 0.0
+
+    def report(self) -> str:
+        return (
+            f"  Dedup: {self.n_rows} filas → {self.n_unique} rutas únicas "
+            f"({100.0 * self.ratio:.1f}% evitadas)"
+        )
+
+
+def factorize_routes(
+    origins: Iterable,
+    dests: Iterable,
+    checkpoints: Optional[Iterable] = None,
+    symmetric: bool = False,
+) -> RouteKeys:
+    """Agrupa filas con la misma (origen, destino[, checkpoint]).
+
+    Sirve para cualquier ID de nodo hashable (`CSRGraph` o NetworkX). Las
+    filas con algún nodo NA comparten llave solo con filas idénticas (no se
+    rutean de todos modos).
+    """
+    origins = list(origins)
+    dests = list(dests)
+    n = len(origins)
+    # Códigos enteros comunes a origen y destino (NA → -1)
+    codes, _ = pd.factorize(pd.Series(origins + dests, dtype=object))
+    o, d = codes[:n], codes[n:]
+    flipped = np.zeros(n, dtype=bool)
+    if symmetric:
+        swap = d < o
+        o, d = np.where(swap, d, o), np.where(swap, o, d)
+        flipped = swap
+    cols = [o, d]
+    if checkpoints is not None:
+        cols.append(pd.factorize(pd.Series(list(checkpoints), dtype=object))[0])
+    stacked = np.column_stack(cols) if n else np.zeros((0, len(cols)), dtype=np.int64)
+    _, first, inverse = np.unique(stacked, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # Orden de primera aparición (estable respecto de las filas de entrada)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    first = first[order].astype(np.int64)
+    inverse = rank[inverse].astype(np.int64)
+    return RouteKeys(first=first, inverse=inverse, flipped=flipped ^ flipped[first][inverse])
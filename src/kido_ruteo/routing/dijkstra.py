@@ -0,0 +1,86 @@
+"""kido_ruteo.routing.dijkstra
+
+Dijkstra sobre `CSRGraph` (índices int32, pesos float32).
+
+Los nodos se manejan como índices internos del grafo; la traducción desde/hacia
+IDs de nodo del pipeline ocurre en `shortest_path.py` / `constrained_path.py`.
+Las distancias se acumulan en float64 (float de Python).
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Iterable, List, Optional, Tuple
+
+from .csr_graph import CSRGraph
+
+
+def single_source_dijkstra(
+    G: CSRGraph,
+    source: int,
+    targets: Optional[Iterable[int]] = None,
+    predecessors: bool = True,
+) -> Tuple[dict[int, float], dict[int, int]]:
+    """Dijkstra desde `source`.
+
+    Si se pasan `targets`, la búsqueda se detiene en cuanto todos ellos quedan
+    asentados (o el componente se agota). Con `predecessors=False` no se
+    registran predecesores (solo distancias; `pred` queda vacío).
+
+    Returns:
+        (dist, pred): distancias definitivas de los nodos asentados y mapa de
+        predecesores (el origen no tiene predecesor; los nodos no asentados
+        pueden conservar un predecesor tentativo).
+    """
+    indptr = G.indptr
+    indices = G.indices
+    weights = G.weights
+
+    pending = set(targets) if targets is not None else None
+    if pending is not None:
+        pending.discard(source)
+
+    dist: dict[int, float] = {}
+    pred: dict[int, int] = {}
+    seen: dict[int, float] = {source: 0.0}
+    heap: list[tuple[float, int]] = [(0.0, source)]
+
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in dist:
+            continue
+        dist[u] = d
+        if pending is not None:
+            pending.discard(u)
+            if not pending:
+                break
+
+        a, b = indptr[u], indptr[u + 1]
+        for v, w in zip(indices[a:b].tolist(), weights[a:b].tolist()):
+            if v in dist:
+                continue
+            nd = d + w
+            if nd < seen.get(v, float('inf')):
+                seen[v] = nd
+                if predecessors:
+                    pred[v] = u
+                heapq.heappush(heap, (nd, v))
+
+    return dist, pred
+
+
+def reconstruct_path(pred: dict[int, int], source: int, target: int) -> List[int]:
+    """Reconstruye el camino source → target desde el mapa de predecesores."""
+    path = [target]
+    while path[-1] != source:
+        path.append(pred[path[-1]])
+    path.reverse()
+    return path
+
+
+def shortest_path(G: CSRGraph, source: int, target: int) -> Tuple[Optional[List[int]], Optional[float]]:
+    """Camino mínimo punto a punto. Devuelve (None, None) si no hay ruta."""
+    dist, pred = single_source_dijkstra(G, source, targets=(target,))
+    if target not in dist:
+        return None, None
+    return reconstruct_path(pred, source, target), dist[target]
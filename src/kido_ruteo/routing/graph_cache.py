@@ -0,0 +1,245 @@
+"""kido_ruteo.routing.graph_cache
+
+Caché binaria en disco del `CSRGraph` construido desde la red GeoJSON.
+
+Layout (junto a la red, p.ej. `red.geojson`):
+
+    red.geojson.graphcache/
+        source.json            # (path, size, mtime_ns, sha256) del archivo fuente
+        <key>/                 # una entrada por combinación válida
+            meta.json
+            indptr.npy, indices.npy, weights.npy, coords.npy
+
+`key` = hash de (sha256 del archivo, CRS destino, parámetros de construcción,
+versión del formato). Si cambia cualquiera, la entrada deja de ser válida y se
+reconstruye. Al reconstruir se eliminan solo las entradas de otro contenido
+del archivo o de otra versión del formato (`source_sha256` / `version` en
+`meta.json`); las de otro CRS o `precision` del mismo archivo siguen vigentes.
+
+`meta.json` guarda además la extensión de la red en EPSG:4326
+(`bounds_4326` = [west, south, east, north]) para validar cobertura sin
+volver a leer el GeoJSON (`read_meta`).
+
+Los arreglos se guardan como `.npy` sin comprimir para poder abrirlos con
+`mmap_mode='r'` (carga en milisegundos y páginas compartidas entre procesos).
+Índices derivados del grafo (p.ej. `contraction.py`) viven en subdirectorios
+de la entrada y se invalidan junto con ella (`save_arrays` / `load_arrays`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from pyproj import CRS
+
+from .csr_graph import CSRGraph
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato o la semántica del builder.
+GRAPH_CACHE_VERSION = 4
+
+_ARRAYS = ('indptr', 'indices', 'weights', 'coords')
+
+
+def graph_cache_root(network_path: str) -> Path:
+    """Directorio de caché asociado a un archivo de red."""
+    p = Path(network_path)
+    return p.with_name(p.name + '.graphcache')
+
+
+def file_sha256(path: str, cache_root: Optional[Path] = None) -> str:
+    """SHA-256 del contenido de `path`.
+
+    Si `cache_root` existe y el archivo (ruta, size, mtime) no cambió desde el
+    último cálculo, se reutiliza el hash guardado en `source.json`.
+    """
+    st = os.stat(path)
+    resolved = str(Path(path).resolve())
+    memo_path = cache_root / 'source.json' if cache_root is not None else None
+    if memo_path is not None and memo_path.exists():
+        try:
+            memo = json.loads(memo_path.read_text(encoding='utf-8'))
+            if (
+                memo.get('path') == resolved
+                and memo.get('size') == st.st_size
+                and memo.get('mtime_ns') == st.st_mtime_ns
+            ):
+                return str(memo['sha256'])
+        except (ValueError, KeyError, OSError):
+            pass
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+
+    if memo_path is not None:
+        memo_path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(
+            memo_path,
+            json.dumps({'path': resolved, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}),
+        )
+    return digest
+
+
+def graph_cache_key(source_sha256: str, target_crs: Optional[str], precision: int) -> str:
+    payload = json.dumps(
+        {
+            'version': GRAPH_CACHE_VERSION,
+            'source_sha256': source_sha256,
+            'target_crs': target_crs or 'auto-utm',
+            'precision': int(precision),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+def read_meta(entry_dir: Path) -> Optional[dict]:
+    """`meta.json` de una entrada (None si no existe o no se puede leer)."""
+    try:
+        return json.loads((entry_dir / 'meta.json').read_text(encoding='utf-8'))
+    except (ValueError, OSError):
+        return None
+
+
+def load_arrays(entry_dir: Path, names, mmap: bool = True) -> Optional[Tuple[dict, dict]]:
+    """Abre `meta.json` + `<name>.npy` de un directorio de arreglos.
+
+    Devuelve (meta, arrays) o None si la entrada no existe o está corrupta.
+    """
+    meta_path = entry_dir / 'meta.json'
+    if not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        arrays = {
+            name: np.load(entry_dir / f'{name}.npy', mmap_mode='r' if mmap else None)
+            for name in names
+        }
+    except (ValueError, OSError) as e:
+        logger.warning("Caché inválida en %s (%s). Se reconstruirá.", entry_dir, e)
+        return None
+    return meta, arrays
+
+
+def save_arrays(entry_dir: Path, arrays: dict, meta: dict) -> None:
+    """Escribe arreglos `.npy` + `meta.json` de forma atómica (directorio temporal + rename)."""
+    entry_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = entry_dir.with_name(f'.{entry_dir.name}.{uuid.uuid4().hex}.tmp')
+    tmp_dir.mkdir()
+    try:
+        for name, arr in arrays.items():
+            np.save(tmp_dir / f'{name}.npy', np.ascontiguousarray(arr))
+        (tmp_dir / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            if load_arrays(entry_dir, arrays) is None:
+                # Entrada existente corrupta o incompleta: se reemplaza
+                logger.warning("Reemplazando entrada de caché inválida en %s.", entry_dir)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                try:
+                    os.replace(tmp_dir, entry_dir)
+                    return
+                except OSError:
+                    if load_arrays(entry_dir, arrays) is None:
+                        raise
+            # Otro proceso publicó la misma entrada primero: es equivalente.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_graph_cache(entry_dir: Path, mmap: bool = True) -> Optional[CSRGraph]:
+    """Abre una entrada de caché. Devuelve None si está incompleta o corrupta."""
+    loaded = load_arrays(entry_dir, _ARRAYS, mmap=mmap)
+    if loaded is None:
+        return None
+    meta, arrays = loaded
+
+    crs = CRS.from_wkt(meta['crs']) if meta.get('crs') else None
+    G = CSRGraph(
+        arrays['indptr'],
+        arrays['indices'],
+        arrays['weights'],
+        arrays['coords'],
+        crs=crs,
+        precision=int(meta['precision']),
+    )
+    G.cache_dir = entry_dir
+    return G
+
+
+def save_graph_cache(
+    G: CSRGraph,
+    entry_dir: Path,
+    source_sha256: Optional[str] = None,
+    bounds_4326: Optional[Sequence[float]] = None,
+) -> None:
+    """Escribe el grafo en `entry_dir` de forma atómica.
+
+    `source_sha256` (contenido del archivo fuente) permite podar entradas
+    obsoletas y `bounds_4326` validar cobertura sin leer la red.
+    """
+    meta = {
+        'version': GRAPH_CACHE_VERSION,
+        'crs': CRS.from_user_input(G.crs).to_wkt() if G.crs is not None else None,
+        'precision': G.precision,
+        'n_nodes': G.n_nodes,
+        'n_edges': G.n_edges,
+        'source_sha256': source_sha256,
+        'bounds_4326': [float(b) for b in bounds_4326] if bounds_4326 is not None else None,
+    }
+    save_arrays(entry_dir, {name: getattr(G, name) for name in _ARRAYS}, meta)
+
+
+def publish_graph(G: CSRGraph) -> Tuple[Path, bool]:
+    """Deja los arreglos de `G` en disco para que otros procesos los abran con mmap.
+
+    Si `G` ya proviene de (o se guardó en) una entrada de caché, se reutiliza
+    tal cual. Si no, se escribe en un directorio temporal.
+
+    Returns:
+        (entry_dir, temporal): `temporal=True` indica que quien publica debe
+        borrar `entry_dir` al terminar.
+    """
+    if G.cache_dir is not None and (Path(G.cache_dir) / 'meta.json').exists():
+        return Path(G.cache_dir), False
+    entry_dir = Path(tempfile.mkdtemp(prefix='kido_graph_')) / 'graph'
+    save_graph_cache(G, entry_dir)
+    return entry_dir, True
+
+
+def prune_graph_cache(cache_root: Path, source_sha256: str) -> None:
+    """Elimina entradas obsoletas: otro contenido del archivo u otra versión.
+
+    Las entradas del mismo archivo con otro CRS o `precision` se conservan
+    (junto con sus índices derivados y su caché de rutas).
+    """
+    if not cache_root.exists():
+        return
+    for child in cache_root.iterdir():
+        if not child.is_dir() or child.name.startswith('.'):
+            continue
+        meta = read_meta(child) or {}
+        if meta.get('version') != GRAPH_CACHE_VERSION or meta.get('source_sha256') != source_sha256:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
@@ -10,6 +10,17 @@ import logging
 from typing import Optional, Sequence, Tuple
 import pandas as pd
 
+from .csr_graph import CSRGraph, build_csr_graph, network_edge_arrays
+from .graph_cache import (
+    file_sha256,
+    graph_cache_key,
+    graph_cache_root,
+    load_graph_cache,
+    prune_graph_cache,
+    read_meta,
+    save_graph_cache,
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -136,6 +147,29 @@ def ensure_graph_from_geojson_or_osm(
       1) explicit osm_bbox [north, south, east, west]
       2) infer from zonification extent (requires zonification_path)
     """
+    _ensure_network_file(geojson_path, zonification_path, osm_bbox, network_type)
+    return load_graph_from_geojson(geojson_path)
+
+
+def ensure_csr_graph_from_geojson_or_osm(
+    geojson_path: str,
+    zonification_path: Optional[str] = None,
+    osm_bbox: Optional[Sequence[float]] = None,
+    network_type: str = "drive",
+) -> CSRGraph:
+    """Como `ensure_graph_from_geojson_or_osm`, pero devuelve el grafo CSR
+    (`load_csr_graph_from_geojson`, con caché en disco)."""
+    _ensure_network_file(geojson_path, zonification_path, osm_bbox, network_type)
+    return load_csr_graph_from_geojson(geojson_path)
+
+
+def _ensure_network_file(
+    geojson_path: str,
+    zonification_path: Optional[str],
+    osm_bbox: Optional[Sequence[float]],
+    network_type: str,
+) -> None:
+    """Deja en `geojson_path` una red que cubra el bbox (la descarga de OSM si falta o no cubre)."""
     if osm_bbox is not None:
         if len(osm_bbox) != 4:
             raise ValueError("osm_bbox must be [north, south, east, west]")
@@ -150,19 +184,14 @@ def ensure_graph_from_geojson_or_osm(
 
     # If the file exists, validate that it covers the required bbox.
     # This prevents silently using a too-small or wrongly-generated network.
+    # With a warm graph cache the bounds come from its meta.json (no GeoJSON parse).
     if os.path.exists(geojson_path):
         try:
-            red_gdf = gpd.read_file(geojson_path)
-            if red_gdf.empty:
-                raise ValueError("Existing network GeoJSON is empty")
-            if red_gdf.crs is None:
-                raise ValueError("Existing network GeoJSON has no CRS")
+            bounds = cached_network_bounds(geojson_path)
+            if bounds is None:
+                bounds = network_bounds_4326(gpd.read_file(geojson_path))
 
-            red_4326 = red_gdf
-            if (not red_4326.crs.is_geographic) or (str(red_4326.crs).upper() != "EPSG:4326"):
-                red_4326 = red_4326.to_crs("EPSG:4326")
-
-            file_west, file_south, file_east, file_north = map(float, red_4326.total_bounds)
+            file_west, file_south, file_east, file_north = bounds
             covers = (
                 (file_west <= west)
                 and (file_south <= south)
@@ -171,7 +200,7 @@ def ensure_graph_from_geojson_or_osm(
             )
 
             if covers:
-                return load_graph_from_geojson(geojson_path)
+                return
 
             logger.warning(
                 "La red existente en %s NO cubre el bbox requerido. "
@@ -204,7 +233,34 @@ def ensure_graph_from_geojson_or_osm(
     )
     G_osm = download_graph_from_bbox(north=north, south=south, east=east, west=west, network_type=network_type)
     save_graph_to_geojson(G_osm, geojson_path)
-    return load_graph_from_geojson(geojson_path)
+
+def network_bounds_4326(red_gdf: gpd.GeoDataFrame) -> Tuple[float, float, float, float]:
+    """Extensión (west, south, east, north) de la red en EPSG:4326."""
+    if red_gdf.empty:
+        raise ValueError("Existing network GeoJSON is empty")
+    if red_gdf.crs is None:
+        raise ValueError("Existing network GeoJSON has no CRS")
+    red_4326 = red_gdf
+    if (not red_4326.crs.is_geographic) or (str(red_4326.crs).upper() != "EPSG:4326"):
+        red_4326 = red_4326.to_crs("EPSG:4326")
+    west, south, east, north = map(float, red_4326.total_bounds)
+    return west, south, east, north
+
+
+def cached_network_bounds(
+    geojson_path: str,
+    target_crs: Optional[str] = None,
+    precision: int = 6,
+) -> Optional[Tuple[float, float, float, float]]:
+    """Extensión EPSG:4326 guardada en la entrada de caché vigente (None si no hay)."""
+    cache_root = graph_cache_root(geojson_path)
+    if not cache_root.exists():
+        return None
+    key = graph_cache_key(file_sha256(geojson_path, cache_root), target_crs, precision)
+    meta = read_meta(cache_root / key) or {}
+    bounds = meta.get('bounds_4326')
+    return tuple(map(float, bounds)) if bounds is not None else None
+
 
 def load_graph_from_geojson(geojson_path: str) -> nx.Graph:
     """
@@ -214,7 +270,7 @@ def load_graph_from_geojson(geojson_path: str) -> nx.Graph:
         geojson_path: Ruta al archivo GeoJSON
         
     Returns:
-        Grafo de NetworkX
+        Grafo de NetworkX (ver `load_csr_graph_from_geojson` para el grafo CSR)
     """
     if not os.path.exists(geojson_path):
         raise FileNotFoundError(f"No se encontró el archivo de red: {geojson_path}")
@@ -232,6 +288,76 @@ def load_graph_from_geojson(geojson_path: str) -> nx.Graph:
             
     return build_network_graph(red_gdf)
 
+
+def load_csr_graph_from_geojson(
+    geojson_path: str,
+    use_cache: bool = True,
+    target_crs: Optional[str] = None,
+    precision: int = 6,
+) -> CSRGraph:
+    """
+    Carga el grafo CSR (ver `csr_graph.CSRGraph`) de un GeoJSON de red vial.
+
+    Con `use_cache=True` el grafo construido se persiste junto al archivo
+    (ver `graph_cache`), con llave = hash del contenido + CRS + parámetros.
+    Cargas posteriores abren los arreglos con memory-map y no re-leen el GeoJSON.
+    
+    Args:
+        geojson_path: Ruta al archivo GeoJSON
+        use_cache: Usar/escribir la caché binaria en disco
+        target_crs: CRS destino; None = UTM estimado si la red es geográfica
+        precision: Decimales de coordenada que identifican un nodo
+        
+    Returns:
+        Grafo CSR; `G.to_networkx()` da el grafo de NetworkX.
+    """
+    if not os.path.exists(geojson_path):
+        raise FileNotFoundError(f"No se encontró el archivo de red: {geojson_path}")
+
+    entry_dir = None
+    source_sha256 = None
+    if use_cache:
+        cache_root = graph_cache_root(geojson_path)
+        source_sha256 = file_sha256(geojson_path, cache_root)
+        key = graph_cache_key(source_sha256, target_crs, precision)
+        entry_dir = cache_root / key
+        G = load_graph_cache(entry_dir)
+        if G is not None:
+            logger.info(f"Grafo cargado desde caché: {entry_dir} ({G.n_nodes} nodos, {G.n_edges} aristas).")
+            return G
+
+    red_gdf = gpd.read_file(geojson_path)
+    bounds = None
+    if entry_dir is not None:
+        try:
+            bounds = network_bounds_4326(red_gdf)
+        except ValueError:
+            pass
+    
+    if target_crs is not None:
+        red_gdf = red_gdf.to_crs(target_crs)
+    # Proyectar a UTM (metros) si es geográfico
+    elif red_gdf.crs and red_gdf.crs.is_geographic:
+        try:
+            utm_crs = red_gdf.estimate_utm_crs()
+            red_gdf = red_gdf.to_crs(utm_crs)
+            logger.info(f"Red reproyectada a {utm_crs} para cálculo de distancias en metros.")
+        except Exception as e:
+            logger.warning(f"No se pudo reproyectar la red: {e}. Las distancias podrían estar en grados.")
+            
+    G = build_csr_graph(red_gdf, precision=precision)
+    logger.info(f"Grafo CSR construido: {G.n_nodes} nodos, {G.n_edges} aristas.")
+
+    if entry_dir is not None:
+        try:
+            save_graph_cache(G, entry_dir, source_sha256=source_sha256, bounds_4326=bounds)
+            prune_graph_cache(entry_dir.parent, source_sha256)
+            G.cache_dir = entry_dir
+            logger.info(f"Caché de grafo guardada en: {entry_dir}")
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché de grafo en {entry_dir}: {e}")
+    return G
+
 def download_graph_from_bbox(north: float, south: float, east: float, west: float, network_type: str = 'drive') -> nx.Graph:
     """
     Descarga el grafo de red vial desde OpenStreetMap usando un Bounding Box.
@@ -269,6 +395,9 @@ def save_graph_to_geojson(G: nx.Graph, output_path: str):
 def build_network_graph(red_gdf: gpd.GeoDataFrame) -> nx.Graph:
     """
     Construye grafo de red vial desde GeoDataFrame.
+
+    Usa el mismo extractor vectorizado que `build_csr_graph`
+    (`network_edge_arrays`), por lo que también soporta MultiLineString.
     
     Args:
         red_gdf: GeoDataFrame con red vial
@@ -280,29 +409,12 @@ def build_network_graph(red_gdf: gpd.GeoDataFrame) -> nx.Graph:
     # Guardar CRS si existe
     if hasattr(red_gdf, 'crs'):
         G.graph['crs'] = red_gdf.crs
-    
-    for idx, row in red_gdf.iterrows():
-        geom = row.geometry
-        
-        # Extraer nodos de la geometría (LineString)
-        if geom.geom_type == 'LineString':
-            coords = list(geom.coords)
-            
-            # Agregar nodos
-            for coord in coords:
-                node_id = f"{coord[0]:.6f},{coord[1]:.6f}"
-                if not G.has_node(node_id):
-                    G.add_node(node_id, pos=coord)
-            
-            # Agregar aristas entre nodos consecutivos
-            for i in range(len(coords) - 1):
-                node_i = f"{coords[i][0]:.6f},{coords[i][1]:.6f}"
-                node_j = f"{coords[i+1][0]:.6f},{coords[i+1][1]:.6f}"
-                
-                # Calcular peso (distancia euclidiana)
-                dist = ((coords[i][0] - coords[i+1][0])**2 + 
-                       (coords[i][1] - coords[i+1][1])**2)**0.5
-                
-                G.add_edge(node_i, node_j, weight=dist)
+
+    coords, u, v, w = network_edge_arrays(red_gdf)
+    node_ids = [f"{x:.6f},{y:.6f}" for x, y in coords.tolist()]
+    G.add_nodes_from((n, {'pos': (x, y)}) for n, (x, y) in zip(node_ids, coords.tolist()))
+    G.add_weighted_edges_from(
+        (node_ids[a], node_ids[b], dist) for a, b, dist in zip(u.tolist(), v.tolist(), w.tolist())
+    )
     
     return G
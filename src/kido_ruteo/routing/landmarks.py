@@ -0,0 +1,148 @@
+"""kido_ruteo.routing.landmarks
+
+Índice ALT (A*, Landmarks, desigualdad del Triángulo) sobre `CSRGraph`.
+
+- Se eligen ~16 landmarks por selección del punto más lejano dentro del
+  componente conexo más grande, y se precalcula la distancia de cada nodo a
+  cada landmark (`scipy.sparse.csgraph.dijkstra`, una búsqueda por landmark).
+- Para un destino `t`, la cota inferior de d(v, t) es
+  `max_L |d(L, t) - d(L, v)|` (red no dirigida).
+- Las distancias se guardan en float32 (n, k) como `.npy` dentro de la entrada
+  de `graph_cache` (`alt/`) y se abren con memory-map.
+
+El potencial resultante se usa con `astar.bidirectional_astar`.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from .astar import Potential
+from .csr_graph import CSRGraph
+from .graph_cache import load_arrays, save_arrays
+from .scipy_backend import csgraph_matrix, shortest_path_trees
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato o la selección de landmarks.
+ALT_VERSION = 1
+
+DEFAULT_N_LANDMARKS = 16
+
+_ALT_ARRAYS = ('landmarks', 'dist')
+
+
+class LandmarkIndex:
+    """Distancias nodo → landmark.
+
+    Atributos:
+        landmarks: int32 (k,). Índices de nodo de los landmarks.
+        dist: float32 (n, k). Distancia de cada nodo a cada landmark (inf si
+            está en otro componente).
+    """
+
+    def __init__(self, landmarks, dist) -> None:
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+        self.dist = np.asarray(dist, dtype=np.float32)
+        finite = self.dist[np.isfinite(self.dist)]
+        top = float(finite.max()) if finite.size else 0.0
+        # Margen por redondeo a float32 de ambas distancias restadas
+        self._slack = 4.0 * float(np.spacing(np.float32(top)))
+
+    def _bound(self, row: np.ndarray, ref: np.ndarray) -> float:
+        # Landmarks en otro componente (inf) no aportan cota
+        diff = np.zeros_like(row)
+        np.subtract(ref, row, out=diff, where=np.isfinite(ref) & np.isfinite(row))
+        return max(0.0, float(np.abs(diff).max()) - self._slack)
+
+    def lower_bound(self, v: int, t: int) -> float:
+        """Cota inferior de d(v, t)."""
+        return self._bound(self.dist[v].astype(np.float64), self.dist[t].astype(np.float64))
+
+    def potential(self, source: int, target: int) -> Potential:
+        """Potencial promedio (ver `astar`) con cotas de landmarks."""
+        ds = self.dist[source].astype(np.float64)
+        dt = self.dist[target].astype(np.float64)
+        cache: dict[int, float] = {}
+
+        def potential(v: int) -> float:
+            p = cache.get(v)
+            if p is None:
+                row = self.dist[v].astype(np.float64)
+                p = 0.5 * (self._bound(row, dt) - self._bound(row, ds))
+                cache[v] = p
+            return p
+
+        return potential
+
+
+def select_landmarks(G: CSRGraph, n_landmarks: int = DEFAULT_N_LANDMARKS) -> LandmarkIndex:
+    """Selección por punto más lejano dentro del componente conexo más grande."""
+    n = G.n_nodes
+    _, labels = connected_components(csgraph_matrix(G), directed=False)
+    main = labels == np.bincount(labels).argmax()
+    k = int(min(n_landmarks, main.sum()))
+
+    dist = np.full((n, k), np.inf, dtype=np.float32)
+    landmarks = np.empty(k, dtype=np.int32)
+
+    # Arranque: el nodo más lejano a un nodo arbitrario del componente
+    start = int(np.flatnonzero(main)[0])
+    d0, _ = shortest_path_trees(G, [start])
+    nearest = np.where(main, d0[0], -np.inf)
+    for i in range(k):
+        cand = int(np.argmax(nearest))
+        landmarks[i] = cand
+        d, _ = shortest_path_trees(G, [cand])
+        dist[:, i] = d[0]
+        if i == 0:
+            nearest = np.where(main, d[0], -np.inf)
+        else:
+            nearest = np.minimum(nearest, np.where(main, d[0], -np.inf))
+    return LandmarkIndex(landmarks, dist)
+
+
+def load_or_build_landmarks(
+    G: CSRGraph,
+    cache_dir: Optional[Path] = None,
+    n_landmarks: int = DEFAULT_N_LANDMARKS,
+) -> LandmarkIndex:
+    """Devuelve el índice ALT: memoria → disco (`<cache_dir>/alt`) → construcción.
+
+    `cache_dir` por defecto es `G.cache_dir` (entrada de `graph_cache`).
+    """
+    idx = getattr(G, '_alt', None)
+    if idx is not None:
+        return idx
+
+    base = cache_dir if cache_dir is not None else G.cache_dir
+    alt_dir = Path(base) / 'alt' if base is not None else None
+    if alt_dir is not None:
+        loaded = load_arrays(alt_dir, _ALT_ARRAYS)
+        if (
+            loaded is not None
+            and loaded[0].get('version') == ALT_VERSION
+            and loaded[0].get('n_landmarks') == n_landmarks
+        ):
+            idx = LandmarkIndex(**loaded[1])
+            G._alt = idx
+            return idx
+
+    logger.info("Construyendo índice ALT (%s landmarks, %s nodos)...", n_landmarks, G.n_nodes)
+    idx = select_landmarks(G, n_landmarks=n_landmarks)
+    if alt_dir is not None:
+        try:
+            save_arrays(
+                alt_dir,
+                {'landmarks': idx.landmarks, 'dist': idx.dist},
+                {'version': ALT_VERSION, 'n_landmarks': n_landmarks, 'n_nodes': G.n_nodes},
+            )
+        except OSError as e:
+            logger.warning("No se pudo guardar el índice ALT en %s: %s", alt_dir, e)
+    G._alt = idx
+    return idx
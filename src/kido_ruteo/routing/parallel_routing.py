@@ -7,7 +7,11 @@ Motivación:
 - En Windows se requiere multiprocessing para usar múltiples núcleos.
 
 Notas:
-- En Windows, "spawn" no comparte memoria: cada worker mantiene su propio grafo.
+- El proceso padre carga (o construye) el grafo UNA sola vez y publica sus
+    arreglos CSR en disco (la entrada de `graph_cache`). Los workers los abren con
+    `np.load(mmap_mode='r')`: no re-leen el GeoJSON y las páginas del grafo se
+    comparten entre procesos vía page cache (también con "spawn" en Windows), así
+    que la memoria residente no crece con el número de workers.
 - Este módulo permite reutilizar un pool entre múltiples ejecuciones para evitar
     re-cargar el grafo por cada checkpoint.
 """
@@ -19,110 +23,340 @@ from dataclasses import dataclass
 from typing import Iterable, Optional
 
 import ast
+import logging
 import math
 import os
+import shutil
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
-from .graph_loader import load_graph_from_geojson
-from .shortest_path import compute_shortest_path_mc
-from .constrained_path import compute_constrained_shortest_path, derive_sense_from_path, _load_valid_sense_codes
-
+from .checkpoint_table import load_or_build_checkpoint_table
+from .csr_graph import CSRGraph
+from .dedup import factorize_routes
+from .route_cache import DISTANCE_ONLY_CATALOG, RouteCache, catalog_key
+from .graph_cache import load_graph_cache, publish_graph
+from .graph_loader import load_csr_graph_from_geojson
+from .point_to_point import prepare_method_index, validate_method
+from .scipy_backend import validate_backend
+from .shortest_path import compute_shortest_path_mc, compute_shortest_paths_from_origin
+from .turn_table import TurnSenseTable
+from .sense_kernels import SENSE_CATEGORIES
+from .zone_matrix import ZoneDistanceMatrix, load_or_build_zone_matrix
+from .constrained_path import (
+    compute_constrained_turn,
+    compute_mc2_matrix,
+    derive_sense_codes,
+    _load_valid_sense_codes,
+)
+
+logger = logging.getLogger(__name__)
 
 # Globales del worker (uno por proceso)
 _G = None
 _valid_sense_codes: set[str] | None = None
-
-
-def _init_worker(network_path: str, sense_catalog_path: Optional[str]) -> None:
-    global _G, _valid_sense_codes
-    _G = load_graph_from_geojson(network_path)
+_backend = 'python'
+_method = 'dijkstra'
+_turn_senses: TurnSenseTable | None = None
+_route_cache: RouteCache | None = None
+_catalog = ''
+_table_nodes: list = []
+
+
+def _init_worker(
+    graph_dir: str,
+    sense_catalog_path: Optional[str],
+    backend: str = 'python',
+    method: str = 'dijkstra',
+    turn_senses: Optional[TurnSenseTable] = None,
+    route_cache_path: Optional[str] = None,
+    table_nodes: Optional[list] = None,
+) -> None:
+    global _G, _valid_sense_codes, _backend, _method, _turn_senses, _route_cache, _catalog, _table_nodes
+    _backend = backend
+    _method = method
+    _turn_senses = turn_senses
+    # Nodos extra de cada tabla de checkpoint (p.ej. todos los nodos de zona)
+    _table_nodes = list(table_nodes) if table_nodes is not None else []
+    # Caché de rutas del padre, en solo lectura (el padre escribe los resultados)
+    _route_cache = RouteCache(route_cache_path, readonly=True) if route_cache_path else None
+    # Adjunta los arreglos publicados por el padre (memory-map, sin copia).
+    _G = load_graph_cache(Path(graph_dir), mmap=True)
+    if _G is None:
+        raise RuntimeError(f"No se pudo abrir el grafo publicado en {graph_dir}")
+    # Índices de consulta (p.ej. CH) ya persistidos por el padre junto al grafo
+    prepare_method_index(_G, _method)
     _valid_sense_codes = _load_valid_sense_codes(sense_catalog_path)
+    _catalog = catalog_key(_valid_sense_codes)
 
 
 @dataclass(frozen=True)
-class _Task:
-    idx: int
-    origin_node: object
-    dest_node: object
-    checkpoint_node: object
+class _Chunk:
+    """Lote de tareas como arreglos (índices de nodo; -1 = NA)."""
+
+    # Llave de cada tripleta (ver `dedup.factorize_routes`)
+    keys: np.ndarray
+    origins: np.ndarray
+    dests: np.ndarray
+    checkpoints: np.ndarray
+    # False si MC ya salió de la matriz zona × zona del padre (o va en otro chunk)
+    mc: np.ndarray
+    # False si MC2/sentido van en otro chunk
+    mc2: np.ndarray
+    # MC2 desde la tabla del checkpoint (`checkpoint_table`) en vez de por fila
+    table: np.ndarray
+    # MC2 solo distancia, `sense_code` '0' (checkpoints agregados)
+    dist_only: np.ndarray
+
+
+@dataclass
+class _ChunkResult:
+    """Resultados de un `_Chunk` (mismo orden que `keys`).
+
+    Distancias NaN = sin ruta (como en el cómputo secuencial). `mc_path` es
+    la lista de nodos (el padre la invierte en pares (d, o)). `sense_code`
+    es el código en `SENSE_CATEGORIES` (-1 = NaN). `*_done` indica qué se
+    calculó y `*_hit` qué salió de la caché de rutas (el padre marca esos
+    hits como usados: los workers la abren en solo lectura).
+    """
+
+    keys: np.ndarray
+    mc_done: np.ndarray
+    mc_hit: np.ndarray
+    mc_distance_m: np.ndarray
+    mc_time_h: np.ndarray
+    mc_path: np.ndarray
+    mc2_done: np.ndarray
+    mc2_hit: np.ndarray
+    mc2_distance_m: np.ndarray
+    sense_code: np.ndarray
 
 
-def _process_chunk(tasks: list[_Task]) -> list[dict]:
+def _process_chunk(chunk: _Chunk) -> _ChunkResult:
     global _G, _valid_sense_codes
     if _G is None or _valid_sense_codes is None:
         raise RuntimeError("Worker no inicializado (falta grafo/catálogo)")
 
-    out: list[dict] = []
-
-    for t in tasks:
-        origin = t.origin_node
-        dest = t.dest_node
-        checkpoint = t.checkpoint_node
-
-        if pd.isna(origin) or pd.isna(dest):
-            out.append(
-                {
-                    "idx": t.idx,
-                    "mc_path": None,
-                    "mc_distance_m": 0.0,
-                    "mc_time_h": 0.0,
-                    "mc2_distance_m": 0.0,
-                    "sense_code": np.nan,
-                }
+    n = chunk.keys.size
+    valid = (chunk.origins >= 0) & (chunk.dests >= 0)
+    res = _ChunkResult(
+        keys=chunk.keys,
+        # Filas con nodo faltante: todo en NaN
+        mc_done=chunk.mc | ~valid,
+        mc_hit=np.zeros(n, dtype=bool),
+        mc_distance_m=np.full(n, np.nan),
+        mc_time_h=np.full(n, np.nan),
+        mc_path=np.full(n, None, dtype=object),
+        mc2_done=chunk.mc2 | ~valid,
+        mc2_hit=np.zeros(n, dtype=bool),
+        mc2_distance_m=np.full(n, np.nan),
+        sense_code=np.full(n, -1, dtype=np.int8),
+    )
+
+    # MC (caché → búsqueda)
+    rows = np.flatnonzero(chunk.mc & valid)
+    if _route_cache is not None and rows.size:
+        cached, found = _route_cache.get_mc(chunk.origins[rows], chunk.dests[rows])
+        res.mc_hit[rows] = found
+        res.mc_distance_m[rows[found]] = cached[found]
+        res.mc_time_h[rows[found]] = cached[found] / 40.0
+        rows = rows[~found]
+    if _method == 'dijkstra':
+        # El chunk viene agrupado por origen (`_schedule`): una búsqueda por origen
+        for origin in np.unique(chunk.origins[rows]).tolist():
+            group = rows[chunk.origins[rows] == origin]
+            found = compute_shortest_paths_from_origin(
+                _G, origin, chunk.dests[group].tolist(), backend=_backend
             )
-            continue
+            for i in group.tolist():
+                mc_path, mc_dist = found[int(chunk.dests[i])]
+                res.mc_path[i] = mc_path or None
+                if mc_dist is not None:
+                    res.mc_distance_m[i] = mc_dist
+                    res.mc_time_h[i] = mc_dist / 40.0  # horas (40 km/h)
+    else:
+        for i in rows.tolist():
+            mc_path, mc_dist, mc_time = compute_shortest_path_mc(
+                _G, int(chunk.origins[i]), int(chunk.dests[i]), backend=_backend, method=_method
+            )
+            res.mc_path[i] = mc_path or None
+            if mc_dist is not None:
+                res.mc_distance_m[i] = mc_dist
+                res.mc_time_h[i] = mc_time
+
+    # MC2 (caché → tabla del checkpoint o búsqueda por fila)
+    rows = np.flatnonzero(valid & (chunk.checkpoints >= 0) & chunk.mc2)
+    if _route_cache is not None and rows.size:
+        # Las filas solo distancia van con su propio catálogo
+        for sel, catalog in (
+            (rows[~chunk.dist_only[rows]], _catalog),
+            (rows[chunk.dist_only[rows]], DISTANCE_ONLY_CATALOG),
+        ):
+            if sel.size == 0:
+                continue
+            cached, sense, found = _route_cache.get_mc2(
+                chunk.origins[sel], chunk.dests[sel], chunk.checkpoints[sel], catalog
+            )
+            res.mc2_hit[sel] = found
+            res.mc2_distance_m[sel[found]] = cached[found]
+            res.sense_code[sel[found]] = _sense_codes(np.asarray(sense, dtype=object)[found])
+        rows = rows[~res.mc2_hit[rows]]
+    _route_checkpoint_tables(chunk, rows[chunk.table[rows]], res)
+    rows = rows[~chunk.table[rows]]
+    turns: list[tuple] = []
+    for i in rows.tolist():
+        mc2_dist, u, c, w = compute_constrained_turn(
+            _G, int(chunk.origins[i]), int(chunk.dests[i]), int(chunk.checkpoints[i]),
+            backend=_backend, method=_method,
+        )
+        if mc2_dist is not None:
+            res.mc2_distance_m[i] = mc2_dist
+        turns.append((u, c, w))
+    if turns:
+        u, c, w = (list(x) for x in zip(*turns))
+        res.sense_code[rows] = _sense_codes(
+            derive_sense_codes(_G, u, c, w, _valid_sense_codes, turn_senses=_turn_senses)
+        )
+
+    # Checkpoint agregado: mismo sentido que fija `match_capacity_to_od`
+    res.sense_code[chunk.mc2 & chunk.dist_only] = SENSE_CATEGORIES.index('0')
+    return res
+
+
+def _route_checkpoint_tables(chunk: _Chunk, rows: np.ndarray, res: _ChunkResult) -> None:
+    """MC2 y sentido de `rows` desde la tabla persistente de cada checkpoint.
 
-        # MC
-        mc_path, mc_dist, mc_time = compute_shortest_path_mc(_G, origin, dest)
-
-        # MC2
-        sense = np.nan
-        mc2_dist = 0.0
-        if not pd.isna(checkpoint):
-            cp = str(checkpoint)
-            mc2_path, mc2_dist_val = compute_constrained_shortest_path(_G, origin, dest, cp)
-            if mc2_dist_val is not None:
-                mc2_dist = float(mc2_dist_val)
-            if mc2_path:
-                candidate = derive_sense_from_path(_G, mc2_path, cp)
-                if candidate == "0":
-                    sense = "0"
-                elif candidate and (candidate in _valid_sense_codes) and (candidate != "0"):
-                    sense = candidate
-
-        out.append(
-            {
-                "idx": t.idx,
-                "mc_path": str(mc_path) if mc_path else None,
-                "mc_distance_m": float(mc_dist) if mc_dist is not None else 0.0,
-                "mc_time_h": float(mc_time) if mc_time is not None else 0.0,
-                "mc2_distance_m": mc2_dist,
-                "sense_code": sense,
-            }
+    El chunk trae checkpoints completos (`_schedule(split=False)`): cada tabla
+    se carga o construye en un solo worker.
+    """
+    if rows.size == 0:
+        return
+    turn_u: list = [None] * rows.size
+    turn_c: list = [None] * rows.size
+    turn_w: list = [None] * rows.size
+    for checkpoint in np.unique(chunk.checkpoints[rows]).tolist():
+        pos = np.flatnonzero(chunk.checkpoints[rows] == checkpoint)
+        group = rows[pos]
+        row_o = chunk.origins[group].tolist()
+        row_d = chunk.dests[group].tolist()
+        table = load_or_build_checkpoint_table(
+            _G, checkpoint, row_o + row_d + _table_nodes, backend=_backend,
+            hops=not chunk.dist_only[group].all(),
         )
+        if table is None:
+            continue
+        dist, u, w = table.route(row_o, row_d)
+        res.mc2_distance_m[group] = dist
+        for k, p in enumerate(pos.tolist()):
+            if u[k] >= 0 and w[k] >= 0:
+                turn_u[p], turn_c[p], turn_w[p] = int(u[k]), table.checkpoint, int(w[k])
+    res.sense_code[rows] = _sense_codes(
+        derive_sense_codes(_G, turn_u, turn_c, turn_w, _valid_sense_codes, turn_senses=_turn_senses)
+    )
+
+
+def _schedule(
+    coords: np.ndarray,
+    origins: np.ndarray,
+    dests: np.ndarray,
+    checkpoints: np.ndarray,
+    todo: np.ndarray,
+    chunk_size: int,
+    n_workers: int,
+    by_checkpoint: bool = True,
+    single_source: bool = False,
+    by_origin: bool = True,
+    split: bool = True,
+) -> list[np.ndarray]:
+    """Agrupa las llaves `todo` en chunks con localidad y costo parejo.
+
+    - Unidad de trabajo = llaves con el mismo (checkpoint, origen) (o solo el
+      mismo origen con `by_checkpoint=False`, o solo el mismo checkpoint con
+      `by_origin=False`): comparten la búsqueda desde el origen (o la tabla
+      del checkpoint).
+    - Costo estimado de una unidad = búsquedas × radio²: una búsqueda de un
+      solo origen (`single_source`, Dijkstra o tabla del checkpoint) o una
+      por fila (métodos punto a punto); el radio es la distancia euclidiana
+      máxima del origen a sus destinos relativa a la extensión del grafo (un
+      Dijkstra asienta un área ∝ r²).
+    - Unidades más caras que la meta (costo total / (4 × workers)) se parten
+      para que los workers libres las compartan (salvo `split=False`: p.ej.
+      una tabla de checkpoint, que se construiría en varios workers); las
+      chicas se juntan hasta la meta o `chunk_size` filas.
+    - Los chunks salen de mayor a menor costo: el pool los reparte a medida
+      que cada worker se libera (los más caros primero, los chicos al final
+      rellenan a los workers ociosos).
+    """
+    if todo.size == 0:
+        return []
+    # Orden por (checkpoint, origen): unidades contiguas
+    columns = ([checkpoints] if by_checkpoint else []) + ([origins] if by_origin or not by_checkpoint else [])
+    todo = todo[np.lexsort([col[todo] for col in reversed(columns)])]
+    unit_key = np.column_stack([col[todo] for col in columns])
+    starts = np.flatnonzero(np.r_[True, (unit_key[1:] != unit_key[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], todo.size]
+
+    # Radio relativo de cada fila (fila con nodo faltante → mínimo)
+    extent = float(np.hypot(*np.ptp(coords, axis=0))) or 1.0
+    ok = (origins[todo] >= 0) & (dests[todo] >= 0)
+    radius = np.full(todo.size, 0.05)
+    a, b = coords[origins[todo][ok]], coords[dests[todo][ok]]
+    radius[ok] = np.clip(np.hypot(*(a - b).T) / extent, 0.05, 1.0)
+
+    cost = np.empty(starts.size)
+    for u, (s0, s1) in enumerate(zip(starts.tolist(), ends.tolist())):
+        searches = 1 if single_source else s1 - s0
+        cost[u] = searches * float(radius[s0:s1].max()) ** 2
+    target = max(float(cost.sum()) / (4 * max(n_workers, 1)), float(cost.min()))
+
+    chunks: list[tuple[float, np.ndarray]] = []
+    pending: list[np.ndarray] = []
+    pending_cost = 0.0
+    pending_rows = 0
+    for u, (s0, s1) in enumerate(zip(starts.tolist(), ends.tolist())):
+        pieces = max(int(np.ceil(cost[u] / target)), int(np.ceil((s1 - s0) / chunk_size))) if split else 1
+        if pieces > 1:
+            # Unidad grande: se parte (cada pedazo repite la búsqueda del origen)
+            for part in np.array_split(todo[s0:s1], pieces):
+                chunks.append((cost[u] / pieces, part))
+            continue
+        if pending and (pending_cost + cost[u] > target or pending_rows + (s1 - s0) > chunk_size):
+            chunks.append((pending_cost, np.concatenate(pending)))
+            pending, pending_cost, pending_rows = [], 0.0, 0
+        pending.append(todo[s0:s1])
+        pending_cost += cost[u]
+        pending_rows += s1 - s0
+    if pending:
+        chunks.append((pending_cost, np.concatenate(pending)))
 
-    return out
+    chunks.sort(key=lambda c: -c[0])
+    return [keys for _, keys in chunks]
 
 
-def _chunked(it: Iterable[_Task], chunk_size: int) -> Iterable[list[_Task]]:
-    chunk: list[_Task] = []
-    for x in it:
-        chunk.append(x)
-        if len(chunk) >= chunk_size:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
+def _sense_codes(senses) -> np.ndarray:
+    """`sense_code` (str / NaN) → código en `SENSE_CATEGORIES` (-1 = NaN)."""
+    return pd.Categorical(list(senses), categories=SENSE_CATEGORIES).codes.astype(np.int8)
+
+
+def _node_index_array(values) -> np.ndarray:
+    """IDs de nodo de `CSRGraph` (con NA) → índices int64 (-1 = NA)."""
+    arr = pd.to_numeric(pd.Series(values, dtype="object"), errors="coerce").to_numpy(dtype=np.float64)
+    return np.where(np.isfinite(arr), arr, -1).astype(np.int64)
 
 
 class ParallelRoutingSession:
     """Sesión reutilizable de ruteo paralelo.
 
-    Crea un ProcessPoolExecutor con initializer que carga el grafo y el catálogo
-    una sola vez por worker. Luego permite calcular MC/MC2 para múltiples dataframes
-    sin re-crear el pool.
+    El grafo se carga una sola vez en el proceso padre (o se recibe ya cargado
+    en `graph`) y los workers lo adjuntan por memory-map; los índices de
+    `method` ('dijkstra', 'ch', 'astar' o 'alt') se construyen o cargan en el
+    padre y se publican junto al grafo. `zone_nodes` resuelve MC desde la
+    matriz zona × zona, `turn_senses` el sentido por búsqueda y
+    `route_cache=True` consulta la caché de rutas antes de buscar. Con
+    Dijkstra (y en filas `distance_only`) MC2 sale de la tabla de cada
+    checkpoint, construida en un solo worker. `compute_mc=False` omite MC.
+    Luego permite calcular MC/MC2 para múltiples dataframes sin re-crear el pool.
     """
 
     def __init__(
@@ -131,6 +365,13 @@ class ParallelRoutingSession:
         sense_catalog_path: Optional[str] = None,
         n_workers: int = 8,
         chunk_size: int = 200,
+        graph: Optional[CSRGraph] = None,
+        backend: str = 'python',
+        method: str = 'dijkstra',
+        zone_nodes: Optional[Iterable] = None,
+        turn_senses: Optional[TurnSenseTable] = None,
+        route_cache: bool = False,
+        compute_mc: bool = True,
     ) -> None:
         if n_workers <= 0:
             raise ValueError("n_workers must be >= 1")
@@ -139,20 +380,53 @@ class ParallelRoutingSession:
 
         self._network_path = str(network_path)
         self._sense_catalog_path = sense_catalog_path
+        # Llave del catálogo de sentidos (caché de rutas); se lee una sola vez
+        self._catalog = catalog_key(_load_valid_sense_codes(sense_catalog_path))
         self._n_workers = int(n_workers)
         self._chunk_size = int(chunk_size)
-
+        self._backend = validate_backend(backend)
+        self._method = validate_method(method)
+        self._zone_nodes = list(zone_nodes) if zone_nodes is not None else None
+        self._zone_matrix: ZoneDistanceMatrix | None = None
+        self._turn_senses = turn_senses
+        self._use_route_cache = bool(route_cache)
+        self._compute_mc = bool(compute_mc)
+        self._route_cache: RouteCache | None = None
+
+        self._G: CSRGraph | None = graph
+        self._graph_dir: Path | None = None
+        self._graph_dir_is_temp = False
         self._executor: ProcessPoolExecutor | None = None
 
     def __enter__(self) -> "ParallelRoutingSession":
+        if self._G is None:
+            self._G = load_csr_graph_from_geojson(self._network_path)
+        if self._use_route_cache:
+            self._route_cache = RouteCache.for_graph(self._G)
+
         if self._n_workers == 1:
             self._executor = None
+            prepare_method_index(self._G, self._method)
+            if self._zone_nodes is not None and self._compute_mc:
+                self._zone_matrix = load_or_build_zone_matrix(self._G, self._zone_nodes)
             return self
 
+        self._graph_dir, self._graph_dir_is_temp = publish_graph(self._G)
+        prepare_method_index(self._G, self._method, cache_dir=self._graph_dir)
+        if self._zone_nodes is not None and self._compute_mc:
+            self._zone_matrix = load_or_build_zone_matrix(self._G, self._zone_nodes, cache_dir=self._graph_dir)
         self._executor = ProcessPoolExecutor(
             max_workers=self._n_workers,
             initializer=_init_worker,
-            initargs=(self._network_path, self._sense_catalog_path),
+            initargs=(
+                str(self._graph_dir),
+                self._sense_catalog_path,
+                self._backend,
+                self._method,
+                self._turn_senses,
+                str(self._route_cache.path) if self._route_cache is not None else None,
+                self._zone_nodes,
+            ),
         )
         return self
 
@@ -160,6 +434,13 @@ class ParallelRoutingSession:
         if self._executor is not None:
             self._executor.shutdown(wait=True, cancel_futures=False)
             self._executor = None
+        if self._route_cache is not None:
+            self._route_cache.log_stats("(sesión)")
+            self._route_cache.close()
+            self._route_cache = None
+        if self._graph_dir is not None and self._graph_dir_is_temp:
+            shutil.rmtree(self._graph_dir.parent, ignore_errors=True)
+        self._graph_dir = None
 
     def compute(
         self,
@@ -167,32 +448,34 @@ class ParallelRoutingSession:
         checkpoint_node_col: str = "checkpoint_node_id",
         origin_node_col: str = "origin_node_id",
         dest_node_col: str = "destination_node_id",
+        distance_only: Optional[Iterable[bool]] = None,
     ) -> pd.DataFrame:
         """Calcula MC + MC2 (+ sense_code) para un dataframe.
 
+        `distance_only` (bool por fila): MC2 solo distancia, `sense_code` '0'
+        (ver `compute_mc2_matrix`).
+
         Devuelve una copia de df_od con:
-          - mc_path, mc_distance_m, mc_time_h
+          - mc_path, mc_distance_m, mc_time_h (solo con `compute_mc=True`)
           - mc2_distance_m, sense_code
         """
-        df = df_od.copy()
-
-        # Pre-crea salidas para preservar el orden de filas
-        if "mc_path" not in df.columns:
-            df["mc_path"] = pd.Series(index=df.index, dtype="object")
-        if "sense_code" not in df.columns:
-            df["sense_code"] = pd.Series(index=df.index, dtype="object")
-        for col in ["mc_distance_m", "mc_time_h", "mc2_distance_m"]:
-            if col not in df.columns:
-                df[col] = np.nan
-
-        # Fallback secuencial
+        # Fallback secuencial (las funciones matriciales agregan sus propias columnas)
         if self._n_workers <= 1:
-            from .graph_loader import load_graph_from_geojson
             from .shortest_path import compute_mc_matrix
-            from .constrained_path import compute_mc2_matrix
 
-            G = load_graph_from_geojson(self._network_path)
-            out = compute_mc_matrix(df, G, origin_node_col=origin_node_col, dest_node_col=dest_node_col)
+            G = self._G if self._G is not None else load_csr_graph_from_geojson(self._network_path)
+            out = df_od
+            if self._compute_mc:
+                out = compute_mc_matrix(
+                    out,
+                    G,
+                    origin_node_col=origin_node_col,
+                    dest_node_col=dest_node_col,
+                    backend=self._backend,
+                    method=self._method,
+                    zone_matrix=self._zone_matrix,
+                    route_cache=self._route_cache,
+                )
             out = compute_mc2_matrix(
                 out,
                 G,
@@ -200,33 +483,172 @@ class ParallelRoutingSession:
                 origin_node_col=origin_node_col,
                 dest_node_col=dest_node_col,
                 sense_catalog_path=self._sense_catalog_path,
+                backend=self._backend,
+                method=self._method,
+                table_nodes=self._zone_nodes,
+                turn_senses=self._turn_senses,
+                route_cache=self._route_cache,
+                distance_only=distance_only,
             )
             return out
 
+        df = df_od.copy()
+
+        # Pre-crea salidas para preservar el orden de filas
+        if "mc_path" not in df.columns and self._compute_mc:
+            df["mc_path"] = pd.Series(index=df.index, dtype="object")
+        if "sense_code" not in df.columns:
+            df["sense_code"] = pd.Series(index=df.index, dtype="object")
+        for col in ["mc_distance_m", "mc_time_h", "mc2_distance_m"]:
+            if col not in df.columns and (self._compute_mc or col == "mc2_distance_m"):
+                df[col] = np.nan
+
         if self._executor is None:
             raise RuntimeError("ParallelRoutingSession not started: use it as a context manager")
 
-        tasks = (
-            _Task(
-                idx=int(i),
-                origin_node=df.at[i, origin_node_col],
-                dest_node=df.at[i, dest_node_col],
-                checkpoint_node=df.at[i, checkpoint_node_col] if checkpoint_node_col in df.columns else np.nan,
+        # MC desde la matriz zona × zona (mismo formato que los workers)
+        in_matrix = pd.Series(False, index=df.index)
+        if self._zone_matrix is not None:
+            mc_dist, found = self._zone_matrix.lookup(df[origin_node_col], df[dest_node_col])
+            mc_dist = np.where(np.isfinite(mc_dist), mc_dist, np.nan)
+            in_matrix = pd.Series(found, index=df.index)
+            df.loc[in_matrix, "mc_distance_m"] = mc_dist[found]
+            df.loc[in_matrix, "mc_time_h"] = mc_dist[found] / 40.0
+
+        # Una tarea por tripleta única; los resultados se reparten a sus filas
+        keys = factorize_routes(
+            df[origin_node_col],
+            df[dest_node_col],
+            df[checkpoint_node_col] if checkpoint_node_col in df.columns else None,
+        )
+        print(keys.report())
+        first = keys.first
+        origins = _node_index_array(df[origin_node_col].to_numpy()[first])
+        dests = _node_index_array(df[dest_node_col].to_numpy()[first])
+        checkpoints = (
+            _node_index_array(df[checkpoint_node_col].to_numpy()[first])
+            if checkpoint_node_col in df.columns
+            else np.full(first.size, -1, dtype=np.int64)
+        )
+        dist_only = (
+            np.asarray(list(distance_only), dtype=bool)[first]
+            if distance_only is not None
+            else np.zeros(first.size, dtype=bool)
+        )
+        # MC solo depende de (o, d) y es simétrico: una tarea por par (filas con
+        # nodo faltante: MC en NaN, las resuelve el worker)
+        pairs = factorize_routes(origins, dests, symmetric=True)
+        need_mc = np.zeros(first.size, dtype=bool)
+        need_mc[pairs.first] = ~in_matrix.to_numpy()[first][pairs.first] & self._compute_mc
+        # MC2 desde la tabla del checkpoint: con Dijkstra y en checkpoints agregados
+        dijkstra = self._method == 'dijkstra'
+        table = dist_only | dijkstra
+        # Chunks de tablas: un checkpoint completo por unidad (sin partir, cada
+        # tabla en un solo worker). Resto: por localidad (checkpoint → origen).
+        # Cada grupo sale de mayor a menor costo; las tablas primero.
+        tables_first = [
+            (k, True) for k in _schedule(
+                self._G.coords, origins, dests, checkpoints, np.flatnonzero(table),
+                self._chunk_size, self._n_workers, single_source=True, by_origin=False, split=False,
             )
-            for i in df.index
+        ] + [
+            (k, False) for k in _schedule(
+                self._G.coords, origins, dests, checkpoints, np.flatnonzero(need_mc | ~table),
+                self._chunk_size, self._n_workers, by_checkpoint=not dijkstra, single_source=dijkstra,
+            )
+        ]
+        chunks = (
+            _Chunk(
+                keys=k,
+                origins=origins[k],
+                dests=dests[k],
+                checkpoints=checkpoints[k],
+                mc=np.zeros(k.size, dtype=bool) if is_table else need_mc[k],
+                mc2=table[k] if is_table else ~table[k],
+                table=table[k],
+                dist_only=dist_only[k],
+            )
+            for k, is_table in tables_first
         )
 
-        results: list[dict] = []
-        for chunk_out in self._executor.map(_process_chunk, _chunked(tasks, self._chunk_size)):
-            results.extend(chunk_out)
+        # Resultados por llave (arreglos preasignados)
+        n = keys.n_unique
+        mc_done = np.zeros(n, dtype=bool)
+        mc_hit = np.zeros(n, dtype=bool)
+        mc_dist = np.full(n, np.nan)
+        mc_time = np.full(n, np.nan)
+        mc_path = np.full(n, None, dtype=object)
+        mc2_done = np.zeros(n, dtype=bool)
+        mc2_hit = np.zeros(n, dtype=bool)
+        mc2_dist = np.full(n, np.nan)
+        sense = np.full(n, -1, dtype=np.int8)
+        for res in self._executor.map(_process_chunk, chunks):
+            # Una llave puede ir en un chunk de MC y en uno de tabla: solo lo calculado
+            k = res.keys[res.mc_done]
+            mc_done[k] = True
+            mc_hit[k], mc_dist[k], mc_time[k], mc_path[k] = (
+                res.mc_hit[res.mc_done], res.mc_distance_m[res.mc_done],
+                res.mc_time_h[res.mc_done], res.mc_path[res.mc_done],
+            )
+            k = res.keys[res.mc2_done]
+            mc2_done[k] = True
+            mc2_hit[k], mc2_dist[k], sense[k] = (
+                res.mc2_hit[res.mc2_done], res.mc2_distance_m[res.mc2_done], res.sense_code[res.mc2_done]
+            )
+
+        # Lo calculado por los workers se guarda en la caché (NaN = sin ruta) y
+        # sus hits se marcan como usados. Las filas solo distancia van con su
+        # catálogo y sin sentido.
+        if self._route_cache is not None:
+            hit = np.flatnonzero(mc_hit)
+            self._route_cache.touch_mc(origins[hit], dests[hit])
+            for sel, cat in ((mc2_hit & ~dist_only, self._catalog), (mc2_hit & dist_only, DISTANCE_ONLY_CATALOG)):
+                self._route_cache.touch_mc2(origins[sel], dests[sel], checkpoints[sel], cat)
+            new = np.flatnonzero(mc_done & ~mc_hit & (origins >= 0) & (dests >= 0))
+            self._route_cache.put_mc(origins[new], dests[new], mc_dist[new])
+            new2 = mc2_done & ~mc2_hit & (origins >= 0) & (dests >= 0) & (checkpoints >= 0)
+            full = np.flatnonzero(new2 & ~dist_only)
+            self._route_cache.put_mc2(
+                origins[full],
+                dests[full],
+                checkpoints[full],
+                mc2_dist[full],
+                pd.Categorical.from_codes(sense[full], categories=SENSE_CATEGORIES),
+                self._catalog,
+            )
+            agg = np.flatnonzero(new2 & dist_only)
+            self._route_cache.put_mc2(
+                origins[agg], dests[agg], checkpoints[agg], mc2_dist[agg], [None] * agg.size, DISTANCE_ONLY_CATALOG
+            )
+            hits = int(mc_hit.sum() + mc2_hit.sum())
+            misses = new.size + int(new2.sum())
+            self._route_cache.hits += hits
+            self._route_cache.misses += misses
+            if hits or misses:
+                logger.info("Caché de rutas (workers): %s hits, %s misses.", hits, misses)
+
+        # MC de cada par → sus tripletas (camino invertido en las (d, o))
+        rep = pairs.first[pairs.inverse]
+        mc_done, mc_dist, mc_time = mc_done[rep], mc_dist[rep], mc_time[rep]
+        mc_path = np.array(
+            [None if p is None else str(p[::-1] if f else p) for p, f in zip(mc_path[rep], pairs.flipped)],
+            dtype=object,
+        )
 
-        for r in results:
-            i = r["idx"]
-            df.at[i, "mc_path"] = r["mc_path"]
-            df.at[i, "mc_distance_m"] = r["mc_distance_m"]
-            df.at[i, "mc_time_h"] = r["mc_time_h"]
-            df.at[i, "mc2_distance_m"] = r["mc2_distance_m"]
-            df.at[i, "sense_code"] = r["sense_code"]
+        # Resultado por llave → todas las filas con esa llave (asignación vectorial)
+        rows = mc_done[keys.inverse] & self._compute_mc
+        if rows.any():
+            k = keys.inverse[rows]
+            df.loc[rows, "mc_path"] = mc_path[k]
+            df.loc[rows, "mc_distance_m"] = mc_dist[k]
+            df.loc[rows, "mc_time_h"] = mc_time[k]
+        rows = mc2_done[keys.inverse]
+        if rows.any():
+            k = keys.inverse[rows]
+            df.loc[rows, "mc2_distance_m"] = mc2_dist[k]
+            df.loc[rows, "sense_code"] = np.asarray(
+                pd.Categorical.from_codes(sense[k], categories=SENSE_CATEGORIES), dtype=object
+            )
 
         return df
 
@@ -240,6 +662,8 @@ def compute_mc_and_mc2_parallel_debug2030(
     sense_catalog_path: Optional[str] = None,
     n_workers: int = 8,
     chunk_size: int = 200,
+    graph: Optional[CSRGraph] = None,
+    backend: str = 'python',
 ) -> pd.DataFrame:
     # Calcula MC + MC2 (+ sense_code) en paralelo.
     # Uso previsto: SOLO modo debug del checkpoint 2030.
@@ -253,6 +677,8 @@ def compute_mc_and_mc2_parallel_debug2030(
         sense_catalog_path=sense_catalog_path,
         n_workers=n_workers,
         chunk_size=chunk_size,
+        graph=graph,
+        backend=backend,
     ) as session:
         return session.compute(
             df_od,
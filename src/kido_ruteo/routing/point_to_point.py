@@ -0,0 +1,65 @@
+"""kido_ruteo.routing.point_to_point
+
+Despacho de consultas punto a punto sobre `CSRGraph` según `method`.
+
+Métodos (`ROUTING_METHODS`):
+- "dijkstra": Dijkstra con parada temprana (motor según `backend`).
+- "ch": Contraction Hierarchies (ver `contraction.py`); el índice se carga de
+  disco o se construye la primera vez.
+- "astar": A* bidireccional con cota euclidiana (ver `astar.py`); sin
+  preprocesamiento, pensado para consultas sueltas.
+- "alt": A* bidireccional con cotas de landmarks (ver `landmarks.py`); índice
+  liviano persistido junto al grafo.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .astar import bidirectional_astar
+from .contraction import load_or_build_ch
+from .landmarks import load_or_build_landmarks
+from .csr_graph import CSRGraph
+from . import dijkstra
+from . import scipy_backend
+
+ROUTING_METHODS = ('dijkstra', 'ch', 'astar', 'alt')
+
+
+def validate_method(method: str, G=None) -> str:
+    """Normaliza y valida el método de ruteo punto a punto."""
+    method = str(method).strip().lower()
+    if method not in ROUTING_METHODS:
+        raise ValueError(f"routing method inválido: {method!r}. Opciones: {ROUTING_METHODS}")
+    if method != 'dijkstra' and G is not None and not isinstance(G, CSRGraph):
+        raise ValueError(f"routing method {method!r} requiere un CSRGraph")
+    return method
+
+
+def prepare_method_index(G: CSRGraph, method: str, cache_dir: Optional[Path] = None) -> None:
+    """Carga/construye (y persiste) el índice que requiere `method`, si alguno."""
+    if method == 'ch':
+        load_or_build_ch(G, cache_dir=cache_dir)
+    elif method == 'alt':
+        load_or_build_landmarks(G, cache_dir=cache_dir)
+
+
+def shortest_path(
+    G: CSRGraph,
+    source: int,
+    target: int,
+    method: str = 'dijkstra',
+    backend: str = 'python',
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """Camino mínimo entre índices de nodo. Devuelve (None, None) si no hay ruta."""
+    if method == 'ch':
+        return load_or_build_ch(G).query(source, target)
+    if method == 'astar':
+        return bidirectional_astar(G, source, target)
+    if method == 'alt':
+        potential = load_or_build_landmarks(G).potential(source, target)
+        return bidirectional_astar(G, source, target, potential=potential)
+    if backend == 'scipy':
+        return scipy_backend.shortest_path(G, source, target)
+    return dijkstra.shortest_path(G, source, target)
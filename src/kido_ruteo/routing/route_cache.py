@@ -0,0 +1,339 @@
+"""kido_ruteo.routing.route_cache
+
+Caché persistente de resultados de ruteo (SQLite), compartida entre corridas
+y archivos de checkpoint.
+
+Vive en la entrada de `graph_cache` del grafo (`<entrada>/routes.sqlite`):
+la entrada ya está indexada por el hash de contenido de la red, así que la
+llave efectiva es (hash del grafo, tripleta de nodos) y la caché se invalida
+junto con el grafo.
+
+Tablas:
+    mc  (o, d)              → dist       (o <= d: el grafo es no dirigido)
+    mc2 (o, d, c, catalog)  → dist, sense (catalog = hash de sense_cardinality,
+                              o `DISTANCE_ONLY_CATALOG` para MC2 sin sentido)
+
+`dist` NULL = sin ruta. Solo se guardan distancias y sentido (no caminos):
+una fila resuelta desde la caché queda sin `mc_path`, igual que con la
+matriz zona × zona.
+
+Concurrencia: modo WAL. Los workers abren la base en solo lectura y consultan
+antes de buscar; solo el proceso padre escribe (una transacción por lote) y
+marca como usados los hits de los workers (`touch_mc` / `touch_mc2`).
+Cada consulta carga sus llaves en una tabla temporal y resuelve hits y
+marca `last_used` con un JOIN y un UPDATE (no una sentencia por fila).
+Al superar `max_entries` filas en una tabla se eliminan las de uso más
+antiguo (`last_used`) hasta quedar en el 90%. El conteo de filas se lleva en
+memoria (una cota superior: un reemplazo cuenta como fila nueva) y solo se
+recuenta con `COUNT(*)` cuando la cota pasa el límite.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .csr_graph import CSRGraph
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CACHE_FILE = 'routes.sqlite'
+
+# Filas máximas por tabla antes de desalojar
+DEFAULT_MAX_ENTRIES = 5_000_000
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS mc ("
+    " o INTEGER NOT NULL, d INTEGER NOT NULL, dist REAL, last_used REAL NOT NULL,"
+    " PRIMARY KEY (o, d)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS mc2 ("
+    " o INTEGER NOT NULL, d INTEGER NOT NULL, c INTEGER NOT NULL, catalog TEXT NOT NULL,"
+    " dist REAL, sense TEXT, last_used REAL NOT NULL,"
+    " PRIMARY KEY (o, d, c, catalog)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS mc_last_used ON mc (last_used)",
+    "CREATE INDEX IF NOT EXISTS mc2_last_used ON mc2 (last_used)",
+)
+_KEYS = {'mc': 'o, d', 'mc2': 'o, d, c, catalog'}
+# Llave de nodos (el catálogo va aparte: uno por consulta) y valores de cada tabla
+_NODE_KEYS = {'mc': 'o, d', 'mc2': 'o, d, c'}
+_VALUES = {'mc': 'dist', 'mc2': 'dist, sense'}
+
+
+# Catálogo de las filas MC2 solo distancia (checkpoints agregados, sin sentido)
+DISTANCE_ONLY_CATALOG = 'distance'
+
+
+def catalog_key(valid_sense_codes: Iterable[str]) -> str:
+    """Llave del catálogo de sentidos (el `sense_code` depende de él)."""
+    return hashlib.sha256('|'.join(sorted(valid_sense_codes)).encode()).hexdigest()[:16]
+
+
+def _node_ints(values: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """IDs de nodo → (int64, válido). NA o no enteros → no válido."""
+    arr = pd.to_numeric(pd.Series(list(values), dtype='object'), errors='coerce').to_numpy(dtype=np.float64)
+    ok = np.isfinite(arr) & (arr == np.floor(arr))
+    return np.where(ok, arr, -1).astype(np.int64), ok
+
+
+class RouteCache:
+    """Caché MC / MC2 en un archivo SQLite.
+
+    Args:
+        path: archivo SQLite.
+        max_entries: filas máximas por tabla.
+        readonly: abrir en solo lectura (workers); `put_*` no hace nada.
+    """
+
+    def __init__(self, path, max_entries: int = DEFAULT_MAX_ENTRIES, readonly: bool = False) -> None:
+        self.path = Path(path)
+        self.max_entries = int(max_entries)
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        # Cota superior de filas por tabla (sin llave = sin contar aún)
+        self._n_rows: dict = {}
+        if not readonly:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                for stmt in _SCHEMA:
+                    conn.execute(stmt)
+
+    @classmethod
+    def for_graph(
+        cls,
+        G,
+        cache_dir: Optional[Path] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> Optional["RouteCache"]:
+        """Caché de la entrada de `graph_cache` del grafo (None si no tiene entrada)."""
+        base = cache_dir if cache_dir is not None else getattr(G, 'cache_dir', None)
+        if base is None or not isinstance(G, CSRGraph):
+            return None
+        try:
+            return cls(Path(base) / ROUTE_CACHE_FILE, max_entries=max_entries)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo abrir la caché de rutas en %s: %s", base, e)
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.readonly:
+                # URI codificada: rutas con '#', '?', '%' o unidad de Windows
+                conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, timeout=30.0)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), timeout=30.0)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __getstate__(self) -> dict:
+        # Los workers reabren la base por su cuenta
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
+
+    def _count(self, found: np.ndarray, label: str) -> None:
+        hits = int(found.sum())
+        self.hits += hits
+        self.misses += int(found.size) - hits
+        if not self.readonly and found.size:
+            logger.info("Caché de rutas %s: %s hits, %s misses.", label, hits, int(found.size) - hits)
+
+    def get_mc(self, origins: Iterable, dests: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (dist, hit): `dist` float64 (NaN si no hay ruta o no hay hit)."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        ok = ok_o & ok_d
+        lo, hi = np.minimum(o, d), np.maximum(o, d)
+        dist = np.full(o.size, np.nan)
+        hit = np.zeros(o.size, dtype=bool)
+        keys = list(zip(lo[ok].tolist(), hi[ok].tolist()))
+        found = self._select('mc', keys)
+        for k, key in zip(np.flatnonzero(ok).tolist(), keys):
+            row = found.get(key)
+            if row is not None:
+                hit[k] = True
+                if row[0] is not None:
+                    dist[k] = row[0]
+        self._count(hit[ok], 'MC')
+        return dist, hit
+
+    def get_mc2(
+        self, origins: Iterable, dests: Iterable, checkpoints: Iterable, catalog: str
+    ) -> Tuple[np.ndarray, list, np.ndarray]:
+        """Returns (dist, sense, hit): `dist` NaN y `sense` NaN si no aplica."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        c, ok_c = _node_ints(checkpoints)
+        ok = ok_o & ok_d & ok_c
+        dist = np.full(o.size, np.nan)
+        sense: list = [np.nan] * o.size
+        hit = np.zeros(o.size, dtype=bool)
+        keys = list(zip(o[ok].tolist(), d[ok].tolist(), c[ok].tolist()))
+        found = self._select('mc2', keys, catalog)
+        for k, key in zip(np.flatnonzero(ok).tolist(), keys):
+            row = found.get(key)
+            if row is not None:
+                hit[k] = True
+                if row[0] is not None:
+                    dist[k] = row[0]
+                if row[1] is not None:
+                    sense[k] = row[1]
+        self._count(hit[ok], 'MC2')
+        return dist, sense, hit
+
+    def _select(self, table: str, keys: list, catalog: Optional[str] = None) -> dict:
+        """Filas de `table` para `keys` (llaves de nodos) → {llave: valores}.
+
+        Las llaves van a una tabla temporal (`executemany`) y se cruzan con un
+        solo JOIN por la llave primaria; los hits se marcan como recién usados
+        con un solo UPDATE sobre el mismo cruce.
+        """
+        if not keys:
+            return {}
+        cols = _NODE_KEYS[table].split(', ')
+        conn = self._connect()
+        with conn:
+            tmp, on, params = _load_keys(conn, table, keys, catalog)
+            rows = conn.execute(
+                f"SELECT {', '.join(f'k.{k}' for k in cols)}, {', '.join(f't.{v}' for v in _VALUES[table].split(', '))}"
+                f" FROM {tmp} AS k JOIN {table} AS t ON {on}",
+                params,
+            ).fetchall()
+            if rows:
+                self._touch(conn, table, f"UPDATE {table} AS t SET last_used = ? FROM {tmp} AS k WHERE {on}", params)
+        return {tuple(row[:len(cols)]): row[len(cols):] for row in rows}
+
+    def touch_mc(self, origins: Iterable, dests: Iterable) -> None:
+        """Marca MC (o, d) como recién usados (hits resueltos en los workers)."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        ok = ok_o & ok_d
+        lo, hi = np.minimum(o, d)[ok], np.maximum(o, d)[ok]
+        self._touch_keys('mc', list(zip(lo.tolist(), hi.tolist())))
+
+    def touch_mc2(self, origins: Iterable, dests: Iterable, checkpoints: Iterable, catalog: str) -> None:
+        """Marca MC2 (o, d, c) del catálogo como recién usados (hits de los workers)."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        c, ok_c = _node_ints(checkpoints)
+        ok = ok_o & ok_d & ok_c
+        self._touch_keys('mc2', list(zip(o[ok].tolist(), d[ok].tolist(), c[ok].tolist())), catalog)
+
+    def _touch_keys(self, table: str, keys: list, catalog: Optional[str] = None) -> None:
+        if self.readonly or not keys:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                tmp, on, params = _load_keys(conn, table, keys, catalog)
+                self._touch(conn, table, f"UPDATE {table} AS t SET last_used = ? FROM {tmp} AS k WHERE {on}", params)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo actualizar la caché de rutas %s (%s): %s", self.path, table, e)
+
+    def put_mc(self, origins: Iterable, dests: Iterable, dists: Iterable) -> None:
+        """Guarda MC (dist None/NaN = sin ruta)."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        now = time.time()
+        rows = [
+            (int(min(a, b)), int(max(a, b)), _sql_float(x), now)
+            for a, b, x, ok in zip(o.tolist(), d.tolist(), dists, (ok_o & ok_d).tolist())
+            if ok
+        ]
+        self._write("INSERT OR REPLACE INTO mc VALUES (?, ?, ?, ?)", rows, 'mc')
+
+    def put_mc2(
+        self, origins: Iterable, dests: Iterable, checkpoints: Iterable, dists: Iterable, senses: Iterable, catalog: str
+    ) -> None:
+        """Guarda MC2 + sentido (None/NaN = sin ruta / sin sentido)."""
+        o, ok_o = _node_ints(origins)
+        d, ok_d = _node_ints(dests)
+        c, ok_c = _node_ints(checkpoints)
+        now = time.time()
+        rows = [
+            (int(a), int(b), int(x), catalog, _sql_float(dist), None if pd.isna(s) else str(s), now)
+            for a, b, x, dist, s, ok in zip(
+                o.tolist(), d.tolist(), c.tolist(), dists, senses, (ok_o & ok_d & ok_c).tolist()
+            )
+            if ok
+        ]
+        self._write("INSERT OR REPLACE INTO mc2 VALUES (?, ?, ?, ?, ?, ?, ?)", rows, 'mc2')
+
+    def _touch(self, conn: sqlite3.Connection, table: str, sql: str, params: tuple) -> None:
+        """Marca hits como recién usados (orden de desalojo)."""
+        if self.readonly:
+            return
+        try:
+            conn.execute(sql, (time.time(), *params))
+        except sqlite3.Error as e:
+            logger.warning("No se pudo actualizar la caché de rutas %s (%s): %s", self.path, table, e)
+
+    def _write(self, sql: str, rows: list, table: str) -> None:
+        if self.readonly or not rows:
+            return
+        conn = self._connect()
+        try:
+            if table not in self._n_rows:
+                self._n_rows[table] = self._rows(table)
+            with conn:
+                conn.executemany(sql, rows)
+                # Cota superior; se recuenta solo si pasa el límite
+                self._n_rows[table] += len(rows)
+                if self._n_rows[table] > self.max_entries:
+                    self._n_rows[table] = self._rows(table)
+                if self._n_rows[table] > self.max_entries:
+                    drop = self._n_rows[table] - int(0.9 * self.max_entries)
+                    key = _KEYS[table]
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE ({key}) IN "
+                        f"(SELECT {key} FROM {table} ORDER BY last_used LIMIT ?)",
+                        (drop,),
+                    )
+                    self._n_rows[table] -= drop
+                    logger.info("Caché de rutas (%s): %s filas desalojadas.", table, drop)
+        except sqlite3.Error as e:
+            # El conteo se rehace en la próxima escritura
+            self._n_rows.pop(table, None)
+            logger.warning("No se pudo escribir en la caché de rutas %s: %s", self.path, e)
+
+    def _rows(self, table: str) -> int:
+        return int(self._connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+    def log_stats(self, label: str) -> None:
+        """Contadores acumulados (p.ej. al cerrar una sesión)."""
+        logger.info("Caché de rutas %s: %s hits, %s misses en total.", label, self.hits, self.misses)
+
+
+def _load_keys(
+    conn: sqlite3.Connection, table: str, keys: list, catalog: Optional[str]
+) -> Tuple[str, str, tuple]:
+    """Carga `keys` en la tabla temporal de `table` → (tabla, condición del JOIN, parámetros)."""
+    cols = _NODE_KEYS[table].split(', ')
+    tmp = f"temp.keys_{table}"
+    conn.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS keys_{table} ("
+        f"{', '.join(f'{k} INTEGER NOT NULL' for k in cols)}, PRIMARY KEY ({_NODE_KEYS[table]})) WITHOUT ROWID"
+    )
+    conn.execute(f"DELETE FROM {tmp}")
+    conn.executemany(f"INSERT OR IGNORE INTO {tmp} VALUES ({', '.join('?' * len(cols))})", keys)
+    on = ' AND '.join(f"t.{k} = k.{k}" for k in cols) + (" AND t.catalog = ?" if catalog is not None else '')
+    return tmp, on, ((catalog,) if catalog is not None else ())
+
+
+def _sql_float(x) -> Optional[float]:
+    return None if x is None or pd.isna(x) or not np.isfinite(x) else float(x)
@@ -0,0 +1,153 @@
+"""kido_ruteo.routing.route_plan
+
+Plan de ruteo: qué filas vale la pena rutear.
+
+Hay filas que NUNCA producen `veh_*` distintos de cero, sin importar el
+resultado del ruteo (STRICT MODE):
+
+- intrazonales (`intrazonal_factor == 1`): origen y destino caen en el mismo
+  nodo, `has_valid_path` es False y `classify_congruence` las marca 4;
+- checkpoint ausente de `summary_capacity.csv`: `cap_total` queda NaN en
+  `match_capacity_to_od` → congruencia 4;
+- sin nodo de zona (origen o destino) o sin nodo de checkpoint: no hay MC2
+  → congruencia 4.
+
+`plan_routes` las clasifica ANTES de rutear con la tabla de capacidad y el
+mapeo zona → nodo; solo el subconjunto viable se rutea y `merge_routed`
+completa el resto con las columnas de ruteo en NaN (lo mismo que deja una
+ruta inexistente). Los pasos de capacidad, congruencia y vehículos corren
+sobre todas las filas igual que antes, así que las salidas no cambian.
+
+El plan también marca `distance_only`: filas viables cuyo checkpoint es
+agregado (todo `Sentido == '0'`). `match_capacity_to_od` descarta su sentido
+geométrico, así que MC2 se calcula solo como distancia (sin predecesores,
+caminos ni bearings; ver `compute_mc2_matrix`).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..capacity.matcher import checkpoint_directionality
+
+# Columnas que agrega el ruteo (MC2 siempre; MC solo si se calcula)
+ROUTING_COLUMNS = ('mc2_distance_m', 'sense_code')
+
+# Motivos en orden de prioridad (una fila cuenta solo en el primero que cumple)
+SKIP_REASONS = {
+    'intrazonal': 'intrazonal',
+    'no_capacity': 'checkpoint sin capacidad',
+    'no_zone_node': 'sin nodo de zona',
+    'no_checkpoint_node': 'sin nodo de checkpoint',
+}
+
+
+@dataclass
+class RoutePlan:
+    """Filas a rutear.
+
+    Atributos:
+        viable: bool (n,). La fila puede producir vehículos y se rutea.
+        skipped: filas evitadas por motivo (llaves de `SKIP_REASONS`).
+        distance_only: bool (n,). Fila viable de checkpoint agregado: MC2
+            solo distancia, sin sentido.
+    """
+
+    viable: np.ndarray
+    skipped: Dict[str, int] = field(default_factory=dict)
+    distance_only: Optional[np.ndarray] = None
+
+    def __post_init__(self) -> None:
+        if self.distance_only is None:
+            self.distance_only = np.zeros(self.viable.size, dtype=bool)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.viable.size)
+
+    @property
+    def n_viable(self) -> int:
+        return int(self.viable.sum())
+
+    @property
+    def n_skipped(self) -> int:
+        return self.n_rows - self.n_viable
+
+    def report(self) -> str:
+        detail = ', '.join(f"{SKIP_REASONS[k]} {v}" for k, v in self.skipped.items() if v)
+        return (
+            f"  Plan: {self.n_rows} filas → {self.n_viable} a rutear "
+            f"({self.n_skipped} rutas evitadas{': ' + detail if detail else ''}; "
+            f"{int(self.distance_only.sum())} solo distancia)"
+        )
+
+
+def plan_routes(
+    df_od: pd.DataFrame,
+    df_capacity: Optional[pd.DataFrame],
+    origin_node_col: str = 'origin_node_id',
+    dest_node_col: str = 'destination_node_id',
+    checkpoint_node_col: str = 'checkpoint_node_id',
+) -> RoutePlan:
+    """Clasifica las filas de `df_od` antes de rutear.
+
+    Args:
+        df_od: OD ya preparado (`prepare_data`), con nodos de zona y de
+            checkpoint asignados.
+        df_capacity: capacidad de `load_capacity_data` (None = no filtrar por
+            capacidad).
+    """
+    n = len(df_od)
+    remaining = np.ones(n, dtype=bool)
+    skipped: Dict[str, int] = {}
+
+    def _skip(reason: str, mask) -> None:
+        mask = np.asarray(mask, dtype=bool) & remaining
+        skipped[reason] = int(mask.sum())
+        remaining[mask] = False
+
+    if 'intrazonal_factor' in df_od.columns:
+        _skip('intrazonal', pd.to_numeric(df_od['intrazonal_factor'], errors='coerce').eq(1).to_numpy())
+
+    aggregated = np.zeros(n, dtype=bool)
+    if df_capacity is not None and 'checkpoint_id' in df_od.columns:
+        directional = checkpoint_directionality(df_capacity)
+        checkpoint = df_od['checkpoint_id'].astype('string')
+        _skip('no_capacity', ~checkpoint.isin(set(directional.index.dropna())).fillna(False).to_numpy(dtype=bool))
+        aggregated = checkpoint.map(directional).eq(False).fillna(False).to_numpy(dtype=bool)
+
+    no_node = np.zeros(n, dtype=bool)
+    for col in (origin_node_col, dest_node_col):
+        if col in df_od.columns:
+            no_node |= df_od[col].isna().to_numpy()
+    _skip('no_zone_node', no_node)
+
+    if checkpoint_node_col in df_od.columns:
+        _skip('no_checkpoint_node', df_od[checkpoint_node_col].isna().to_numpy())
+
+    return RoutePlan(viable=remaining, skipped=skipped, distance_only=aggregated & remaining)
+
+
+def merge_routed(df_od: pd.DataFrame, df_routed: Optional[pd.DataFrame], plan: RoutePlan) -> pd.DataFrame:
+    """Completa las filas no ruteadas.
+
+    `df_routed` es el resultado del ruteo de `df_od.loc[plan.viable]` (None
+    si no hubo filas viables), fila por fila en el mismo orden; el índice
+    puede venir reiniciado. Las columnas que agregó el ruteo quedan NaN en las
+    filas evitadas; las de entrada se conservan tal cual de `df_od`.
+    """
+    out = df_od.copy()
+    if df_routed is None:
+        for col in ROUTING_COLUMNS:
+            if col not in out.columns:
+                out[col] = np.nan
+        return out
+    index = df_od.index[plan.viable]
+    for col in df_routed.columns:
+        if col not in df_od.columns:
+            out[col] = df_routed[col].set_axis(index).reindex(df_od.index)
+    return out
@@ -0,0 +1,119 @@
+"""kido_ruteo.routing.scipy_backend
+
+Backend de ruteo sobre `scipy.sparse.csgraph.dijkstra`.
+
+- El `CSRGraph` se expone como `scipy.sparse.csr_matrix` sin copiar la
+  adyacencia (mismos `indptr`/`indices`; pesos a float64 una sola vez).
+- Las búsquedas corren en C (sin GIL ni dicts por nodo) y se lanzan en lotes
+  de orígenes únicos con `indices=`.
+- Las distancias se acumulan en float64 en el mismo orden que el Dijkstra en
+  Python (`dijkstra.py`), por lo que coinciden bit a bit.
+
+Backends disponibles (`ROUTING_BACKENDS`):
+- "python": Dijkstra en Python sobre CSR (o NetworkX si el grafo es `nx.Graph`).
+- "scipy": este módulo (requiere `CSRGraph`).
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra as _cs_dijkstra
+
+from .csr_graph import CSRGraph
+
+ROUTING_BACKENDS = ('python', 'scipy')
+
+# Sentinela de scipy para "sin predecesor"
+NO_PREDECESSOR = -9999
+
+# Memoria máxima (aprox.) de las matrices dist/pred de un lote de orígenes
+_BATCH_BYTES = 256 * 1024 * 1024
+
+
+def validate_backend(backend: str, G=None) -> str:
+    """Normaliza y valida el nombre del backend."""
+    backend = str(backend).strip().lower()
+    if backend not in ROUTING_BACKENDS:
+        raise ValueError(f"routing backend inválido: {backend!r}. Opciones: {ROUTING_BACKENDS}")
+    if backend == 'scipy' and G is not None and not isinstance(G, CSRGraph):
+        raise ValueError("routing backend 'scipy' requiere un CSRGraph")
+    return backend
+
+
+def csgraph_matrix(G: CSRGraph) -> csr_matrix:
+    """Matriz dispersa (n x n) del grafo; se construye una vez y se guarda en `G`."""
+    m = getattr(G, '_csgraph', None)
+    if m is None:
+        n = G.n_nodes
+        m = csr_matrix(
+            (G.weights.astype(np.float64), G.indices, G.indptr),
+            shape=(n, n),
+        )
+        G._csgraph = m
+    return m
+
+
+def shortest_path_trees(
+    G: CSRGraph,
+    sources: Sequence[int],
+    limit: float = np.inf,
+    predecessors: bool = True,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Dijkstra desde varios orígenes en una llamada.
+
+    Args:
+        G: Grafo CSR
+        sources: índices de nodo origen
+        limit: radio máximo de búsqueda; nodos más lejanos quedan en inf
+        predecessors: False = solo distancias (`pred` es None)
+
+    Returns:
+        (dist, pred) de forma (len(sources), n). `dist` es inf si no hay ruta;
+        `pred` es `NO_PREDECESSOR` para el origen y nodos no alcanzados.
+    """
+    sources = np.asarray(sources, dtype=np.int32)
+    out = _cs_dijkstra(
+        csgraph_matrix(G),
+        directed=True,  # el CSR ya contiene ambos sentidos
+        indices=sources,
+        return_predecessors=predecessors,
+        limit=limit,
+    )
+    if not predecessors:
+        return np.atleast_2d(out), None
+    dist, pred = out
+    return np.atleast_2d(dist), np.atleast_2d(pred)
+
+
+def iter_source_batches(G: CSRGraph, sources: Sequence[int]):
+    """Divide `sources` en lotes cuyo dist/pred cabe en `_BATCH_BYTES`."""
+    per_source = max(G.n_nodes * 12, 1)  # float64 + int32
+    size = max(1, _BATCH_BYTES // per_source)
+    for start in range(0, len(sources), size):
+        yield sources[start:start + size]
+
+
+def reconstruct_path(pred: np.ndarray, source: int, target: int) -> List[int]:
+    """Camino source → target desde un vector de predecesores de scipy."""
+    path = [int(target)]
+    while path[-1] != source:
+        path.append(int(pred[path[-1]]))
+    path.reverse()
+    return path
+
+
+def shortest_path(
+    G: CSRGraph,
+    source: int,
+    target: int,
+    limit: float = np.inf,
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """Camino mínimo punto a punto. Devuelve (None, None) si no hay ruta."""
+    dist, pred = shortest_path_trees(G, [source], limit=limit)
+    d = dist[0, target]
+    if not np.isfinite(d):
+        return None, None
+    return reconstruct_path(pred[0], source, target), float(d)
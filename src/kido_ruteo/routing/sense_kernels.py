@@ -0,0 +1,115 @@
+"""kido_ruteo.routing.sense_kernels
+
+Kernels vectoriales de bearing, cardinalidad y `sense_code` (STRICT MODE).
+
+Cada giro u -> v (checkpoint) -> w se describe con índices a un arreglo de
+coordenadas (-1 = nodo faltante). Para un lote completo se calculan:
+
+- bearing_in (u -> v) y bearing_out (v -> w) en grados (0=N, 90=E),
+- cardinalidad de origen (opuesta a la llegada) y de destino (1=N .. 4=W),
+- `sense_code` categórico, con la regla '0' (cardinalidades iguales) y el
+  lookup en `sense_cardinality.csv` aplicados como máscaras.
+
+`calculate_bearing` / `get_cardinality` en `constrained_path` son envoltorios
+de estos kernels para un solo par.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Códigos de sentido posibles: '0' (agregado/indeterminado) + pares distintos
+SENSE_CATEGORIES = ['0'] + [f"{o}-{d}" for o in range(1, 5) for d in range(1, 5) if o != d]
+
+# Cardinalidad opuesta (índice 0 = sin dato)
+_OPPOSITE = np.array([0, 3, 4, 1, 2], dtype=np.int8)
+
+# (card. origen, card. destino) → índice en SENSE_CATEGORIES (-1 = sin dato)
+_PAIR_CODE = np.full((5, 5), -1, dtype=np.int64)
+for _o in range(1, 5):
+    for _d in range(1, 5):
+        _PAIR_CODE[_o, _d] = 0 if _o == _d else SENSE_CATEGORIES.index(f"{_o}-{_d}")
+
+
+@dataclass
+class TurnSenses:
+    """Resultado de `derive_turn_senses` (un elemento por giro)."""
+
+    bearing_in: np.ndarray
+    bearing_out: np.ndarray
+    origin_card: np.ndarray
+    dest_card: np.ndarray
+    sense_code: pd.Categorical
+
+
+def bearings(coords: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Bearing de u a v en grados [0, 360); NaN si falta algún nodo."""
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    ok = (u >= 0) & (v >= 0)
+    out = np.full(u.shape, np.nan, dtype=np.float64)
+    p1 = coords[u[ok]]
+    p2 = coords[v[ok]]
+    angle = np.degrees(np.arctan2(p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1]))
+    out[ok] = np.where(angle < 0, angle + 360, angle)
+    return out
+
+
+def cardinalities(bearing: np.ndarray, is_origin: bool = False) -> np.ndarray:
+    """Cardinalidad (1=N, 2=E, 3=S, 4=W; 0 = sin bearing).
+
+    Sectores: N [315, 45), E [45, 135), S [135, 225), W [225, 315). Con
+    `is_origin` se devuelve la opuesta (si voy al norte, vengo del sur).
+    """
+    bearing = np.asarray(bearing, dtype=np.float64)
+    card = np.select(
+        [(bearing >= 315) | (bearing < 45), bearing < 135, bearing < 225],
+        [1, 2, 3],
+        4,
+    ).astype(np.int8)
+    card[~np.isfinite(bearing)] = 0
+    return _OPPOSITE[card] if is_origin else card
+
+
+def sense_codes(
+    origin_card: np.ndarray,
+    dest_card: np.ndarray,
+    valid_sense_codes: Optional[Iterable[str]] = None,
+) -> pd.Categorical:
+    """`sense_code` por par de cardinalidades.
+
+    Cardinalidades iguales → '0' (siempre válido). Con `valid_sense_codes` los
+    códigos fuera del catálogo quedan NaN; sin catálogo se devuelve el
+    candidato geométrico.
+    """
+    codes = _PAIR_CODE[np.asarray(origin_card), np.asarray(dest_card)]
+    if valid_sense_codes is not None:
+        valid = np.isin(SENSE_CATEGORIES, list(valid_sense_codes))
+        valid[0] = True
+        codes = np.where((codes >= 0) & valid[np.maximum(codes, 0)], codes, -1)
+    return pd.Categorical.from_codes(codes, categories=SENSE_CATEGORIES)
+
+
+def derive_turn_senses(
+    coords: np.ndarray,
+    u: np.ndarray,
+    v: np.ndarray,
+    w: np.ndarray,
+    valid_sense_codes: Optional[Iterable[str]] = None,
+) -> TurnSenses:
+    """Bearings, cardinalidades y `sense_code` de un lote de giros u -> v -> w."""
+    bearing_in = bearings(coords, u, v)
+    bearing_out = bearings(coords, v, w)
+    origin_card = cardinalities(bearing_in, is_origin=True)
+    dest_card = cardinalities(bearing_out)
+    return TurnSenses(
+        bearing_in=bearing_in,
+        bearing_out=bearing_out,
+        origin_card=origin_card,
+        dest_card=dest_card,
+        sense_code=sense_codes(origin_card, dest_card, valid_sense_codes),
+    )
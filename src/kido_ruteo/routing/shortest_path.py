@@ -3,26 +3,54 @@ Módulo para cálculo de Shortest Path (MC).
 """
 
 import networkx as nx
+import numpy as np
 import pandas as pd
-from typing import Tuple, List, Optional
+from typing import Dict, Hashable, Iterable, Tuple, List, Optional, Union
 from tqdm import tqdm
 
+from .csr_graph import CSRGraph
+from .dedup import factorize_routes
+from . import dijkstra
+from . import scipy_backend
+from .scipy_backend import validate_backend
+from . import point_to_point
+from .point_to_point import validate_method
+from .route_cache import RouteCache
+from .zone_matrix import ZoneDistanceMatrix
+
 def compute_shortest_path_mc(
-    G: nx.Graph,
-    origin_node: str,
-    dest_node: str
-) -> Tuple[Optional[List[str]], Optional[float], Optional[float]]:
+    G: Union[CSRGraph, nx.Graph],
+    origin_node: Hashable,
+    dest_node: Hashable,
+    backend: str = 'python',
+    method: str = 'dijkstra',
+) -> Tuple[Optional[List[Hashable]], Optional[float], Optional[float]]:
     """
     Calcula shortest path entre dos nodos (sin restricción de checkpoint).
     
     Args:
-        G: Grafo de red vial
-        origin_node: ID de nodo origen
-        dest_node: ID de nodo destino
+        G: Grafo de red vial (`CSRGraph` o `nx.Graph`)
+        origin_node: ID de nodo origen (entero para `CSRGraph`)
+        dest_node: ID de nodo destino (entero para `CSRGraph`)
+        backend: 'python' o 'scipy' (ver `scipy_backend.ROUTING_BACKENDS`)
+        method: 'dijkstra', 'ch', 'astar' o 'alt' (ver `point_to_point.ROUTING_METHODS`)
         
     Returns:
         Tupla (path, distance, time)
     """
+    backend = validate_backend(backend, G)
+    method = validate_method(method, G)
+    if isinstance(G, CSRGraph):
+        source = G.node_index(origin_node)
+        target = G.node_index(dest_node)
+        if source is None or target is None:
+            return None, None, None
+        path, distance = point_to_point.shortest_path(G, source, target, method=method, backend=backend)
+        if path is None:
+            return None, None, None
+        time = distance / 40.0  # horas
+        return path, distance, time
+
     try:
         path = nx.shortest_path(G, source=origin_node, target=dest_node, weight='weight')
         distance = nx.shortest_path_length(G, source=origin_node, target=dest_node, weight='weight')
@@ -38,45 +66,215 @@ def compute_shortest_path_mc(
     except (nx.NetworkXNoPath, nx.NodeNotFound):
         return None, None, None
 
+def compute_shortest_paths_from_origin(
+    G: Union[CSRGraph, nx.Graph],
+    origin_node: Hashable,
+    dest_nodes: Iterable[Hashable],
+    return_paths: bool = True,
+    backend: str = 'python',
+) -> Dict[Hashable, Tuple[Optional[List[Hashable]], Optional[float]]]:
+    """
+    Calcula MC desde un origen hacia varios destinos con UNA búsqueda.
+
+    Con `CSRGraph` el Dijkstra se detiene en cuanto todos los destinos quedan
+    asentados. Los resultados son idénticos a llamar `compute_shortest_path_mc`
+    por cada par (mismo árbol de predecesores).
+
+    Args:
+        G: Grafo de red vial (`CSRGraph` o `nx.Graph`)
+        origin_node: ID de nodo origen
+        dest_nodes: IDs de nodos destino
+        return_paths: Si es False no se reconstruyen caminos (path = None)
+        backend: 'python' o 'scipy'
+
+    Returns:
+        Dict destino -> (path, distance); (None, None) si no hay ruta.
+    """
+    backend = validate_backend(backend, G)
+    dest_nodes = list(dict.fromkeys(dest_nodes))
+    out: Dict[Hashable, Tuple[Optional[List[Hashable]], Optional[float]]] = {
+        d: (None, None) for d in dest_nodes
+    }
+
+    if isinstance(G, CSRGraph):
+        source = G.node_index(origin_node)
+        if source is None:
+            return out
+        targets = {d: G.node_index(d) for d in dest_nodes}
+        if backend == 'scipy':
+            dist_row, pred_row = scipy_backend.shortest_path_trees(G, [source])
+            _fill_from_scipy_row(out, targets, source, dist_row[0], pred_row[0], return_paths)
+            return out
+        dist, pred = dijkstra.single_source_dijkstra(
+            G, source, targets=[t for t in targets.values() if t is not None]
+        )
+        for d, t in targets.items():
+            if t is None or t not in dist:
+                continue
+            path = dijkstra.reconstruct_path(pred, source, t) if return_paths else None
+            out[d] = (path, dist[t])
+        return out
+
+    if origin_node not in G:
+        return out
+    # pred[v][0] es el predecesor con el que NetworkX construye el camino
+    pred, dist = nx.dijkstra_predecessor_and_distance(G, origin_node, weight='weight')
+    for d in dest_nodes:
+        if d not in dist:
+            continue
+        path = None
+        if return_paths:
+            path = [d]
+            while path[-1] != origin_node:
+                path.append(pred[path[-1]][0])
+            path.reverse()
+        out[d] = (path, dist[d])
+    return out
+
+def _fill_from_scipy_row(out: dict, targets: dict, source: int, dist_row, pred_row, return_paths: bool) -> None:
+    """Llena `out[d] = (path, dist)` desde un renglón dist/pred de scipy."""
+    for d, t in targets.items():
+        if t is None or not np.isfinite(dist_row[t]):
+            continue
+        path = scipy_backend.reconstruct_path(pred_row, source, t) if return_paths else None
+        out[d] = (path, float(dist_row[t]))
+
+
 def compute_mc_matrix(
     df_od: pd.DataFrame,
-    G: nx.Graph,
+    G: Union[CSRGraph, nx.Graph],
     origin_node_col: str = 'origin_node_id',
-    dest_node_col: str = 'destination_node_id'
+    dest_node_col: str = 'destination_node_id',
+    batched: bool = True,
+    return_paths: bool = True,
+    backend: str = 'python',
+    method: str = 'dijkstra',
+    zone_matrix: Optional[ZoneDistanceMatrix] = None,
+    route_cache: Optional[RouteCache] = None,
 ) -> pd.DataFrame:
     """
     Calcula matriz de impedancia MC para todos los pares OD.
     
     Args:
         df_od: DataFrame con pares OD y nodos asignados
-        G: Grafo de red vial
+        G: Grafo de red vial (`CSRGraph` o `nx.Graph`)
         origin_node_col: Columna con nodo origen
         dest_node_col: Columna con nodo destino
+        batched: Agrupar filas por nodo origen y resolver cada grupo con una
+            sola búsqueda (`compute_shortest_paths_from_origin`). Con False se
+            hace una búsqueda punto a punto por fila.
+        return_paths: Si es False, `mc_path` queda vacío (solo distancias)
+        backend: 'python' (Dijkstra en Python / NetworkX) o 'scipy'
+            (`scipy.sparse.csgraph`, lotes de orígenes únicos con `indices=`)
+        method: 'dijkstra' o un método punto a punto ('ch', 'astar', 'alt'); estos
+            métodos resuelven cada fila por separado (ignoran `batched`)
+        zone_matrix: Matriz zona × zona precalculada (`zone_matrix.py`). Las
+            filas con ambos nodos en la matriz se resuelven por consulta O(1),
+            sin búsqueda y sin camino (`mc_path` vacío); el resto se rutea.
+        route_cache: Caché persistente de rutas (`route_cache.py`). Se
+            consulta antes de buscar (hit → sin camino, como `zone_matrix`) y
+            recibe las distancias calculadas.
+
+    Los pares repetidos (incluido (d, o) de un (o, d) ya visto; el grafo es no
+    dirigido) se rutean una sola vez (`dedup.factorize_routes`).
         
     Returns:
         DataFrame con columnas mc_distance_m, mc_time_h, mc_path
     """
     print("  Calculando matriz MC (Shortest Path)...")
-    
-    results = []
-    for idx, row in tqdm(df_od.iterrows(), total=len(df_od)):
-        origin = row.get(origin_node_col)
-        dest = row.get(dest_node_col)
-        
-        if pd.isna(origin) or pd.isna(dest):
-            results.append({
-                'mc_distance_m': None,
-                'mc_time_h': None,
-                'mc_path': None
-            })
-            continue
-            
-        path, dist, time = compute_shortest_path_mc(G, origin, dest)
-        
-        results.append({
-            'mc_distance_m': dist,
-            'mc_time_h': time,
-            'mc_path': str(path) if path else None
-        })
-        
-    return pd.concat([df_od, pd.DataFrame(results)], axis=1)
+    backend = validate_backend(backend, G)
+    method = validate_method(method, G)
+    if method != 'dijkstra':
+        batched = False
+
+    n_rows = len(df_od)
+    row_origins = df_od[origin_node_col].tolist() if origin_node_col in df_od.columns else [None] * n_rows
+    row_dests = df_od[dest_node_col].tolist() if dest_node_col in df_od.columns else [None] * n_rows
+
+    # Un cálculo por par único; el resultado se reparte al final
+    keys = factorize_routes(row_origins, row_dests, symmetric=True)
+    print(keys.report())
+    origins = [row_origins[p] for p in keys.first.tolist()]
+    dests = [row_dests[p] for p in keys.first.tolist()]
+    n = keys.n_unique
+
+    distances: List[Optional[float]] = [None] * n
+    paths: List[Optional[list]] = [None] * n
+
+    def _fill(pos: int, path, dist) -> None:
+        distances[pos] = dist
+        paths[pos] = path if path else None
+
+    resolved = np.zeros(n, dtype=bool)
+    if zone_matrix is not None:
+        found_dist, resolved = zone_matrix.lookup(origins, dests)
+        for pos in np.flatnonzero(resolved).tolist():
+            d = float(found_dist[pos])
+            _fill(pos, None, d if np.isfinite(d) else None)
+
+    if route_cache is not None:
+        pending = np.flatnonzero(~resolved)
+        cached_dist, hit = route_cache.get_mc([origins[p] for p in pending], [dests[p] for p in pending])
+        for pos, d in zip(pending[hit].tolist(), cached_dist[hit].tolist()):
+            _fill(pos, None, d if np.isfinite(d) else None)
+        computed = pending[~hit]
+        resolved[pending[hit]] = True
+
+    if batched:
+        groups: Dict[Hashable, List[Tuple[int, Hashable]]] = {}
+        for pos, (origin, dest) in enumerate(zip(origins, dests)):
+            if pd.isna(origin) or pd.isna(dest) or resolved[pos]:
+                continue
+            groups.setdefault(origin, []).append((pos, dest))
+
+        if backend == 'scipy':
+            _mc_groups_scipy(G, groups, return_paths, _fill)
+        else:
+            for origin, rows in tqdm(groups.items(), total=len(groups)):
+                found = compute_shortest_paths_from_origin(
+                    G, origin, (d for _, d in rows), return_paths=return_paths
+                )
+                for pos, dest in rows:
+                    _fill(pos, *found[dest])
+    else:
+        for pos, (origin, dest) in enumerate(tqdm(zip(origins, dests), total=n)):
+            if pd.isna(origin) or pd.isna(dest) or resolved[pos]:
+                continue
+            path, dist, _ = compute_shortest_path_mc(G, origin, dest, backend=backend, method=method)
+            _fill(pos, path if return_paths else None, dist)
+
+    if route_cache is not None:
+        route_cache.put_mc(
+            [origins[p] for p in computed], [dests[p] for p in computed], [distances[p] for p in computed]
+        )
+
+    row_distances = [distances[k] for k in keys.inverse.tolist()]
+    row_paths = [
+        None if paths[k] is None else str(paths[k][::-1] if flip else paths[k])
+        for k, flip in zip(keys.inverse.tolist(), keys.flipped.tolist())
+    ]
+    results = pd.DataFrame({
+        'mc_distance_m': row_distances,
+        'mc_time_h': [d / 40.0 if d is not None else None for d in row_distances],  # horas (40 km/h)
+        'mc_path': row_paths,
+    }, index=df_od.index)
+    return pd.concat([df_od, results], axis=1)
+
+
+def _mc_groups_scipy(G: CSRGraph, groups: dict, return_paths: bool, fill) -> None:
+    """MC por grupos de origen con `scipy.sparse.csgraph.dijkstra` en lotes."""
+    origin_ids = list(groups.keys())
+    sources = {o: G.node_index(o) for o in origin_ids}
+    routable = [o for o in origin_ids if sources[o] is not None]
+
+    with tqdm(total=len(routable)) as bar:
+        for batch in scipy_backend.iter_source_batches(G, routable):
+            dist, pred = scipy_backend.shortest_path_trees(G, [sources[o] for o in batch])
+            for k, origin in enumerate(batch):
+                rows = groups[origin]
+                targets = {d: G.node_index(d) for _, d in rows}
+                found = {d: (None, None) for d in targets}
+                _fill_from_scipy_row(found, targets, sources[origin], dist[k], pred[k], return_paths)
+                for pos, dest in rows:
+                    fill(pos, *found[dest])
+            bar.update(len(batch))
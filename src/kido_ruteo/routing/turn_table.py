@@ -0,0 +1,118 @@
+"""kido_ruteo.routing.turn_table
+
+Tabla giro → `sense_code` por nodo checkpoint.
+
+Un nodo checkpoint tiene grado bajo, así que solo existen unos pocos giros
+(vecino de llegada u, vecino de salida w). Para cada checkpoint se
+precalcula el `sense_code` YA validado contra `sense_cardinality.csv` de los
+k × k giros posibles (`sense_kernels`); derivar el sentido de una fila de MC2
+queda en una búsqueda de dos enteros, sin trigonometría ni lookup en el
+catálogo por fila.
+
+Formato (CSR, para guardarse con `graph_cache.save_arrays`):
+    checkpoints   int32 (m,)     nodos checkpoint, ordenados
+    nbr_indptr    int64 (m+1,)   segmento de vecinos de cada checkpoint
+    nbrs          int32          vecinos (ordenados dentro del segmento)
+    code_indptr   int64 (m+1,)   segmento k × k de códigos de cada checkpoint
+    codes         int8           índice en `SENSE_CATEGORIES` (-1 = NaN)
+
+La tabla se construye y persiste en `get_checkpoint_node_mapping`.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .csr_graph import CSRGraph
+from .sense_kernels import SENSE_CATEGORIES, derive_turn_senses
+
+TURN_TABLE_ARRAYS = ('checkpoints', 'nbr_indptr', 'nbrs', 'code_indptr', 'codes')
+
+
+class TurnSenseTable:
+    """`sense_code` validado por (checkpoint, vecino de llegada, vecino de salida).
+
+    `valid_codes` es el catálogo con el que se validó; quien consulta debe
+    usar la tabla solo si coincide con el suyo.
+    """
+
+    def __init__(self, checkpoints, nbr_indptr, nbrs, code_indptr, codes, valid_codes: Iterable[str]) -> None:
+        self.checkpoints = np.asarray(checkpoints, dtype=np.int32)
+        self.nbr_indptr = np.asarray(nbr_indptr, dtype=np.int64)
+        self.nbrs = np.asarray(nbrs, dtype=np.int32)
+        self.code_indptr = np.asarray(code_indptr, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.valid_codes = frozenset(valid_codes)
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in TURN_TABLE_ARRAYS}
+
+    def lookup(self, u: np.ndarray, c: np.ndarray, w: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Códigos de sentido para giros u -> c -> w (índices de nodo, -1 = falta).
+
+        Returns:
+            (codes, hit): `codes` índice en `SENSE_CATEGORIES` (-1 = NaN) y
+            `hit` = el giro está en la tabla (si no, hay que derivarlo).
+        """
+        u = np.asarray(u, dtype=np.int64)
+        c = np.asarray(c, dtype=np.int64)
+        w = np.asarray(w, dtype=np.int64)
+        codes = np.full(len(c), -1, dtype=np.int64)
+        hit = np.zeros(len(c), dtype=bool)
+        if self.checkpoints.size == 0:
+            return codes, hit
+
+        pos = np.minimum(np.searchsorted(self.checkpoints, c), self.checkpoints.size - 1)
+        known = (self.checkpoints[pos] == c) & (u >= 0) & (w >= 0)
+        for p in np.unique(pos[known]).tolist():
+            rows = np.flatnonzero(known & (pos == p))
+            nbrs = self.nbrs[self.nbr_indptr[p]:self.nbr_indptr[p + 1]]
+            k = nbrs.size
+            if k == 0:
+                continue
+            iu = np.minimum(np.searchsorted(nbrs, u[rows]), k - 1)
+            iw = np.minimum(np.searchsorted(nbrs, w[rows]), k - 1)
+            ok = (nbrs[iu] == u[rows]) & (nbrs[iw] == w[rows])
+            block = self.codes[self.code_indptr[p]:self.code_indptr[p + 1]]
+            codes[rows[ok]] = block[iu[ok] * k + iw[ok]]
+            hit[rows[ok]] = True
+        return codes, hit
+
+    def sense_codes(self, u: np.ndarray, c: np.ndarray, w: np.ndarray) -> pd.Categorical:
+        """Como `lookup`, pero como categórico (NaN fuera de la tabla)."""
+        codes, _ = self.lookup(u, c, w)
+        return pd.Categorical.from_codes(codes, categories=SENSE_CATEGORIES)
+
+
+def build_turn_sense_table(G: CSRGraph, checkpoint_nodes: Iterable, valid_codes: Iterable[str]) -> TurnSenseTable:
+    """Tabla de giros de los checkpoints (IDs de nodo; se omiten NA/desconocidos)."""
+    valid_codes = frozenset(valid_codes)
+    idx = {G.node_index(x) for x in checkpoint_nodes if not pd.isna(x)}
+    checkpoints = np.array(sorted(i for i in idx if i is not None), dtype=np.int32)
+
+    nbr_indptr = np.zeros(checkpoints.size + 1, dtype=np.int64)
+    code_indptr = np.zeros(checkpoints.size + 1, dtype=np.int64)
+    nbrs_parts = []
+    code_parts = []
+    for p, c in enumerate(checkpoints.tolist()):
+        nbrs = np.unique(G.neighbors(c)[0]).astype(np.int32)
+        uu, ww = np.meshgrid(nbrs, nbrs, indexing='ij')
+        turns = derive_turn_senses(
+            G.coords, uu.ravel(), np.full(uu.size, c), ww.ravel(), valid_codes
+        )
+        nbrs_parts.append(nbrs)
+        code_parts.append(turns.sense_code.codes.astype(np.int8))
+        nbr_indptr[p + 1] = nbr_indptr[p] + nbrs.size
+        code_indptr[p + 1] = code_indptr[p] + uu.size
+
+    return TurnSenseTable(
+        checkpoints,
+        nbr_indptr,
+        np.concatenate(nbrs_parts) if nbrs_parts else np.zeros(0, dtype=np.int32),
+        code_indptr,
+        np.concatenate(code_parts) if code_parts else np.zeros(0, dtype=np.int8),
+        valid_codes,
+    )
@@ -0,0 +1,168 @@
+"""kido_ruteo.routing.zone_matrix
+
+Matriz de distancias MC entre nodos de zona (centroides).
+
+MC solo depende de (origin_node_id, destination_node_id), nunca del
+checkpoint, y los nodos posibles son los de `assign_nodes_to_zones`
+(~1–3k únicos). La matriz zona × zona se calcula UNA vez por grafo y
+zonificación y luego `compute_mc_matrix` la consulta en O(1).
+
+- Construcción: `scipy.sparse.csgraph.dijkstra` en lotes desde cada nodo de
+  zona; se conservan solo las columnas de nodos de zona.
+- Almacenamiento: `nodes.npy` (int32, índices de nodo ordenados) +
+  `dist.npy` (float32, (k, k), inf = sin ruta) en
+  `<entrada graph_cache>/zone_matrix/<hash de nodes>/`, abierto con memory-map.
+
+Nota: float32 redondea la distancia (~6e-8 relativo); no se guardan caminos.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from .csr_graph import CSRGraph
+from .graph_cache import load_arrays, save_arrays
+from . import scipy_backend
+
+logger = logging.getLogger(__name__)
+
+# Incrementar si cambia el formato.
+ZONE_MATRIX_VERSION = 1
+
+_ZONE_MATRIX_ARRAYS = ('nodes', 'dist')
+
+
+def _node_array(values: Iterable) -> np.ndarray:
+    """IDs de nodo (con posibles NA) → float64 con NaN."""
+    return pd.to_numeric(pd.Series(list(values), dtype='object'), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def node_positions(nodes: np.ndarray, node_ids: Iterable) -> np.ndarray:
+    """Posición de cada ID en `nodes` (ordenado y único); -1 si no está o es NA."""
+    values = _node_array(node_ids)
+    out = np.full(len(values), -1, dtype=np.int64)
+    ok = np.isfinite(values)
+    if nodes.size == 0 or not ok.any():
+        return out
+    ids = values[ok].astype(np.int64)
+    pos = np.searchsorted(nodes, ids)
+    pos = np.minimum(pos, nodes.size - 1)
+    hit = nodes[pos] == ids
+    out[np.flatnonzero(ok)[hit]] = pos[hit]
+    return out
+
+
+class ZoneDistanceMatrix:
+    """Distancias MC entre nodos de zona.
+
+    Atributos:
+        nodes: int32 (k,). Índices de nodo, ordenados y únicos.
+        dist: float32 (k, k). `dist[i, j]` = MC de nodes[i] a nodes[j]
+            (inf si no hay ruta).
+    """
+
+    def __init__(self, nodes, dist) -> None:
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.dist = np.asarray(dist, dtype=np.float32)
+
+    @property
+    def key(self) -> str:
+        return zone_matrix_key(self.nodes)
+
+    def positions(self, node_ids: Iterable) -> np.ndarray:
+        """Posición de cada nodo en la matriz (-1 si no está o es NA)."""
+        return node_positions(self.nodes, node_ids)
+
+    def lookup(self, origins: Iterable, dests: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """Distancias por par.
+
+        Returns:
+            (dist, found): `found` indica que ambos nodos están en la matriz;
+            `dist` es float64 (NaN si no `found`, inf si no hay ruta).
+        """
+        po = self.positions(origins)
+        pd_ = self.positions(dests)
+        found = (po >= 0) & (pd_ >= 0)
+        dist = np.full(len(po), np.nan, dtype=np.float64)
+        dist[found] = self.dist[po[found], pd_[found]]
+        return dist, found
+
+
+def zone_matrix_key(nodes: np.ndarray) -> str:
+    """Llave del conjunto de nodos de zona (independiente del orden de entrada)."""
+    nodes = np.unique(np.asarray(nodes, dtype=np.int32))
+    return hashlib.sha256(nodes.tobytes()).hexdigest()[:16]
+
+
+def node_indices(G: CSRGraph, node_ids: Iterable) -> np.ndarray:
+    """IDs de nodo → índices internos únicos y ordenados (omite NA/desconocidos)."""
+    values = _node_array(node_ids)
+    values = values[np.isfinite(values)]
+    # En CSRGraph el ID de nodo ES el índice (ver `CSRGraph.node_index`)
+    values = values[(values == np.floor(values)) & (values >= 0) & (values < G.n_nodes)]
+    return np.unique(values.astype(np.int32))
+
+
+def build_zone_distance_matrix(G: CSRGraph, zone_nodes: Iterable) -> ZoneDistanceMatrix:
+    """Calcula la matriz zona × zona (una búsqueda por nodo de zona)."""
+    nodes = node_indices(G, zone_nodes)
+
+    k = nodes.size
+    dist = np.full((k, k), np.inf, dtype=np.float32)
+    done = 0
+    with tqdm(total=k) as bar:
+        for batch in scipy_backend.iter_source_batches(G, nodes):
+            rows, _ = scipy_backend.shortest_path_trees(G, batch, predecessors=False)
+            dist[done:done + len(batch)] = rows[:, nodes]
+            done += len(batch)
+            bar.update(len(batch))
+    return ZoneDistanceMatrix(nodes, dist)
+
+
+def load_or_build_zone_matrix(
+    G: CSRGraph,
+    zone_nodes: Iterable,
+    cache_dir: Optional[Path] = None,
+) -> ZoneDistanceMatrix:
+    """Devuelve la matriz zona × zona: memoria → disco → construcción.
+
+    `cache_dir` por defecto es `G.cache_dir` (entrada de `graph_cache`); sin
+    entrada de caché la matriz solo vive en memoria.
+    """
+    nodes = node_indices(G, zone_nodes)
+    key = zone_matrix_key(nodes)
+
+    zm = getattr(G, '_zone_matrix', None)
+    if zm is not None and zm.key == key:
+        return zm
+
+    base = cache_dir if cache_dir is not None else G.cache_dir
+    zm_dir = Path(base) / 'zone_matrix' / key if base is not None else None
+    if zm_dir is not None:
+        loaded = load_arrays(zm_dir, _ZONE_MATRIX_ARRAYS)
+        if loaded is not None and loaded[0].get('version') == ZONE_MATRIX_VERSION:
+            zm = ZoneDistanceMatrix(**loaded[1])
+            G._zone_matrix = zm
+            return zm
+
+    logger.info("Construyendo matriz MC zona × zona...")
+    zm = build_zone_distance_matrix(G, nodes)
+    logger.info("Matriz MC lista: %s nodos de zona.", zm.nodes.size)
+    if zm_dir is not None:
+        try:
+            save_arrays(
+                zm_dir,
+                {'nodes': zm.nodes, 'dist': zm.dist},
+                {'version': ZONE_MATRIX_VERSION, 'n_nodes': G.n_nodes, 'n_zone_nodes': int(zm.nodes.size)},
+            )
+        except OSError as e:
+            logger.warning("No se pudo guardar la matriz MC en %s: %s", zm_dir, e)
+    G._zone_matrix = zm
+    return zm
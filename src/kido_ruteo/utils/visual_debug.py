@@ -20,10 +20,14 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import pandas as pd
 
+from ..routing.csr_graph import CSRGraph
+
 logger = logging.getLogger(__name__)
 
 
-def _pos(G: nx.Graph, node: Hashable) -> Optional[tuple[float, float]]:
+def _pos(G: nx.Graph | CSRGraph, node: Hashable) -> Optional[tuple[float, float]]:
+    if isinstance(G, CSRGraph):
+        return G.pos(node)
     data = G.nodes.get(node, {})
     if "x" in data and "y" in data:
         return float(data["x"]), float(data["y"])
@@ -33,6 +37,16 @@ def _pos(G: nx.Graph, node: Hashable) -> Optional[tuple[float, float]]:
     return None
 
 
+def _draw_graph(G: nx.Graph | CSRGraph) -> nx.Graph:
+    # nx.draw_* solo usa el grafo para metadatos (dirigido o no); las posiciones
+    # y listas de aristas/nodos se pasan explícitas.
+    return nx.Graph() if isinstance(G, CSRGraph) else G
+
+
+def _graph_crs(G: nx.Graph | CSRGraph):
+    return G.crs if isinstance(G, CSRGraph) else G.graph.get('crs', None)
+
+
 class DebugVisualizer:
     def __init__(self, output_dir: str = "plots"):
         self.output_dir = output_dir
@@ -85,7 +99,7 @@ class DebugVisualizer:
 
     def plot_routes_overview(
         self,
-        G: nx.Graph,
+        G: nx.Graph | CSRGraph,
         checkpoint_node: Hashable,
         routes_mc: list[list[Hashable]],
         routes_mc2: list[list[Hashable]],
@@ -127,22 +141,22 @@ class DebugVisualizer:
         fig, ax = plt.subplots(figsize=(14, 12))
 
         if mc2_edges:
-            nx.draw_networkx_edges(G, pos, edgelist=list(mc2_edges), ax=ax, edge_color="blue", width=1.8, alpha=0.20)
+            nx.draw_networkx_edges(_draw_graph(G), pos, edgelist=list(mc2_edges), ax=ax, edge_color="blue", width=1.8, alpha=0.20)
         if mc_edges:
-            nx.draw_networkx_edges(G, pos, edgelist=list(mc_edges), ax=ax, edge_color="red", width=1.8, alpha=0.20)
+            nx.draw_networkx_edges(_draw_graph(G), pos, edgelist=list(mc_edges), ax=ax, edge_color="red", width=1.8, alpha=0.20)
 
         if origin_nodes:
             o_in = [n for n in origin_nodes if n in pos]
             if o_in:
-                nx.draw_networkx_nodes(G, pos, nodelist=o_in, ax=ax, node_color="green", node_size=10, alpha=0.6)
+                nx.draw_networkx_nodes(_draw_graph(G), pos, nodelist=o_in, ax=ax, node_color="green", node_size=10, alpha=0.6)
         if dest_nodes:
             d_in = [n for n in dest_nodes if n in pos]
             if d_in:
-                nx.draw_networkx_nodes(G, pos, nodelist=d_in, ax=ax, node_color="black", node_size=10, alpha=0.6)
+                nx.draw_networkx_nodes(_draw_graph(G), pos, nodelist=d_in, ax=ax, node_color="black", node_size=10, alpha=0.6)
 
         if checkpoint_node in pos:
             nx.draw_networkx_nodes(
-                G,
+                _draw_graph(G),
                 pos,
                 nodelist=[checkpoint_node],
                 ax=ax,
@@ -170,7 +184,7 @@ class DebugVisualizer:
 
     def plot_routes_overview_map(
         self,
-        G: nx.Graph,
+        G: nx.Graph | CSRGraph,
         checkpoint_node: Hashable,
         routes_mc: list[list[Hashable]],
         routes_mc2: list[list[Hashable]],
@@ -195,7 +209,7 @@ class DebugVisualizer:
         if not save_to:
             save_to = f"{self.output_dir}/checkpoint2030_routes_overview_map.png"
 
-        graph_crs = G.graph.get('crs', None)
+        graph_crs = _graph_crs(G)
 
         roads = roads_gdf
         if hasattr(roads, 'crs') and graph_crs is not None and roads.crs != graph_crs:
@@ -309,7 +323,7 @@ class DebugVisualizer:
 
     def plot_route_comparison(
         self,
-        G: nx.Graph,
+        G: nx.Graph | CSRGraph,
         origin_node: Hashable,
         dest_node: Hashable,
         checkpoint_node: Hashable,
@@ -349,18 +363,18 @@ class DebugVisualizer:
         fig, ax = plt.subplots(figsize=(12, 10))
 
         if mc2_edges:
-            nx.draw_networkx_edges(G, pos, edgelist=mc2_edges, ax=ax, edge_color="blue", width=2.2, alpha=0.45)
+            nx.draw_networkx_edges(_draw_graph(G), pos, edgelist=mc2_edges, ax=ax, edge_color="blue", width=2.2, alpha=0.45)
         if mc_edges:
-            nx.draw_networkx_edges(G, pos, edgelist=mc_edges, ax=ax, edge_color="red", width=2.2, alpha=0.45)
+            nx.draw_networkx_edges(_draw_graph(G), pos, edgelist=mc_edges, ax=ax, edge_color="red", width=2.2, alpha=0.45)
 
         # Nodes
         if origin_node in pos:
-            nx.draw_networkx_nodes(G, pos, nodelist=[origin_node], ax=ax, node_color="green", node_size=60, alpha=0.9)
+            nx.draw_networkx_nodes(_draw_graph(G), pos, nodelist=[origin_node], ax=ax, node_color="green", node_size=60, alpha=0.9)
         if dest_node in pos:
-            nx.draw_networkx_nodes(G, pos, nodelist=[dest_node], ax=ax, node_color="black", node_size=60, alpha=0.9)
+            nx.draw_networkx_nodes(_draw_graph(G), pos, nodelist=[dest_node], ax=ax, node_color="black", node_size=60, alpha=0.9)
         if checkpoint_node in pos:
             nx.draw_networkx_nodes(
-                G,
+                _draw_graph(G),
                 pos,
                 nodelist=[checkpoint_node],
                 ax=ax,
@@ -0,0 +1,63 @@
+"""Redes y OD de prueba compartidos por los tests de ruteo."""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import CSRGraph
+
+
+def coord_key(x, y):
+    return f"{x:.6f},{y:.6f}"
+
+
+def toy_network() -> gpd.GeoDataFrame:
+    """Cruce en (0, 0) + anillo NE. Coordenadas enteras (pesos exactos en float32)."""
+    lines = [
+        LineString([(-300, 0), (-200, 0), (-100, 0), (0, 0), (100, 0), (200, 0), (300, 0)]),
+        LineString([(0, -300), (0, -200), (0, -100), (0, 0), (0, 100), (0, 200), (0, 300)]),
+        LineString([(300, 0), (300, 400), (0, 400), (0, 300)]),
+    ]
+    return gpd.GeoDataFrame({"id": range(len(lines))}, geometry=lines, crs="EPSG:32614")
+
+
+def toy_od(G=None) -> pd.DataFrame:
+    """OD de prueba con IDs "x,y" (NetworkX) o IDs enteros si se pasa un CSRGraph."""
+    df = pd.DataFrame({
+        "origin_node_id": [coord_key(-300, 0), coord_key(0, -300), coord_key(300, 0), coord_key(-300, 0), None],
+        "destination_node_id": [coord_key(300, 0), coord_key(0, 300), coord_key(0, 400), coord_key(-300, 0), coord_key(0, 0)],
+        "checkpoint_node_id": [coord_key(0, 0)] * 5,
+    })
+    if isinstance(G, CSRGraph):
+        for col in df.columns:
+            df[col] = pd.array([G.node_index(k) if k else None for k in df[col]], dtype="Int32")
+    return df
+
+
+def jittered_grid(n=12, seed=0) -> gpd.GeoDataFrame:
+    """Malla con nodos desplazados al azar (sin empates exactos de longitud)."""
+    rng = np.random.default_rng(seed)
+    pts = {(i, k): (100.0 * i + rng.uniform(-20, 20), 100.0 * k + rng.uniform(-20, 20)) for i in range(n) for k in range(n)}
+    lines = []
+    for k in range(n):
+        lines.append(LineString([pts[(i, k)] for i in range(n)]))
+        lines.append(LineString([pts[(k, i)] for i in range(n)]))
+    # Algunas diagonales y un componente aislado
+    for i in range(0, n - 1, 3):
+        lines.append(LineString([pts[(i, i)], pts[(i + 1, i + 1)]]))
+    lines.append(LineString([(5000, 5000), (5100, 5000)]))
+    return gpd.GeoDataFrame({"id": range(len(lines))}, geometry=lines, crs="EPSG:32614")
+
+
+def path_length(G, path):
+    total = 0.0
+    for a, b in zip(path[:-1], path[1:]):
+        nbrs, wts = G.neighbors(a)
+        total += float(wts[nbrs.tolist().index(b)])
+    return total
@@ -0,0 +1,38 @@
+"""Tests de A* bidireccional (`routing.astar`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from routing_helpers import toy_network, toy_od, jittered_grid, path_length
+
+
+def test_bidirectional_astar_matches_dijkstra_and_expands_less():
+    from kido_ruteo.routing import dijkstra
+    from kido_ruteo.routing.astar import bidirectional_astar
+
+    G = build_csr_graph(jittered_grid(20))
+    rng = np.random.default_rng(2)
+    settled_astar = settled_dijkstra = 0
+    for s, t in rng.integers(0, G.n_nodes, size=(100, 2)).tolist() + [[3, 3], [0, G.n_nodes - 1]]:
+        stats = {}
+        path, dist = bidirectional_astar(G, s, t, stats=stats)
+        ref_dist, _ = dijkstra.single_source_dijkstra(G, s, targets=(t,))
+        if t not in ref_dist:
+            assert path is None and dist is None
+            continue
+        assert dist == pytest.approx(ref_dist[t], rel=1e-12)
+        assert path[0] == s and path[-1] == t
+        assert path_length(G, path) == pytest.approx(ref_dist[t], rel=1e-12)
+        settled_astar += stats["settled"]
+        settled_dijkstra += len(ref_dist)
+    assert settled_astar < 0.5 * settled_dijkstra
+
+    out = compute_mc_matrix(toy_od(build_csr_graph(toy_network())), build_csr_graph(toy_network()), method="astar")
+    assert out["mc_distance_m"].tolist()[:4] == [600.0, 600.0, 700.0, 0.0]
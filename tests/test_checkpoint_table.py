@@ -0,0 +1,122 @@
+"""Tests de la tabla MC2 por checkpoint (`routing.checkpoint_table`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import jittered_grid
+
+
+def test_checkpoint_table_matches_pairwise_and_persists(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import checkpoint_table
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    rng = np.random.default_rng(4)
+    nodes = rng.integers(0, G.n_nodes, size=(60, 2))
+    cp = G.n_nodes // 2 + 6
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(list(nodes[:, 0]) + [cp, 7], dtype="Int32"),
+        "destination_node_id": pd.array(list(nodes[:, 1]) + [9, cp], dtype="Int32"),
+        "checkpoint_node_id": pd.array([cp] * 62, dtype="Int32"),
+    })
+    kw = dict(checkpoint_col="checkpoint_node_id")
+
+    table = compute_mc2_matrix(df.copy(), G, **kw)
+    pairwise = compute_mc2_matrix(df.copy(), G, batched=False, **kw)
+    pd.testing.assert_frame_equal(table, pairwise)
+    assert table["sense_code"].notna().sum() > 30
+    assert (tmp_path / "g" / "checkpoints" / str(cp) / "first_hop.npy").exists()
+
+    # Re-proceso del mismo checkpoint: sin búsqueda en el grafo
+    monkeypatch.setattr(
+        checkpoint_table.CheckpointTree, "build", lambda *a, **k: pytest.fail("no debería buscar")
+    )
+    again = compute_mc2_matrix(df.copy(), load_graph_cache(tmp_path / "g"), **kw)
+    pd.testing.assert_frame_equal(again, table)
+
+
+@pytest.mark.parametrize("backend", ["python", "scipy"])
+def test_build_checkpoint_table_matches_tree_queries(backend):
+    from kido_ruteo.routing.checkpoint_table import build_checkpoint_table
+    from kido_ruteo.routing.checkpoint_tree import CheckpointTree
+
+    G = build_csr_graph(jittered_grid())
+    cp = G.n_nodes // 2 + 6
+    # Todos los nodos: incluye el checkpoint y el componente aislado (sin ruta)
+    nodes = np.arange(G.n_nodes, dtype=np.int32)
+    table = build_checkpoint_table(G, cp, nodes, backend=backend)
+    tree = CheckpointTree.build(G, cp, backend=backend)
+    hops = tree.first_hops(nodes.tolist())
+    expected = [np.inf if tree.distance(v) is None else tree.distance(v) for v in nodes.tolist()]
+    assert np.array_equal(table.dist, np.array(expected))
+    assert table.first_hop.tolist() == [-1 if hops[v] is None else hops[v] for v in nodes.tolist()]
+    assert table.first_hop[cp] == -1 and (table.first_hop[~np.isfinite(table.dist)] == -1).all()
+
+    dist_only = build_checkpoint_table(G, cp, nodes, backend=backend, hops=False)
+    assert np.array_equal(dist_only.dist, table.dist) and not dist_only.has_hops
+
+
+def test_mc2_distance_only_for_aggregated_checkpoints(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import constrained_path, dijkstra
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+    from kido_ruteo.routing.route_plan import plan_routes
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    rng = np.random.default_rng(8)
+    nodes = rng.integers(0, G.n_nodes, size=(40, 2))
+    cps = [G.n_nodes // 2, G.n_nodes // 2 + 6]
+    df = pd.DataFrame({
+        "checkpoint_id": ["1"] * 20 + ["2"] * 20,
+        "origin_node_id": pd.array(nodes[:, 0], dtype="Int32"),
+        "destination_node_id": pd.array(nodes[:, 1], dtype="Int32"),
+        "checkpoint_node_id": pd.array([cps[0]] * 20 + [cps[1]] * 20, dtype="Int32"),
+    })
+    cap = pd.DataFrame({"Checkpoint": ["1", "2", "2"], "Sentido": ["0", "1-3", "3-1"]})
+    plan = plan_routes(df, cap)
+    assert plan.distance_only.tolist() == [True] * 20 + [False] * 20
+    assert "20 solo distancia" in plan.report()
+
+    # Referencia en un grafo sin entrada de caché (no deja tablas en disco)
+    full = compute_mc2_matrix(df.copy(), build_csr_graph(jittered_grid()), checkpoint_col="checkpoint_node_id")
+
+    # Checkpoint agregado: Dijkstra sin predecesores, sin derivar giros
+    flags = []
+    real = dijkstra.single_source_dijkstra
+    monkeypatch.setattr(
+        dijkstra, "single_source_dijkstra", lambda *a, **k: flags.append(k.get("predecessors", True)) or real(*a, **k)
+    )
+    monkeypatch.setattr(
+        constrained_path, "compute_constrained_turn", lambda *a, **k: pytest.fail("sin giros en agregados")
+    )
+    only = plan.distance_only
+    for method in ["dijkstra", "astar"]:
+        out = compute_mc2_matrix(
+            df.loc[only].copy(), G, checkpoint_col="checkpoint_node_id", method=method, distance_only=only[only]
+        )
+        np.testing.assert_allclose(
+            out["mc2_distance_m"].astype(float), full.loc[only, "mc2_distance_m"].astype(float)
+        )
+        assert (out["sense_code"] == "0").all()
+    assert flags == [False]
+    assert np.load(tmp_path / "g" / "checkpoints" / str(cps[0]) / "first_hop.npy").size == 0
+
+    # Una tabla solo de distancias se reconstruye si luego se pide el sentido
+    again = compute_mc2_matrix(df.loc[only].copy(), G, checkpoint_col="checkpoint_node_id")
+    pd.testing.assert_frame_equal(again, full.loc[only])
+
+    with ParallelRoutingSession("", n_workers=1, graph=G, compute_mc=False) as session:
+        seq = session.compute(df.copy(), distance_only=only)
+    np.testing.assert_allclose(seq["mc2_distance_m"].astype(float), full["mc2_distance_m"].astype(float))
+    assert seq.loc[only, "sense_code"].eq("0").all()
+    assert seq.loc[~only, "sense_code"].equals(full.loc[~only, "sense_code"])
@@ -0,0 +1,64 @@
+"""Tests de Contraction Hierarchies (`routing.contraction`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.graph_loader import build_network_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import toy_network, toy_od, jittered_grid, path_length
+
+
+def test_contraction_hierarchy_matches_dijkstra(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import contraction, dijkstra
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    ch = contraction.load_or_build_ch(G)
+    assert ch.n_shortcuts > 0
+
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, G.n_nodes, size=(150, 2)).tolist() + [[0, 0], [0, G.n_nodes - 1]]
+    for s, t in pairs:
+        path, dist = ch.query(s, t)
+        ref_path, ref_dist = dijkstra.shortest_path(G, s, t)
+        if ref_path is None:
+            assert path is None and dist is None
+            continue
+        assert dist == pytest.approx(ref_dist, rel=1e-12)
+        assert path[0] == s and path[-1] == t
+        assert path_length(G, path) == pytest.approx(ref_dist, rel=1e-12)
+
+    # Persistido junto al grafo: una segunda carga no reconstruye
+    monkeypatch.setattr(
+        contraction, "build_contraction_hierarchy", lambda G: pytest.fail("no debería reconstruir")
+    )
+    G2 = load_graph_cache(tmp_path / "g")
+    ch2 = contraction.load_or_build_ch(G2)
+    np.testing.assert_array_equal(ch2.up_weights, ch.up_weights)
+
+
+def test_point_to_point_ch_method():
+    G = build_csr_graph(toy_network())
+    od = toy_od(G)
+    # (300,0) → (0,400) tiene dos caminos de 700 m: solo se comparan distancias
+    out_ch = compute_mc_matrix(od.copy(), G, method="ch")
+    out_dj = compute_mc_matrix(od.copy(), G)
+    pd.testing.assert_series_equal(out_ch["mc_distance_m"], out_dj["mc_distance_m"])
+
+    kw = dict(checkpoint_col="checkpoint_node_id")
+    mc2_ch = compute_mc2_matrix(od.copy(), G, method="ch", **kw)
+    mc2_dj = compute_mc2_matrix(od.copy(), G, **kw)
+    pd.testing.assert_series_equal(mc2_ch["mc2_distance_m"], mc2_dj["mc2_distance_m"])
+    assert mc2_ch.loc[0, "sense_code"] == "4-2"
+
+    with pytest.raises(ValueError):
+        compute_mc_matrix(toy_od(), build_network_graph(toy_network()), method="ch")
@@ -0,0 +1,136 @@
+"""Tests de `routing.csr_graph` (construcción, internado de nodos y ajuste a nodos)."""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, MultiLineString, Point
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import CSRGraph, build_csr_graph
+from kido_ruteo.routing.graph_loader import build_network_graph
+from routing_helpers import coord_key, toy_network, jittered_grid
+
+
+def test_build_csr_graph_matches_networkx_builder():
+    gdf = toy_network()
+    G_nx = build_network_graph(gdf)
+    G = build_csr_graph(gdf)
+
+    assert isinstance(G, CSRGraph)
+    assert G.n_nodes == G_nx.number_of_nodes()
+    assert G.n_edges == G_nx.number_of_edges()
+    assert G.indices.dtype == np.int32
+    assert G.weights.dtype == np.float32
+
+    for u, v, w in G_nx.edges(data="weight"):
+        i, j = G.node_index(u), G.node_index(v)
+        nbrs, wts = G.neighbors(i)
+        assert j in nbrs.tolist()
+        assert float(wts[nbrs.tolist().index(j)]) == w
+
+
+def test_duplicate_edges_keep_last_weight_like_networkx():
+    # Mismo par de nodos (redondeo a 6 decimales) con pesos crudos distintos,
+    # el segundo en sentido inverso: gana el último, como en `nx.Graph.add_edge`
+    gdf = gpd.GeoDataFrame(
+        {"id": [1, 2]},
+        geometry=[LineString([(0, 0), (1e-6, 0), (10, 0)]), LineString([(1.4e-6, 0), (0, 0)])],
+        crs="EPSG:32614",
+    )
+    G_nx = build_network_graph(gdf)
+    G = build_csr_graph(gdf)
+    assert G.n_edges == G_nx.number_of_edges() == 2
+    for u, v, w in G_nx.edges(data="weight"):
+        nbrs, wts = G.neighbors(G.node_index(u))
+        assert float(wts[nbrs.tolist().index(G.node_index(v))]) == np.float32(w)
+    nbrs, wts = G.neighbors(0)
+    assert float(wts[nbrs.tolist().index(1)]) == np.float32(1.4e-6)
+
+    G = CSRGraph.from_edges([0, 1, 0], [1, 0, 1], [5.0, 3.0, 4.0], np.zeros((2, 2)))
+    assert G.neighbors(1)[1].tolist() == [4.0]
+
+
+def test_load_graph_from_geojson_keeps_networkx_result(tmp_path: Path):
+    import networkx as nx
+    from kido_ruteo.routing import graph_loader
+
+    net_path = tmp_path / "red.geojson"
+    toy_network().to_file(net_path, driver="GeoJSON")
+    G_nx = graph_loader.load_graph_from_geojson(str(net_path))
+    G = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    assert isinstance(G_nx, nx.Graph) and isinstance(G, CSRGraph)
+    assert G.n_nodes == G_nx.number_of_nodes() and G.n_edges == G_nx.number_of_edges()
+    assert coord_key(0, 0) in G_nx.nodes
+
+
+def test_builders_handle_multilinestring():
+    gdf = gpd.GeoDataFrame(
+        {"id": [1, 2]},
+        geometry=[
+            MultiLineString([[(0, 0), (100, 0)], [(200, 0), (300, 0), (300, 100)]]),
+            Point(0, 0),
+        ],
+        crs="EPSG:32614",
+    )
+    G = build_csr_graph(gdf)
+    G_nx = build_network_graph(gdf)
+
+    assert G.n_nodes == G_nx.number_of_nodes() == 5
+    assert G.n_edges == G_nx.number_of_edges() == 3
+    # Las partes no se conectan entre sí
+    nbrs, _ = G.neighbors(G.node_index(coord_key(100, 0)))
+    assert nbrs.tolist() == [G.node_index(coord_key(0, 0))]
+
+
+def test_node_interning_roundtrip():
+    G = build_csr_graph(toy_network())
+    ids = G.lookup_coords(np.array([[0.0, 0.0], [300.0, 400.0], [1.0, 1.0]]))
+    assert ids.dtype == np.int32
+    assert ids[2] == -1
+    assert G.node_key(ids[0]) == coord_key(0, 0)
+    assert G.node_index(coord_key(300, 400)) == ids[1]
+    assert G.node_index(float(ids[1])) == ids[1]
+
+
+def test_nearest_node_snapping_shares_graph_kdtree(monkeypatch):
+    import scipy.spatial
+    from kido_ruteo.processing.centroides import assign_nodes_to_zones
+    from kido_ruteo.processing.checkpoint_loader import assign_checkpoint_nodes
+
+    red = jittered_grid()
+    G = build_csr_graph(red)
+    built = []
+    tree_cls = scipy.spatial.cKDTree
+    monkeypatch.setattr(scipy.spatial, "cKDTree", lambda data: built.append(len(data)) or tree_cls(data))
+
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(-50, 1200, size=(60, 2))
+    zones = gpd.GeoDataFrame(
+        {"ID": range(len(xy))}, geometry=[Point(x, y).buffer(10) for x, y in xy], crs="EPSG:32614"
+    )
+    zones = assign_nodes_to_zones(zones, G)
+    checkpoints = gpd.GeoDataFrame(
+        {"checkpoint_id": [2001, 2002], "checkpoint_name": ["E01", "E02"]},
+        geometry=[Point(310, 420), Point(720, 180)],
+        crs="EPSG:32614",
+    ).to_crs("EPSG:4326")
+    mapping = assign_checkpoint_nodes(checkpoints, G)
+    assert built == [G.n_nodes]
+
+    # Mismo nodo que la búsqueda exhaustiva
+    def _brute(points):
+        return np.argmin(((points[:, None, :] - G.coords[None]) ** 2).sum(-1), axis=1)
+
+    centroids = np.column_stack([zones["centroid_geom"].x, zones["centroid_geom"].y])
+    assert zones["nearest_node_id"].dtype == "Int32"
+    assert (zones["nearest_node_id"].to_numpy() == _brute(centroids)).all()
+    assert mapping["checkpoint_node_id"].dtype == "int32"
+    assert mapping["checkpoint_node_id"].tolist() == _brute(np.array([[310.0, 420.0], [720.0, 180.0]])).tolist()
+
+    # NetworkX: mismos nodos, como etiquetas "x,y"
+    N = build_network_graph(red)
+    nx_nodes = assign_nodes_to_zones(zones.drop(columns=["nearest_node_id"]), N)["nearest_node_id"]
+    assert nx_nodes.tolist() == [G.node_key(i) for i in zones["nearest_node_id"]]
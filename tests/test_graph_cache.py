@@ -0,0 +1,100 @@
+"""Tests de la caché persistente del grafo (`routing.graph_cache`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from routing_helpers import toy_network
+
+
+def test_graph_cache_warm_load_and_invalidation(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import graph_loader
+    from kido_ruteo.routing.graph_cache import graph_cache_root
+
+    net_path = tmp_path / "red.geojson"
+    toy_network().to_file(net_path, driver="GeoJSON")
+
+    builds = {"n": 0}
+    real_build = graph_loader.build_csr_graph
+
+    def counting_build(*args, **kwargs):
+        builds["n"] += 1
+        return real_build(*args, **kwargs)
+
+    monkeypatch.setattr(graph_loader, "build_csr_graph", counting_build)
+
+    cold = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    warm = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    assert builds["n"] == 1
+    assert not warm.indices.flags.writeable  # memory-map de solo lectura
+    np.testing.assert_array_equal(warm.indptr, cold.indptr)
+    np.testing.assert_array_equal(warm.weights, cold.weights)
+    assert warm.crs == cold.crs
+
+    # Otros parámetros de construcción => otra llave; ambas entradas conviven
+    graph_loader.load_csr_graph_from_geojson(str(net_path), precision=3)
+    assert builds["n"] == 2
+    root = graph_cache_root(str(net_path))
+    (warm.cache_dir / "ch").mkdir()
+    graph_loader.load_csr_graph_from_geojson(str(net_path), precision=4)
+    assert builds["n"] == 3
+    assert len([p for p in root.iterdir() if p.is_dir()]) == 3
+    assert (warm.cache_dir / "ch").is_dir()
+    graph_loader.load_csr_graph_from_geojson(str(net_path))
+    graph_loader.load_csr_graph_from_geojson(str(net_path), precision=3)
+    assert builds["n"] == 3
+
+    # Cambia el contenido => se invalida y se poda la entrada vieja
+    gdf = toy_network().iloc[:2]
+    gdf.to_file(net_path, driver="GeoJSON")
+    G = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    assert builds["n"] == 4
+    assert G.n_edges == 12
+    entries = [p for p in root.iterdir() if p.is_dir()]
+    assert entries == [G.cache_dir]
+
+
+def test_graph_cache_replaces_corrupt_entry(tmp_path: Path):
+    from kido_ruteo.routing import graph_loader
+    from kido_ruteo.routing.graph_cache import load_graph_cache
+
+    net_path = tmp_path / "red.geojson"
+    toy_network().to_file(net_path, driver="GeoJSON")
+    cold = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    entry = cold.cache_dir
+    del cold
+
+    # Entrada a medio escribir: arreglo truncado
+    weights = (entry / "weights.npy").read_bytes()
+    (entry / "weights.npy").write_bytes(weights[:len(weights) // 2])
+    assert load_graph_cache(entry) is None
+
+    rebuilt = graph_loader.load_csr_graph_from_geojson(str(net_path))
+    assert rebuilt.cache_dir == entry
+    warm = load_graph_cache(entry)
+    assert warm is not None
+    np.testing.assert_array_equal(warm.weights, rebuilt.weights)
+    assert not any(p.name.endswith(".tmp") for p in entry.parent.iterdir())
+
+
+def test_network_coverage_checked_from_cache_meta(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import graph_loader
+
+    net_path = tmp_path / "red.geojson"
+    red = toy_network()
+    red.to_file(net_path, driver="GeoJSON")
+    west, south, east, north = red.to_crs("EPSG:4326").total_bounds
+    bbox = [north, south, east, west]
+    cold = graph_loader.ensure_csr_graph_from_geojson_or_osm(str(net_path), osm_bbox=bbox)
+
+    # Caché caliente: ni se lee el GeoJSON ni se descarga
+    monkeypatch.setattr(graph_loader.gpd, "read_file", lambda *a, **k: pytest.fail("no debería leer la red"))
+    monkeypatch.setattr(graph_loader, "download_graph_from_bbox", lambda **k: pytest.fail("no debería descargar"))
+    warm = graph_loader.ensure_csr_graph_from_geojson_or_osm(str(net_path), osm_bbox=bbox)
+    assert warm.cache_dir == cold.cache_dir
+    assert graph_loader.cached_network_bounds(str(net_path)) == pytest.approx((west, south, east, north))
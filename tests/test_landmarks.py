@@ -0,0 +1,83 @@
+"""Tests de ALT / landmarks (`routing.landmarks`)."""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import LineString
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from routing_helpers import toy_network, toy_od, jittered_grid, path_length
+
+
+def test_alt_landmarks_match_dijkstra_and_persist(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import dijkstra, landmarks
+    from kido_ruteo.routing.astar import bidirectional_astar
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+
+    save_graph_cache(build_csr_graph(jittered_grid(20)), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    alt = landmarks.load_or_build_landmarks(G, n_landmarks=8)
+    assert alt.dist.dtype == np.float32 and alt.dist.shape == (G.n_nodes, 8)
+    assert len(set(alt.landmarks.tolist())) == 8
+
+    rng = np.random.default_rng(3)
+    settled_alt = settled_astar = 0
+    for s, t in rng.integers(0, G.n_nodes, size=(100, 2)).tolist() + [[3, 3], [0, G.n_nodes - 1]]:
+        stats, stats_astar = {}, {}
+        path, dist = bidirectional_astar(G, s, t, potential=alt.potential(s, t), stats=stats)
+        bidirectional_astar(G, s, t, stats=stats_astar)
+        ref_dist, _ = dijkstra.single_source_dijkstra(G, s, targets=(t,))
+        if t not in ref_dist:
+            assert path is None and dist is None
+            continue
+        assert dist == pytest.approx(ref_dist[t], rel=1e-12)
+        assert path_length(G, path) == pytest.approx(ref_dist[t], rel=1e-12)
+        settled_alt += stats["settled"]
+        settled_astar += stats_astar["settled"]
+    assert settled_alt < settled_astar
+
+    out = compute_mc_matrix(toy_od(build_csr_graph(toy_network())), build_csr_graph(toy_network()), method="alt")
+    assert out["mc_distance_m"].tolist()[:4] == [600.0, 600.0, 700.0, 0.0]
+
+    # Persistido junto al grafo (memory-map): una segunda carga no reconstruye
+    monkeypatch.setattr(landmarks, "select_landmarks", lambda *a, **k: pytest.fail("no debería reconstruir"))
+    alt2 = landmarks.load_or_build_landmarks(load_graph_cache(tmp_path / "g"), n_landmarks=8)
+    np.testing.assert_array_equal(alt2.dist, alt.dist)
+
+
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+def test_alt_and_astar_with_disconnected_component():
+    from kido_ruteo.routing import dijkstra, landmarks
+    from kido_ruteo.routing.astar import bidirectional_astar
+
+    # Malla principal + isla con camino propio (la isla no tiene landmarks)
+    grid = jittered_grid(8)
+    island = gpd.GeoDataFrame(
+        {"id": [1000, 1001]},
+        geometry=[LineString([(9000, 9000), (9100, 9000), (9200, 9050)]), LineString([(9200, 9050), (9200, 9150)])],
+        crs=grid.crs,
+    )
+    G = build_csr_graph(pd.concat([grid, island], ignore_index=True))
+    alt = landmarks.select_landmarks(G, n_landmarks=4)
+    island_nodes = [int(G.lookup_coords(np.array([xy]))[0]) for xy in [(9000, 9000), (9200, 9050), (9200, 9150)]]
+    assert min(island_nodes) >= 0
+    assert not np.isin(alt.landmarks, island_nodes).any()
+
+    main_node = 0
+    for s, t in [(main_node, island_nodes[0]), (island_nodes[0], main_node), (island_nodes[0], island_nodes[2])]:
+        ref_dist, _ = dijkstra.single_source_dijkstra(G, s, targets=(t,))
+        assert alt.lower_bound(s, t) <= ref_dist.get(t, np.inf)
+        for potential in (None, alt.potential(s, t)):
+            path, dist = bidirectional_astar(G, s, t, potential=potential)
+            if t not in ref_dist:
+                assert path is None and dist is None
+            else:
+                assert dist == pytest.approx(ref_dist[t], rel=1e-12)
+                assert path_length(G, path) == pytest.approx(ref_dist[t], rel=1e-12)
@@ -0,0 +1,244 @@
+"""Tests de `routing.parallel_routing` (sesión, transporte y agenda de chunks)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.shortest_path import compute_shortest_path_mc
+from routing_helpers import toy_network, toy_od, jittered_grid
+
+
+def test_parallel_session_workers_attach_published_graph(tmp_path: Path):
+    from kido_ruteo.routing import graph_loader
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    net_path = tmp_path / "red.geojson"
+    toy_network().to_file(net_path, driver="GeoJSON")
+    G = graph_loader.load_csr_graph_from_geojson(str(net_path), target_crs="EPSG:32614")
+    assert G.cache_dir is not None
+
+    df = toy_od(G)
+    with ParallelRoutingSession(str(net_path), n_workers=1, graph=G) as session:
+        expected = session.compute(df)
+
+    with ParallelRoutingSession(str(net_path), n_workers=2, chunk_size=2, graph=G) as session:
+        # Grafo ya en caché: se publica la misma entrada, sin copia temporal
+        assert session._graph_dir == G.cache_dir
+        out = session.compute(df)
+    pd.testing.assert_series_equal(out["mc2_distance_m"], expected["mc2_distance_m"])
+    assert out["sense_code"].tolist() == expected["sense_code"].tolist()
+
+    with ParallelRoutingSession(str(net_path), n_workers=2, graph=G, backend="scipy") as session:
+        out = session.compute(df)
+    pd.testing.assert_series_equal(out["mc2_distance_m"], expected["mc2_distance_m"])
+    assert out["sense_code"].tolist() == expected["sense_code"].tolist()
+
+    # Grafo solo en memoria: se publica en un directorio temporal que se limpia
+    G_mem = build_csr_graph(toy_network())
+    with ParallelRoutingSession(str(net_path), n_workers=2, graph=G_mem) as session:
+        tmp_dir = session._graph_dir
+        out = session.compute(toy_od(G_mem))
+    assert not tmp_dir.exists()
+    pd.testing.assert_series_equal(out["mc_distance_m"], expected["mc_distance_m"])
+
+
+def test_parallel_session_array_transport_matches_sequential(tmp_path: Path):
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    rng = np.random.default_rng(9)
+    nodes = rng.integers(0, G.n_nodes, size=(40, 2))
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(list(nodes[:, 0]) * 2, dtype="Int32"),
+        "destination_node_id": pd.array(list(nodes[:, 1]) * 2, dtype="Int32"),
+        "checkpoint_node_id": pd.array([G.n_nodes // 2, 40] * 40, dtype="Int32"),
+    })
+
+    # 'astar': MC y MC2 se resuelven en los workers
+    with ParallelRoutingSession("", n_workers=1, graph=G, method="astar") as session:
+        expected = session.compute(df)
+    with ParallelRoutingSession("", n_workers=2, chunk_size=7, graph=G, method="astar") as session:
+        out = session.compute(df)
+    for col in ["mc_distance_m", "mc_time_h", "mc2_distance_m"]:
+        assert np.allclose(out[col], expected[col].astype(float), equal_nan=True)
+    assert out["mc_path"].fillna("").tolist() == expected["mc_path"].fillna("").tolist()
+    assert pd.Series(out["sense_code"], dtype=object).equals(pd.Series(expected["sense_code"], dtype=object))
+
+    # Dijkstra sin MC (plan contractual): MC2 desde las tablas de checkpoint en
+    # los workers, con filas solo distancia
+    dist_only = [False, True] * 40
+    with ParallelRoutingSession("", n_workers=1, graph=G, compute_mc=False) as session:
+        expected = session.compute(df.copy(), distance_only=dist_only)
+    with ParallelRoutingSession("", n_workers=2, chunk_size=7, graph=G, compute_mc=False) as session:
+        out = session.compute(df, distance_only=dist_only)
+    assert np.allclose(out["mc2_distance_m"], expected["mc2_distance_m"].astype(float), equal_nan=True)
+    assert (out["sense_code"][1::2] == "0").all()
+    assert pd.Series(out["sense_code"], dtype=object).equals(pd.Series(expected["sense_code"], dtype=object))
+
+
+def test_parallel_session_routes_mc_once_per_pair(tmp_path: Path):
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    # 3 checkpoints por par y cada par también como (d, o)
+    rng = np.random.default_rng(11)
+    nodes = rng.integers(0, G.n_nodes, size=(10, 2))
+    o = np.r_[nodes[:, 0], nodes[:, 1]].repeat(3)
+    d = np.r_[nodes[:, 1], nodes[:, 0]].repeat(3)
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(o, dtype="Int32"),
+        "destination_node_id": pd.array(d, dtype="Int32"),
+        "checkpoint_node_id": pd.array(np.tile([5, 40, G.n_nodes // 2], 20), dtype="Int32"),
+    })
+    with ParallelRoutingSession("", n_workers=1, graph=G) as session:
+        expected = session.compute(df)
+    with ParallelRoutingSession("", n_workers=2, chunk_size=7, graph=G) as session:
+        chunks = []
+        real_map = session._executor.map
+        session._executor.map = lambda fn, it: real_map(fn, chunks.extend(it) or chunks)
+        out = session.compute(df)
+    assert sum(int(c.mc.sum()) for c in chunks) == len(np.unique(np.sort(nodes, axis=1), axis=0))
+    for col in ["mc_distance_m", "mc_time_h", "mc2_distance_m"]:
+        assert np.allclose(out[col], expected[col].astype(float), equal_nan=True)
+    assert out["mc_path"].fillna("").tolist() == expected["mc_path"].fillna("").tolist()
+
+
+def test_parallel_session_marks_worker_cache_hits(monkeypatch, tmp_path: Path):
+    import os
+    import sqlite3
+
+    from kido_ruteo.routing import parallel_routing
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    rng = np.random.default_rng(10)
+    nodes = rng.integers(0, G.n_nodes, size=(20, 2))
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(nodes[:, 0], dtype="Int32"),
+        "destination_node_id": pd.array(nodes[:, 1], dtype="Int32"),
+        "checkpoint_node_id": pd.array([G.n_nodes // 2, 40] * 10, dtype="Int32"),
+    })
+    kw = dict(n_workers=2, chunk_size=5, graph=G, method="astar", route_cache=True)
+    with ParallelRoutingSession("", **kw) as session:
+        expected = session.compute(df, distance_only=[False, True] * 10)
+
+    db = sqlite3.connect(tmp_path / "g" / "routes.sqlite")
+    with db:
+        db.execute("UPDATE mc SET last_used = 0")
+        db.execute("UPDATE mc2 SET last_used = 0")
+
+    # Segunda sesión: todo sale de la caché en los workers; el padre marca los hits
+    # (y no relee el catálogo de sentidos en `compute`)
+    with ParallelRoutingSession("", **kw) as session:
+        parent, load = os.getpid(), parallel_routing._load_valid_sense_codes
+        monkeypatch.setattr(
+            parallel_routing, "_load_valid_sense_codes",
+            lambda *a: pytest.fail("catálogo releído") if os.getpid() == parent else load(*a),
+        )
+        out = session.compute(df, distance_only=[False, True] * 10)
+        assert session._route_cache.misses == 0 and session._route_cache.hits == 40
+    pd.testing.assert_series_equal(out["mc2_distance_m"], expected["mc2_distance_m"])
+    for table in ("mc", "mc2"):
+        assert db.execute(f"SELECT COUNT(*) FROM {table} WHERE last_used = 0").fetchone()[0] == 0
+    db.close()
+
+
+@pytest.mark.parametrize("method", ["dijkstra", "astar"])
+def test_parallel_session_keeps_unreachable_routes_as_nan(tmp_path: Path, method):
+    import geopandas as gpd
+    from shapely.geometry import LineString
+
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    # Malla + isla: las filas entre ambas no tienen ruta
+    grid = jittered_grid(8)
+    island = gpd.GeoDataFrame(
+        {"id": [1000]}, geometry=[LineString([(9000, 9000), (9100, 9000)])], crs=grid.crs
+    )
+    save_graph_cache(build_csr_graph(pd.concat([grid, island], ignore_index=True)), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    isle = G.n_nodes - 1
+    df = pd.DataFrame({
+        "origin_node_id": pd.array([0, isle, 3, 5, None], dtype="Int32"),
+        "destination_node_id": pd.array([isle, 7, 20, 30, 2], dtype="Int32"),
+        "checkpoint_node_id": pd.array([10, 10, isle, 12, 10], dtype="Int32"),
+    })
+    with ParallelRoutingSession("", n_workers=1, graph=G, method=method) as session:
+        expected = session.compute(df)
+    with ParallelRoutingSession("", n_workers=2, graph=G, method=method) as session:
+        out = session.compute(df)
+    assert out["mc2_distance_m"].isna().tolist() == [True, True, True, False, True]
+    for col in ["mc_distance_m", "mc_time_h", "mc2_distance_m"]:
+        assert np.allclose(out[col], expected[col].astype(float), equal_nan=True)
+    assert out["mc_path"].fillna("").tolist() == expected["mc_path"].fillna("").tolist()
+    assert pd.Series(out["sense_code"], dtype=object).equals(pd.Series(expected["sense_code"], dtype=object))
+
+
+def test_schedule_groups_by_checkpoint_and_origin(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import parallel_routing
+    from kido_ruteo.routing.graph_cache import save_graph_cache
+
+    G = build_csr_graph(jittered_grid())
+    rng = np.random.default_rng(10)
+    n = 300
+    origins = rng.integers(0, 6, size=n) * 10
+    dests = rng.integers(0, G.n_nodes - 2, size=n)
+    checkpoints = rng.choice([50, 60], size=n)
+    todo = np.arange(n)
+
+    chunks = parallel_routing._schedule(G.coords, origins, dests, checkpoints, todo, 40, 2)
+    assert sorted(np.concatenate(chunks).tolist()) == todo.tolist()
+    assert max(c.size for c in chunks) <= 40
+    single = parallel_routing._schedule(
+        G.coords, origins, dests, checkpoints, todo, 1000, 1, by_checkpoint=False, single_source=True
+    )
+    # Unidades por origen; las caras se parten para que otros workers ayuden
+    assert len(single) >= 4
+    assert all((np.diff(origins[c]) >= 0).all() for c in single)
+    assert sorted(np.concatenate(single).tolist()) == todo.tolist()
+    # Cada chunk recorre unidades (checkpoint, origen) contiguas
+    for c in chunks:
+        keys = list(zip(checkpoints[c].tolist(), origins[c].tolist()))
+        assert keys == sorted(keys)
+    # Tablas de checkpoint: cada checkpoint completo en un solo chunk
+    tables = parallel_routing._schedule(
+        G.coords, origins, dests, checkpoints, todo, 40, 2, single_source=True, by_origin=False, split=False
+    )
+    assert sorted(np.concatenate(tables).tolist()) == todo.tolist()
+    owners = [set(checkpoints[c].tolist()) for c in tables]
+    assert all(a.isdisjoint(b) for i, a in enumerate(owners) for b in owners[i + 1:])
+
+    # Con Dijkstra el worker hace una búsqueda por origen del chunk
+    save_graph_cache(G, tmp_path / "g")
+    parallel_routing._init_worker(str(tmp_path / "g"), None)
+    calls = []
+    real = parallel_routing.compute_shortest_paths_from_origin
+    monkeypatch.setattr(
+        parallel_routing,
+        "compute_shortest_paths_from_origin",
+        lambda G_, o, ds, **k: calls.append(o) or real(G_, o, ds, **k),
+    )
+    # Sin partir unidades (un solo chunk): una búsqueda por origen
+    keys = todo[:30][np.argsort(origins[:30], kind="stable")]
+    res = parallel_routing._process_chunk(parallel_routing._Chunk(
+        keys=keys, origins=origins[keys], dests=dests[keys], checkpoints=checkpoints[keys],
+        mc=np.ones(keys.size, dtype=bool), mc2=np.zeros(keys.size, dtype=bool),
+        table=np.zeros(keys.size, dtype=bool), dist_only=np.zeros(keys.size, dtype=bool),
+    ))
+    assert sorted(calls) == sorted(set(origins[:30].tolist()))
+    for i, k in enumerate(keys.tolist()):
+        _, dist, _ = compute_shortest_path_mc(G, int(origins[k]), int(dests[k]))
+        assert res.mc_distance_m[i] == pytest.approx(dist) if dist is not None else np.isnan(res.mc_distance_m[i])
@@ -0,0 +1,84 @@
+"""Tests de `PipelineSession` (recursos compartidos entre archivos OD)."""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from routing_helpers import jittered_grid
+
+
+def test_pipeline_session_loads_once_and_matches_run_pipeline(monkeypatch, tmp_path: Path):
+    from kido_ruteo import pipeline
+
+    net_path = tmp_path / "red.geojson"
+    jittered_grid().to_file(net_path, driver="GeoJSON")
+    zon_path = tmp_path / "zonification.geojson"
+    centers = [(0, 0), (1100, 0), (0, 1100), (1100, 1100), (550, 560)]
+    gpd.GeoDataFrame(
+        {"ID": [1, 2, 3, 4, 2001], "NOMGEO": ["Z1", "Z2", "Z3", "Z4", "E01"],
+         "poly_type": ["Core"] * 4 + ["Checkpoint"]},
+        geometry=[Point(x, y).buffer(30) for x, y in centers],
+        crs="EPSG:32614",
+    ).to_file(zon_path, driver="GeoJSON")
+    cap_path = tmp_path / "summary_capacity.csv"
+    pd.DataFrame({
+        "Checkpoint": [2001], "Sentido": ["0"], "FA": [1.0],
+        "M": [1.0], "A": [20.0], "B": [1.0], "CU": [5.0], "CAI": [1.0], "CAII": [1.0], "TOTAL": [29.0],
+        **{f"Focup_{c}": [1.5] for c in ["M", "A", "B", "CU", "CAI", "CAII"]},
+    }).to_csv(cap_path, index=False)
+    od_path = tmp_path / "checkpoint2001.csv"
+    pd.DataFrame({
+        "origin": [1, 2, 3, 4, 2],
+        "destination": [4, 3, 2, 1, 2],
+        "total_trips": [100, 50, 20, 10, 5],
+    }).to_csv(od_path, index=False)
+    # bbox = extensión de la red (sin descarga OSM)
+    west, south, east, north = gpd.read_file(net_path).to_crs("EPSG:4326").total_bounds
+    paths = dict(
+        zonification_path=str(zon_path), network_path=str(net_path), capacity_path=str(cap_path),
+        osm_bbox=[north, south, east, west],
+    )
+
+    out_file = pipeline.run_pipeline(od_path=str(od_path), output_dir=str(tmp_path / "one"), **paths)
+    expected = pd.read_csv(out_file)
+    assert Path(out_file).name == "processed_checkpoint2001.csv"
+    assert expected["veh_total"].gt(0).any()
+
+    # Sesión: grafo, zonas, checkpoints y capacidad se cargan una sola vez
+    calls = []
+    load_graph = pipeline.ensure_csr_graph_from_geojson_or_osm
+    monkeypatch.setattr(
+        pipeline, "ensure_csr_graph_from_geojson_or_osm", lambda **k: calls.append(k) or load_graph(**k)
+    )
+    with pipeline.PipelineSession(output_dir=str(tmp_path / "many"), **paths) as session:
+        from_path = session.run(str(od_path))
+        from_frame = session.run(pd.read_csv(od_path), name="checkpoint2001.csv", write=False)
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(from_path.reset_index(drop=True), expected, check_dtype=False)
+    pd.testing.assert_frame_equal(from_frame.reset_index(drop=True), expected, check_dtype=False)
+    assert pd.read_csv(tmp_path / "many" / "processed_checkpoint2001.csv").equals(expected)
+
+
+def test_pipeline_session_general_query_options(tmp_path: Path):
+    from kido_ruteo import pipeline
+
+    df = pd.DataFrame({"origin": ["1", "2", "x"], "destination": ["3", "1", "2"], "total_trips": [10, 5, 1]})
+    # Sin checkpoint: query general (ceros, sin cargar recursos)
+    paths = dict(zonification_path="", network_path="", capacity_path="")
+    with pipeline.PipelineSession(**paths) as session:
+        out = session.run(df, name="general.csv", write=False)
+    assert out["veh_total"].eq(0).all() and out["Origen"].tolist() == ["1", "2", "x"]
+
+    # Modo lote: IDs numéricos y un OD sin checkpoint es un error
+    with pipeline.PipelineSession(numeric_ids=True, **paths) as session:
+        out = session.run(df, name="general.csv", write=False)
+    assert out["Origen"].tolist()[:2] == [1, 2] and pd.isna(out["Origen"].iloc[2])
+    with pipeline.PipelineSession(require_checkpoint_id=True, **paths) as session:
+        with pytest.raises(ValueError, match="checkpoint_id"):
+            session.run(df, name="general.csv", write=False)
@@ -0,0 +1,90 @@
+"""Tests de la caché persistente de rutas (`routing.route_cache`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix, compute_shortest_path_mc
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import jittered_grid
+
+
+def test_route_cache_persists_results_and_evicts(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import constrained_path, shortest_path
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+    from kido_ruteo.routing.route_cache import RouteCache
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    rng = np.random.default_rng(8)
+    nodes = rng.integers(0, G.n_nodes, size=(30, 2))
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(list(nodes[:, 0]) + [G.n_nodes - 1], dtype="Int32"),
+        "destination_node_id": pd.array(list(nodes[:, 1]) + [0], dtype="Int32"),  # sin ruta
+        "checkpoint_node_id": pd.array([G.n_nodes // 2] * 31, dtype="Int32"),
+    })
+    kw = dict(checkpoint_col="checkpoint_node_id", batched=False)
+
+    cache = RouteCache.for_graph(G)
+    mc = compute_mc_matrix(df.copy(), G, return_paths=False, route_cache=cache)
+    mc2 = compute_mc2_matrix(df.copy(), G, route_cache=cache, **kw)
+    assert cache.hits == 0 and (tmp_path / "g" / "routes.sqlite").exists()
+
+    # Otra corrida (otro proceso): todo sale de la caché, sin búsquedas
+    monkeypatch.setattr(shortest_path, "compute_shortest_path_mc", lambda *a, **k: pytest.fail("MC"))
+    monkeypatch.setattr(constrained_path, "compute_constrained_turn", lambda *a, **k: pytest.fail("MC2"))
+    reader = RouteCache(tmp_path / "g" / "routes.sqlite")
+    again = compute_mc_matrix(df.copy(), G, return_paths=False, route_cache=reader)
+    pd.testing.assert_series_equal(again["mc_distance_m"], mc["mc_distance_m"])
+    again2 = compute_mc2_matrix(df.copy(), G, route_cache=reader, **kw)
+    pd.testing.assert_frame_equal(again2, mc2)
+    assert reader.misses == 0 and reader.hits > 0
+
+    ro = RouteCache(tmp_path / "g" / "routes.sqlite", readonly=True)
+    dist, hit = ro.get_mc([int(nodes[0, 1])], [int(nodes[0, 0])])  # (d, o)
+    assert hit[0] and dist[0] == pytest.approx(mc["mc_distance_m"].iloc[0])
+
+    small = RouteCache(tmp_path / "small.sqlite", max_entries=10)
+    small.put_mc(range(25), range(1, 26), [1.0] * 25)
+    assert small._rows("mc") == 9
+
+
+def test_route_cache_batches_lookups_and_tracks_row_count(tmp_path: Path):
+    from kido_ruteo.routing.route_cache import RouteCache
+
+    cache = RouteCache(tmp_path / "r.sqlite", max_entries=100)
+    statements = []
+    cache._connect().set_trace_callback(statements.append)
+
+    # Conteo inicial una vez; las escrituras bajo el límite no recuentan
+    for i in range(8):
+        cache.put_mc2(range(10 * i, 10 * i + 10), [0] * 10, [7] * 10, [1.0] * 10, ["1-2"] * 10, "cat")
+    assert sum("COUNT(*)" in s for s in statements) == 1
+
+    # Una sola consulta para todo el lote; los hits quedan como recién usados
+    statements.clear()
+    dist, sense, hit = cache.get_mc2([0, 1, 1, 5], [0, 0, 0, 1], [7, 7, 7, 7], "cat")
+    assert hit.tolist() == [True, True, True, False]
+    assert sense[:3] == ["1-2"] * 3 and np.isnan(dist[3])
+    assert sum(s.lstrip().startswith("SELECT") for s in statements) == 1
+    assert sum(s.lstrip().startswith("UPDATE") for s in statements) == 1
+
+    # Pasar el límite recuenta y desaloja los de uso más antiguo (no los hits)
+    cache.put_mc2(range(100, 130), [0] * 30, [7] * 30, [1.0] * 30, [None] * 30, "cat")
+    assert cache._rows("mc2") == 90
+    assert cache.get_mc2([0, 1, 2], [0, 0, 0], [7, 7, 7], "cat")[2].tolist() == [True, True, False]
+
+
+def test_route_cache_readonly_path_with_uri_characters(tmp_path: Path):
+    from kido_ruteo.routing.route_cache import RouteCache
+
+    path = tmp_path / "red #1 ?x=100%" / "routes.sqlite"
+    RouteCache(path).put_mc([1], [2], [5.0])
+    dist, hit = RouteCache(path, readonly=True).get_mc([2], [1])
+    assert hit.tolist() == [True] and dist[0] == 5.0
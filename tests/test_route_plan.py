@@ -0,0 +1,54 @@
+"""Tests del plan de ruteo (`routing.route_plan`)."""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import jittered_grid
+
+
+def test_route_plan_skips_rows_without_vehicles():
+    from kido_ruteo.capacity.matcher import match_capacity_to_od
+    from kido_ruteo.congruence.classification import classify_congruence
+    from kido_ruteo.routing.constrained_path import has_valid_path
+    from kido_ruteo.routing.route_plan import merge_routed, plan_routes
+    from kido_ruteo.trips.calculation import calculate_vehicle_trips
+
+    G = build_csr_graph(jittered_grid())
+    cap = pd.DataFrame({
+        "Checkpoint": ["1"], "Sentido": ["0"], "FA": [1.0],
+        "M": [1.0], "A": [2.0], "B": [1.0], "CU": [1.0], "CAI": [1.0], "CAII": [1.0],
+        **{f"Focup_{c}": [1.5] for c in ["M", "A", "B", "CU", "CAI", "CAII"]},
+    })
+    df = pd.DataFrame({
+        "checkpoint_id": ["1", "1", "2", "1", "1"],
+        "origin_node_id": pd.array([0, 7, 0, None, 3], dtype="Int32"),
+        "destination_node_id": pd.array([12, 7, 12, 4, 20], dtype="Int32"),
+        "checkpoint_node_id": pd.array([G.n_nodes // 2] * 5, dtype="Int32"),
+        "intrazonal_factor": [0, 1, 0, 0, 0],
+        "trips_person": [10.0] * 5,
+    }, index=[10, 11, 12, 13, 14])
+
+    plan = plan_routes(df, cap)
+    assert plan.viable.tolist() == [True, False, False, False, True]
+    assert plan.skipped == {"intrazonal": 1, "no_capacity": 1, "no_zone_node": 1, "no_checkpoint_node": 0}
+    assert "3 rutas evitadas" in plan.report()
+
+    def _finish(d):
+        d["has_valid_path"] = has_valid_path(d)
+        return calculate_vehicle_trips(classify_congruence(match_capacity_to_od(d, cap)))
+
+    full = _finish(compute_mc_matrix(compute_mc2_matrix(df.copy(), G, checkpoint_col="checkpoint_node_id"), G))
+    routed = compute_mc_matrix(compute_mc2_matrix(df.loc[plan.viable].copy(), G, checkpoint_col="checkpoint_node_id"), G)
+    pushed = _finish(merge_routed(df, routed, plan))
+    veh = ["veh_M", "veh_A", "veh_B", "veh_CU", "veh_CAI", "veh_CAII", "veh_total"]
+    pd.testing.assert_frame_equal(pushed[veh], full[veh])
+    assert (full.loc[~plan.viable, "veh_total"] == 0).all()
+    assert (pushed["congruence_id"] == full["congruence_id"]).all()
+    assert _finish(merge_routed(df, None, plan))["veh_total"].tolist() == [0.0] * 5
@@ -0,0 +1,46 @@
+"""Tests del backend `scipy.sparse.csgraph`."""
+
+import ast
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.graph_loader import build_network_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import toy_network, toy_od
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_scipy_backend_matches_networkx(batched):
+    gdf = toy_network()
+    G = build_csr_graph(gdf)
+    G_nx = build_network_graph(gdf)
+
+    mc_nx = compute_mc_matrix(toy_od(), G_nx, batched=batched)
+    mc_sp = compute_mc_matrix(toy_od(G), G, batched=batched, backend="scipy")
+    # Bit a bit: comparación exacta, no aproximada
+    assert mc_sp["mc_distance_m"].fillna(-1).tolist() == mc_nx["mc_distance_m"].fillna(-1).tolist()
+    sp_paths = [
+        str([G.node_key(i) for i in ast.literal_eval(p)]) if isinstance(p, str) else None
+        for p in mc_sp["mc_path"]
+    ]
+    assert sp_paths == [p if isinstance(p, str) else None for p in mc_nx["mc_path"]]
+
+    kw = dict(checkpoint_col="checkpoint_node_id", batched=batched)
+    mc2_nx = compute_mc2_matrix(toy_od(), G_nx, **kw)
+    mc2_sp = compute_mc2_matrix(toy_od(G), G, backend="scipy", **kw)
+    assert mc2_sp["mc2_distance_m"].fillna(-1).tolist() == mc2_nx["mc2_distance_m"].fillna(-1).tolist()
+    assert mc2_sp["sense_code"].fillna("nan").tolist() == mc2_nx["sense_code"].fillna("nan").tolist()
+
+
+def test_scipy_backend_rejects_networkx_graph_and_unknown_names():
+    G_nx = build_network_graph(toy_network())
+    with pytest.raises(ValueError):
+        compute_mc_matrix(toy_od(), G_nx, backend="scipy")
+    with pytest.raises(ValueError):
+        compute_mc_matrix(toy_od(), G_nx, backend="igraph")
@@ -0,0 +1,61 @@
+"""Tests de los kernels vectoriales de sentido (`routing.sense_kernels`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from routing_helpers import jittered_grid
+
+
+def test_derive_sense_codes_matches_scalar_derivation():
+    from kido_ruteo.routing.constrained_path import (
+        _load_valid_sense_codes,
+        derive_sense_codes,
+        derive_sense_from_path,
+    )
+
+    G = build_csr_graph(jittered_grid())
+    valid = _load_valid_sense_codes()
+    rng = np.random.default_rng(5)
+    u, v, w, expected = [], [], [], []
+    for c in rng.integers(0, G.n_nodes, size=200).tolist():
+        nbrs = G.neighbors(c)[0].tolist()
+        a, b = rng.choice(nbrs), rng.choice(nbrs)
+        candidate = derive_sense_from_path(G, [int(a), c, int(b)], c)
+        expected.append(candidate if candidate == "0" or candidate in valid else np.nan)
+        u.append(int(a)), v.append(c), w.append(int(b))
+    u.append(None), v.append(0), w.append(1)
+    expected.append(np.nan)
+
+    got = derive_sense_codes(G, u, v, w, valid)
+    assert pd.Series(got, dtype=object).equals(pd.Series(expected, dtype=object))
+    assert {"0"} < set(x for x in got if isinstance(x, str))
+
+
+def test_sense_kernels_rules_as_masks():
+    from kido_ruteo.routing import sense_kernels
+
+    b = np.array([0.0, 44.999, 45.0, 134.9, 135.0, 224.9, 225.0, 314.9, 315.0, np.nan])
+    assert sense_kernels.cardinalities(b).tolist() == [1, 1, 2, 2, 3, 3, 4, 4, 1, 0]
+    assert sense_kernels.cardinalities(b, is_origin=True).tolist() == [3, 3, 4, 4, 1, 1, 2, 2, 3, 0]
+
+    # Cruce en (0, 0): llegar desde el oeste y salir al norte/oeste/este; nodo faltante
+    coords = np.array([[0.0, 0.0], [-1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+    u = np.array([1, 1, 1, -1])
+    v = np.zeros(4, dtype=int)
+    w = np.array([2, 1, 3, 3])
+    turns = sense_kernels.derive_turn_senses(coords, u, v, w, valid_sense_codes={"4-1"})
+    assert turns.bearing_in.tolist()[:3] == [90.0, 90.0, 90.0]
+    assert turns.origin_card.tolist() == [4, 4, 4, 0]
+    assert turns.dest_card.tolist() == [1, 4, 2, 2]
+    # '4-2' no está en el catálogo; '4-4' → '0' (siempre válido)
+    assert turns.sense_code[0] == "4-1" and turns.sense_code[1] == "0"
+    assert pd.isna(turns.sense_code[2]) and pd.isna(turns.sense_code[3])
+
+    raw = sense_kernels.derive_turn_senses(coords, u, v, w)
+    assert raw.sense_code[2] == "4-2"
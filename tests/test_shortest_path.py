@@ -0,0 +1,174 @@
+"""Tests de MC / MC2 matriciales (`shortest_path`, `constrained_path`, `dedup`)."""
+
+import ast
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.graph_loader import build_network_graph
+from kido_ruteo.routing.shortest_path import compute_mc_matrix, compute_shortest_path_mc
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import toy_network, toy_od, jittered_grid
+
+
+def test_csr_mc_matrix_matches_networkx():
+    gdf = toy_network()
+    G = build_csr_graph(gdf)
+    out_nx = compute_mc_matrix(toy_od(), build_network_graph(gdf))
+    out_csr = compute_mc_matrix(toy_od(G), G)
+
+    pd.testing.assert_series_equal(out_csr["mc_distance_m"], out_nx["mc_distance_m"])
+    # Los caminos CSR usan IDs enteros; la etiqueta "x,y" se obtiene con node_key
+    csr_paths = [
+        str([G.node_key(i) for i in ast.literal_eval(p)]) if isinstance(p, str) else None
+        for p in out_csr["mc_path"]
+    ]
+    assert csr_paths == [p if isinstance(p, str) else None for p in out_nx["mc_path"]]
+
+
+def test_csr_mc2_matrix_matches_networkx():
+    gdf = toy_network()
+    G = build_csr_graph(gdf)
+    out_nx = compute_mc2_matrix(toy_od(), build_network_graph(gdf), checkpoint_col="checkpoint_node_id")
+    out_csr = compute_mc2_matrix(toy_od(G), G, checkpoint_col="checkpoint_node_id")
+
+    pd.testing.assert_series_equal(out_csr["mc2_distance_m"], out_nx["mc2_distance_m"])
+    pd.testing.assert_series_equal(out_csr["sense_code"], out_nx["sense_code"])
+    # Oeste → Este pasando por el cruce: entra desde el Poniente, sale al Oriente
+    assert out_csr.loc[0, "sense_code"] == "4-2"
+
+
+def test_csr_shortest_path_unknown_node_returns_none():
+    G = build_csr_graph(toy_network())
+    assert compute_shortest_path_mc(G, 0, G.n_nodes) == (None, None, None)
+    assert compute_shortest_path_mc(G, 0, "no-existe") == (None, None, None)
+
+
+def test_mc_matrix_batched_by_origin_matches_rowwise(monkeypatch):
+    from kido_ruteo.routing import dijkstra
+
+    gdf = toy_network()
+    G = build_csr_graph(gdf)
+    df = pd.concat([toy_od(G)] * 3, ignore_index=True)
+
+    calls = {"n": 0}
+    real = dijkstra.single_source_dijkstra
+
+    def counting(*args, **kwargs):
+        calls["n"] += 1
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(dijkstra, "single_source_dijkstra", counting)
+    batched = compute_mc_matrix(df, G)
+    # Una búsqueda por origen distinto (la fila sin origen no se rutea)
+    assert calls["n"] == df["origin_node_id"].dropna().nunique()
+
+    rowwise = compute_mc_matrix(df, G, batched=False)
+    pd.testing.assert_frame_equal(batched, rowwise)
+
+    G_nx = build_network_graph(gdf)
+    df_nx = pd.concat([toy_od()] * 3, ignore_index=True)
+    pd.testing.assert_frame_equal(compute_mc_matrix(df_nx, G_nx), compute_mc_matrix(df_nx, G_nx, batched=False))
+
+    no_paths = compute_mc_matrix(df, G, return_paths=False)
+    assert no_paths["mc_path"].isna().all()
+    pd.testing.assert_series_equal(no_paths["mc_distance_m"], batched["mc_distance_m"])
+
+
+def test_mc2_checkpoint_tree_matches_pairwise(monkeypatch):
+    from kido_ruteo.routing import dijkstra
+
+    gdf = toy_network()
+    G = build_csr_graph(gdf)
+    df = pd.concat([toy_od(G)] * 3, ignore_index=True)
+
+    calls = {"n": 0}
+    real = dijkstra.single_source_dijkstra
+
+    def counting(*args, **kwargs):
+        calls["n"] += 1
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(dijkstra, "single_source_dijkstra", counting)
+    tree = compute_mc2_matrix(df.copy(), G, checkpoint_col="checkpoint_node_id")
+    assert calls["n"] == 1  # un solo árbol para todo el checkpoint
+
+    pairwise = compute_mc2_matrix(df.copy(), G, checkpoint_col="checkpoint_node_id", batched=False)
+    pd.testing.assert_frame_equal(tree, pairwise)
+
+    G_nx = build_network_graph(gdf)
+    df_nx = toy_od()
+    pd.testing.assert_frame_equal(
+        compute_mc2_matrix(df_nx.copy(), G_nx, checkpoint_col="checkpoint_node_id"),
+        compute_mc2_matrix(df_nx.copy(), G_nx, checkpoint_col="checkpoint_node_id", batched=False),
+    )
+
+
+def test_dedup_routes_each_unique_key_once(monkeypatch):
+    from kido_ruteo.routing import shortest_path
+    from kido_ruteo.routing.dedup import factorize_routes
+
+    keys = factorize_routes([1, 2, 1, 3, None, None], [2, 1, 2, 3, 4, 4], symmetric=True)
+    assert keys.n_unique == 3 and keys.inverse.tolist() == [0, 0, 0, 1, 2, 2]
+    assert keys.flipped.tolist() == [False, True, False, False, False, False]
+    assert factorize_routes([1, 1], [2, 2], [7, 8]).n_unique == 2
+
+    G = build_csr_graph(jittered_grid())
+    rng = np.random.default_rng(7)
+    pairs = rng.integers(0, G.n_nodes, size=(20, 2))
+    # Repetidos + invertidos
+    o = np.concatenate([pairs[:, 0], pairs[:, 0], pairs[:, 1]])
+    d = np.concatenate([pairs[:, 1], pairs[:, 1], pairs[:, 0]])
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(o, dtype="Int32"),
+        "destination_node_id": pd.array(d, dtype="Int32"),
+        "checkpoint_node_id": pd.array([G.n_nodes // 2] * 60, dtype="Int32"),
+    })
+
+    calls = []
+    real = shortest_path.compute_shortest_path_mc
+    monkeypatch.setattr(shortest_path, "compute_shortest_path_mc", lambda *a, **k: calls.append(a[1:3]) or real(*a, **k))
+    out = compute_mc_matrix(df.copy(), G, batched=False)
+    assert len(calls) == len({tuple(sorted(p)) for p in pairs.tolist()})
+    for row in out.itertuples():
+        path, dist, _ = real(G, row.origin_node_id, row.destination_node_id)
+        if dist is None:
+            assert pd.isna(row.mc_distance_m) and pd.isna(row.mc_path)
+            continue
+        assert row.mc_distance_m == pytest.approx(dist)
+        assert ast.literal_eval(row.mc_path)[0] == row.origin_node_id
+        assert ast.literal_eval(row.mc_path)[-1] == row.destination_node_id
+
+    mc2 = compute_mc2_matrix(df.copy(), G, checkpoint_col="checkpoint_node_id")
+    single = compute_mc2_matrix(df.iloc[:20].copy(), G, checkpoint_col="checkpoint_node_id")
+    for col in ["mc2_distance_m", "sense_code"]:
+        assert mc2[col].iloc[20:40].reset_index(drop=True).equals(single[col])
+
+
+def test_contractual_plan_validity_without_mc():
+    from kido_ruteo.routing.constrained_path import has_valid_path
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    G = build_csr_graph(jittered_grid())
+    rng = np.random.default_rng(11)
+    nodes = rng.integers(0, G.n_nodes, size=(40, 2))
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(list(nodes[:, 0]) + [5, None, G.n_nodes - 1], dtype="Int32"),
+        "destination_node_id": pd.array(list(nodes[:, 1]) + [5, 3, 0], dtype="Int32"),
+        "checkpoint_node_id": pd.array([G.n_nodes // 2] * 43, dtype="Int32"),
+    })
+
+    with ParallelRoutingSession("", n_workers=1, graph=G) as session:
+        full = session.compute(df.copy())
+    with ParallelRoutingSession("", n_workers=1, graph=G, compute_mc=False) as session:
+        contractual = session.compute(df.copy())
+    assert "mc_distance_m" not in contractual.columns
+    expected = has_valid_path(full)
+    assert expected.sum() > 20 and not expected.iloc[-3:].any()
+    assert has_valid_path(contractual).tolist() == expected.tolist()
@@ -0,0 +1,78 @@
+"""Tests de la tabla giro → sentido (`routing.turn_table`)."""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.csr_graph import build_csr_graph
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import jittered_grid
+
+
+def test_turn_sense_table_persisted_with_checkpoint_mapping(monkeypatch, tmp_path: Path):
+    from kido_ruteo.processing import checkpoint_loader
+    from kido_ruteo.routing import graph_cache
+    from kido_ruteo.routing.constrained_path import _load_valid_sense_codes, derive_sense_codes
+    from kido_ruteo.routing.graph_cache import save_graph_cache, load_graph_cache
+
+    save_graph_cache(build_csr_graph(jittered_grid()), tmp_path / "g")
+    G = load_graph_cache(tmp_path / "g")
+    zon = gpd.GeoDataFrame(
+        {"ID": [2001, 2002], "NOMGEO": ["E01", "E02"], "poly_type": ["Checkpoint", "Checkpoint"]},
+        geometry=[Point(310, 420).buffer(5), Point(720, 180).buffer(5)],
+        crs="EPSG:32614",
+    )
+    zon_path = tmp_path / "zonification.geojson"
+    zon.to_file(zon_path, driver="GeoJSON")
+
+    mapping = checkpoint_loader.get_checkpoint_node_mapping(str(zon_path), G)
+    table = mapping.attrs["turn_senses"]
+    valid = _load_valid_sense_codes()
+    assert table.valid_codes == frozenset(valid)
+
+    # Todos los giros de cada checkpoint: búsqueda == derivación vectorial
+    u, c, w = [], [], []
+    for cp in mapping["checkpoint_node_id"].tolist():
+        nbrs = G.neighbors(cp)[0].tolist()
+        for a in nbrs:
+            for b in nbrs:
+                u.append(a), c.append(cp), w.append(b)
+    codes, hit = table.lookup(np.array(u), np.array(c), np.array(w))
+    assert hit.all()
+    expected = derive_sense_codes(G, u, c, w, valid)
+    assert pd.Series(list(np.asarray(table.sense_codes(u, c, w), dtype=object)), dtype=object).equals(
+        pd.Series(expected, dtype=object)
+    )
+
+    # MC2 con y sin tabla: mismo resultado
+    cp = int(mapping["checkpoint_node_id"].iloc[0])
+    rng = np.random.default_rng(6)
+    nodes = rng.integers(0, G.n_nodes, size=(40, 2))
+    df = pd.DataFrame({
+        "origin_node_id": pd.array(nodes[:, 0], dtype="Int32"),
+        "destination_node_id": pd.array(nodes[:, 1], dtype="Int32"),
+        "checkpoint_node_id": pd.array([cp] * 40, dtype="Int32"),
+    })
+    kw = dict(checkpoint_col="checkpoint_node_id")
+    pd.testing.assert_frame_equal(
+        compute_mc2_matrix(df.copy(), G, turn_senses=table, **kw),
+        compute_mc2_matrix(df.copy(), G, **kw),
+    )
+
+    # Segunda corrida: mapping y tabla desde la entrada del grafo
+    monkeypatch.setattr(
+        checkpoint_loader, "assign_checkpoint_nodes", lambda *a, **k: pytest.fail("no debería buscar nodos")
+    )
+    # ... y sin volver a hashear la zonificación (hash memoizado)
+    monkeypatch.setattr(graph_cache, "open", lambda *a, **k: pytest.fail("no debería releer"), raising=False)
+    again = checkpoint_loader.get_checkpoint_node_mapping(str(zon_path), load_graph_cache(tmp_path / "g"))
+    pd.testing.assert_frame_equal(again, mapping, check_dtype=False)
+    assert again["checkpoint_node_id"].dtype == "int32"
+    assert (again.attrs["turn_senses"].codes == table.codes).all()
@@ -0,0 +1,46 @@
+"""Tests de la matriz MC zona × zona (`routing.zone_matrix`)."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kido_ruteo.routing.shortest_path import compute_mc_matrix
+from kido_ruteo.routing.constrained_path import compute_mc2_matrix
+from routing_helpers import toy_network, toy_od
+
+
+def test_zone_matrix_lookup_matches_routing(monkeypatch, tmp_path: Path):
+    from kido_ruteo.routing import graph_loader, zone_matrix
+    from kido_ruteo.routing.parallel_routing import ParallelRoutingSession
+
+    net_path = tmp_path / "red.geojson"
+    toy_network().to_file(net_path, driver="GeoJSON")
+    G = graph_loader.load_csr_graph_from_geojson(str(net_path), target_crs="EPSG:32614")
+    df = toy_od(G)
+    expected = compute_mc_matrix(df, G)
+
+    # Nodos de zona: todos los del OD salvo el último destino (ruteado aparte)
+    zone_nodes = pd.concat([df["origin_node_id"], df["destination_node_id"].iloc[:4]])
+    zm = zone_matrix.load_or_build_zone_matrix(G, zone_nodes)
+    assert zm.dist.dtype == np.float32
+    assert (G.cache_dir / "zone_matrix" / zm.key / "dist.npy").exists()
+
+    out = compute_mc_matrix(df, G, zone_matrix=zm)
+    pd.testing.assert_series_equal(out["mc_distance_m"], expected["mc_distance_m"])
+    assert out["mc_path"].isna().tolist()[:4] == [True] * 4
+
+    # Persistida junto al grafo: la sesión la reutiliza sin reconstruir
+    monkeypatch.setattr(
+        zone_matrix, "build_zone_distance_matrix", lambda *a: pytest.fail("no debería reconstruir")
+    )
+    G2 = graph_loader.load_csr_graph_from_geojson(str(net_path), target_crs="EPSG:32614")
+    with ParallelRoutingSession(str(net_path), n_workers=2, graph=G2, zone_nodes=zone_nodes) as session:
+        out = session.compute(df.iloc[:4])
+    pd.testing.assert_series_equal(out["mc_distance_m"], expected["mc_distance_m"].iloc[:4])
+    expected_mc2 = compute_mc2_matrix(expected, G, checkpoint_col="checkpoint_node_id")["mc2_distance_m"].iloc[:4]
+    assert out["mc2_distance_m"].tolist() == expected_mc2.tolist()